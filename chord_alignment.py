@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Bar grid alignment for chord charts
+Single-pass column-width solver shared by the formatter and batch tools
+"""
+
+from functools import lru_cache
+
+from chord_metrics import REGISTRY
+
+# Distinct sections kept by the alignment memo (a few songbooks' worth)
+SECTION_CACHE_SIZE = 4096
+
+
+def parse_bar_tokens(line):
+    """Split a formatted chord line into a list of bars, each a list of tokens"""
+    # Remove leading/trailing whitespace but keep internal structure
+    line = line.strip()
+
+    if line.startswith('|') and line.endswith('|'):
+        parts = line.split('|')
+        # Skip first empty part and last empty part, keep single space bars
+        bars = [part.strip() for part in parts[1:-1] if part]
+    else:
+        # Handle malformed lines
+        bars = [line]
+
+    return [bar.split() for bar in bars]
+
+
+class BarGrid:
+    """Per-column maximum widths for every bar position of a set of rows
+
+    Rows are measured once as they are added, so building a grid costs one
+    pass over the tokens no matter how many rows or bars there are.
+    """
+
+    __slots__ = ('token_widths',)
+
+    def __init__(self, rows=()):
+        # token_widths[bar_idx][token_idx] -> widest token seen in that column
+        self.token_widths = []
+        for row in rows:
+            self.add_row(row)
+
+    def add_row(self, row):
+        """Grow the column maxima with one parsed row"""
+        token_widths = self.token_widths
+        for bar_idx, tokens in enumerate(row):
+            if bar_idx == len(token_widths):
+                token_widths.append([])
+            widths = token_widths[bar_idx]
+            for token_idx, token in enumerate(tokens):
+                width = len(token)
+                if token_idx == len(widths):
+                    widths.append(width)
+                elif width > widths[token_idx]:
+                    widths[token_idx] = width
+
+    def merge(self, other):
+        """Combine another grid into this one (column-wise maximum)"""
+        for bar_idx, other_widths in enumerate(other.token_widths):
+            if bar_idx == len(self.token_widths):
+                self.token_widths.append(list(other_widths))
+                continue
+            widths = self.token_widths[bar_idx]
+            for token_idx, width in enumerate(other_widths):
+                if token_idx == len(widths):
+                    widths.append(width)
+                elif width > widths[token_idx]:
+                    widths[token_idx] = width
+        return self
+
+    def render_row(self, row):
+        """Render a parsed row against the grid"""
+        line_parts = ['|']  # Start with opening bar
+        for bar_idx, tokens in enumerate(row):
+            widths = self.token_widths[bar_idx]
+            # Align tokens within this bar, padding missing beats with blanks
+            cells = [token.ljust(width) for token, width in zip(tokens, widths)]
+            cells.extend(' ' * width for width in widths[len(tokens):])
+            line_parts.append(' '.join(cells) + ' |')
+        return ''.join(line_parts)
+
+
+def align_rows(rows):
+    """Align parsed rows on a shared grid"""
+    grid = BarGrid(rows)
+    return [grid.render_row(row) for row in rows]
+
+
+@lru_cache(maxsize=SECTION_CACHE_SIZE)
+def align_section(lines):
+    """Align one run of formatted chord lines, given as a tuple
+
+    Memoized with bounded LRU eviction: repeated choruses and bridges, within
+    a chart or across a songbook, cost a hash lookup. The cache is
+    thread-safe; align_section.cache_info() reports hits and misses and
+    align_section.cache_clear() empties it.
+    """
+    return tuple(align_rows([parse_bar_tokens(line) for line in lines]))
+
+
+REGISTRY.register_cache('section_alignment', lambda: align_section.cache_info()[:2])
+
+
+def align_chart_lines(lines, is_chord_line, chart_wide=False):
+    """Align every run of chord lines in a chart
+
+    By default each run of consecutive chord lines gets its own grid. With
+    chart_wide=True all chord lines share one grid, so sections separated by
+    labels or lyrics line up with each other as well.
+    """
+    if chart_wide:
+        rows = [parse_bar_tokens(line) if is_chord_line(line) else None for line in lines]
+        grid = BarGrid(row for row in rows if row is not None)
+        return [line if row is None else grid.render_row(row)
+                for line, row in zip(lines, rows)]
+
+    aligned_lines = []
+    section = []
+    for line in lines:
+        if is_chord_line(line):
+            section.append(line)
+            continue
+        if section:
+            aligned_lines.extend(align_section(tuple(section)))
+            section = []
+        aligned_lines.append(line)
+
+    # Don't forget the last section
+    if section:
+        aligned_lines.extend(align_section(tuple(section)))
+
+    return aligned_lines
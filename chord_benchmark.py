@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+"""
+Chord chart benchmarks
+Synthetic songbook generator and timing/allocation measurements for the engine
+"""
+
+import argparse
+import os
+import pickle
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from multiprocessing import Pool
+
+try:
+    from chord_transpose import ChordTransposer
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose import ChordTransposer
+
+from chord_alignment import align_rows, align_section, parse_bar_tokens
+from chord_classifier import CHORD_PATTERN, ChordLineClassifier
+from chord_cli import ChartProcessor
+from chord_codec import ChartCodec, SharedChartBatch, render_encoded, render_shared, worker_codec
+from chord_history import (DEFAULT_HISTORY, METRICS, BenchmarkHistory, latency_summary, machine_fingerprint,
+                           regressions, source_version, write_report)
+from chord_metrics import REGISTRY, MetricsRegistry
+from chord_pdf import BookRenderer, FontMetrics, LayoutOptions, PageCache, PDFLayoutEngine, PDFRenderer
+from chord_pipeline import ChartPipeline
+from chord_profiling import MemoryProfiler
+from chord_scanner import TOKEN_CHORD, scan_line, scan_word
+from chord_transpose_gui_smart_format import NumberedChordConverter, SmartFormatter
+
+KEYS = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B']
+QUALITIES = ['', '', '', 'm', '7', 'm7', 'maj7', 'sus4', 'add9', 'dim', 'm7b5', '6']
+SECTIONS = ['Intro', 'Verse 1', 'Verse 2', 'Pre-Chorus', 'Chorus', 'Bridge', 'Interlude', 'Outro']
+LYRIC_WORDS = ['grace', 'amazing', 'how', 'sweet', 'the', 'sound', 'that', 'saved', 'a', 'wretch',
+               'like', 'me', 'once', 'was', 'lost', 'but', 'now', 'am', 'found', 'blind', 'see']
+
+
+def make_chart(rng, number=1, key=None, beats=None, sections=4, lines_per_section=4, lyric_lines=0):
+    """Build a synthetic chart in the Do = X / | bar format"""
+    key = key or rng.choice(KEYS)
+    beats = beats or rng.choice([3, 4])
+    notes = ChordTransposer.NOTES_FLAT if key in ('F', 'Bb', 'Eb', 'Ab', 'Db') else ChordTransposer.NOTES_SHARP
+
+    def chord():
+        symbol = rng.choice(notes) + rng.choice(QUALITIES)
+        if rng.random() < 0.1:
+            symbol += '/' + rng.choice(notes)
+        return symbol
+
+    lines = [
+        f"{number}. Song {number} (Book {rng.randint(1, 500)})",
+        f"Do = {key}",
+        f"Time Signature = {beats}/4",
+        f"Tempo (1/4) = {rng.randint(60, 140)} BPM",
+        "Structure = I V C V C B C O",
+        "",
+    ]
+    for section in range(sections):
+        lines.append(f"{SECTIONS[section % len(SECTIONS)]} :")
+        for _ in range(lines_per_section):
+            bars = []
+            for _ in range(rng.choice([2, 4, 4, 4, 6])):
+                slots = ['.'] * beats
+                slots[0] = chord()
+                if rng.random() < 0.3:
+                    slots[beats // 2] = chord()
+                bars.append(' '.join(slots))
+            # Real charts are not tidily spaced
+            spacing = ' ' * rng.randint(1, 2)
+            lines.append('|' + spacing + (spacing + '|' + spacing).join(bars) + spacing + '|')
+            for _ in range(lyric_lines):
+                lines.append(' '.join(rng.choice(LYRIC_WORDS) for _ in range(rng.randint(5, 10))))
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def make_songbook(songs=50, seed=0, **chart_options):
+    """Build a list of synthetic charts"""
+    rng = random.Random(seed)
+    return [make_chart(rng, number=i + 1, **chart_options) for i in range(songs)]
+
+
+def measure(func, charts, repeat=5, setup=None):
+    """Time func over every chart; returns wall-clock and peak traced allocation
+
+    setup(), when given, runs untimed before every pass, e.g. to empty a memo.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        for chart in charts:
+            func(chart)
+        timings.append(time.perf_counter() - start)
+
+    return {
+        'best': min(timings),
+        'mean': statistics.mean(timings),
+        'peak_bytes': peak_allocation(func, charts, setup),
+    }
+
+
+def peak_allocation(func, charts, setup=None):
+    """Largest traced allocation peak of func over any single chart
+
+    Measured above the memory already held when the chart starts, so what
+    earlier charts left behind (memo entries) is not charged to later ones.
+    """
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        peak = 0
+        for chart in charts:
+            tracemalloc.reset_peak()
+            held = tracemalloc.get_traced_memory()[0]
+            func(chart)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - held)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def measure_latency(func, charts, repeat=5):
+    """Per-chart latency percentiles, throughput of the best pass and peak allocation"""
+    samples = []
+    best_total = float('inf')
+    perf_counter = time.perf_counter
+    for _ in range(repeat):
+        pass_start = perf_counter()
+        for chart in charts:
+            start = perf_counter()
+            func(chart)
+            samples.append(perf_counter() - start)
+        best_total = min(best_total, perf_counter() - pass_start)
+
+    result = latency_summary(samples, best_total, len(charts))
+    result['peak_kib'] = peak_allocation(func, charts) / 1024
+    return result
+
+
+def print_comparison(title, rows):
+    """Print a table of (name, measurement) rows, relative to the first row"""
+    print(title)
+    base = rows[0][1]
+    for name, result in rows:
+        speedup = base['best'] / result['best'] if result['best'] else float('inf')
+        memory = result['peak_bytes'] / base['peak_bytes'] if base['peak_bytes'] else 1.0
+        print(f"  {name:<28} best {result['best'] * 1000:9.2f} ms  mean {result['mean'] * 1000:9.2f} ms  "
+              f"peak {result['peak_bytes'] / 1024:9.1f} KiB  x{speedup:5.2f} speed  x{memory:5.2f} memory")
+
+
+def bench_pipeline(args):
+    """Fused pipeline against today's chained calls"""
+    charts = make_songbook(args.songs, seed=args.seed)
+    transposer = ChordTransposer()
+    formatter = SmartFormatter()
+    converter = NumberedChordConverter()
+    pipeline = ChartPipeline(transposer, formatter, converter)
+    target = args.target_key
+
+    def source_key(chart):
+        return pipeline._find_key(chart.split('\n'))
+
+    def chained_format(chart):
+        transposed = transposer.transpose_chart(chart, source_key(chart), target)
+        formatter.detect_time_signature(transposed)
+        return formatter.format_and_align(transposed)
+
+    def fused_format(chart):
+        return pipeline.run(chart, source_key(chart), target)
+
+    def chained_numbers(chart):
+        transposed = transposer.transpose_chart(chart, source_key(chart), target)
+        numbered = converter.convert_chart_to_numbers(transposed, use_roman=True)
+        formatter.detect_time_signature(numbered)
+        return formatter.format_and_align(numbered)
+
+    def fused_numbers(chart):
+        return pipeline.run(chart, source_key(chart), target, number_style='roman')
+
+    same = sum(chained_format(chart) == fused_format(chart) for chart in charts)
+    print(f"{args.songs} charts -> {target}: fused output identical for {same}/{len(charts)} charts")
+
+    # The chained path goes through the section alignment memo; start every pass cold so it aligns
+    # each chart, like the fused path does
+    cold = align_section.cache_clear
+    print_comparison("transpose + format + align", [
+        ('chained', measure(chained_format, charts, args.repeat, cold)),
+        ('fused', measure(fused_format, charts, args.repeat, cold)),
+    ])
+    # Not like for like: the chained formatter no longer recognizes numbered lines and leaves them
+    # unaligned, the fused pipeline aligns them, so it does (and allocates for) more work here
+    print_comparison("transpose + number + format + align (fused also aligns the numbered lines)", [
+        ('chained', measure(chained_numbers, charts, args.repeat, cold)),
+        ('fused', measure(fused_numbers, charts, args.repeat, cold)),
+    ])
+
+
+def legacy_is_chord_line(line):
+    """The original per-character chord-line test, kept as the benchmark baseline"""
+    has_bars = '|' in line
+    has_chords = bool(re.search(CHORD_PATTERN, line))
+    symbol_ratio = sum(1 for c in line if c in '|.-') / max(len(line), 1)
+    return has_bars and has_chords and symbol_ratio > 0.1
+
+
+def bench_classifier(args):
+    """Chord-line classifier against the original per-character test on lyric-heavy charts"""
+    charts = [chart.split('\n') for chart in make_songbook(args.songs, seed=args.seed, lyric_lines=args.lyric_lines)]
+    classifier = ChordLineClassifier()
+    total_lines = sum(len(lines) for lines in charts)
+
+    mismatches = sum(legacy_is_chord_line(line) != classifier.is_chord_line(line)
+                     for lines in charts for line in lines)
+    print(f"{args.songs} charts, {total_lines} lines ({args.lyric_lines} lyric lines per chord line): "
+          f"{mismatches} classification mismatches")
+
+    print_comparison("classify every line", [
+        ('legacy is_chord_line', measure(lambda lines: [legacy_is_chord_line(line) for line in lines], charts, args.repeat)),
+        ('ChordLineClassifier', measure(lambda lines: [classifier.is_chord_line(line) for line in lines], charts, args.repeat)),
+        ('classify_lines (all kinds)', measure(classifier.classify_lines, charts, args.repeat)),
+    ])
+
+
+LEGACY_CHORD_TOKEN = re.compile(CHORD_PATTERN + r'$')
+LEGACY_BAR_SPLIT = re.compile(r'(\|)')
+
+
+def legacy_tokens(line):
+    """The original regex tokenization: split at bars, then match every token against the chord pattern"""
+    return [(token, LEGACY_CHORD_TOKEN.match(token) is not None)
+            for part in LEGACY_BAR_SPLIT.split(line) for token in part.split()]
+
+
+def bench_scanner(args):
+    """Chord scanner against the regex tokenization and numbering on every chord line"""
+    formatter = SmartFormatter()
+    converter = NumberedChordConverter()
+    charts = [[line for line in formatter.format_chart(chart).split('\n') if formatter.is_chord_line(line)]
+              for chart in make_songbook(args.songs, seed=args.seed)]
+    total_lines = sum(len(lines) for lines in charts)
+
+    legacy_chords = sum(is_chord for lines in charts for line in lines for _, is_chord in legacy_tokens(line))
+    scanned_chords = sum(kind == TOKEN_CHORD for lines in charts for line in lines for kind, _, _ in scan_line(line))
+    print(f"{args.songs} charts, {total_lines} chord lines: {legacy_chords} chords matched by the regex, "
+          f"{scanned_chords} by the scanner (maj7 and friends included)")
+
+    chord_pattern = re.compile(CHORD_PATTERN + r'(?![#b])')
+
+    def legacy_numbers(line):
+        return chord_pattern.sub(lambda match: converter.convert_chord_to_number(match.group(0), 'C'), line)
+
+    def cold_scan(lines):
+        scan_word.cache_clear()
+        return [scan_line(line) for line in lines]
+
+    print_comparison("tokenize every chord line", [
+        ('regex tokens', measure(lambda lines: [legacy_tokens(line) for line in lines], charts, args.repeat)),
+        ('scanner', measure(lambda lines: [scan_line(line) for line in lines], charts, args.repeat)),
+        ('scanner, cold word cache', measure(cold_scan, charts, args.repeat)),
+    ])
+    print_comparison("number every chord line", [
+        ('regex substitution', measure(lambda lines: [legacy_numbers(line) for line in lines], charts, args.repeat)),
+        ('scanner', measure(lambda lines: [converter.convert_line_to_numbers(line, 'C') for line in lines],
+                            charts, args.repeat)),
+    ])
+
+
+def render_pickled(parsed, chart_wide=False):
+    """Pool worker for the pickle baseline: (lines, rows) -> formatted text"""
+    return '\n'.join(worker_codec().pipeline._emit(*parsed, chart_wide))
+
+
+def bench_codec(args):
+    """Binary chart encoding against pickling parsed charts, in-process and across a worker pool"""
+    charts = make_songbook(args.songs, seed=args.seed)
+    codec = ChartCodec()
+    parsed = [codec.parse(chart) for chart in charts]
+    encoded = [codec.encode_parsed(*item) for item in parsed]
+
+    # The codec renders through the pipeline's helpers; fail loudly if the two ever drift apart
+    pipeline = codec.pipeline
+    mismatches = [i for i, (chart, data) in enumerate(zip(charts, encoded)) for chart_wide in (False, True)
+                  if render_encoded(data, chart_wide) != pipeline.run(chart, chart_wide=chart_wide)]
+    if mismatches:
+        raise SystemExit(f"ChartCodec round trip differs from ChartPipeline.run for chart(s) {sorted(set(mismatches))}")
+    print(f"{args.songs} charts: encoded round trip identical to ChartPipeline.run (aligned per section and chart-wide)")
+
+    pickled_bytes = sum(len(pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)) for item in parsed)
+    encoded_bytes = sum(len(data) for data in encoded)
+    text_bytes = sum(len(chart.encode('utf-8')) for chart in charts)
+    print(f"{args.songs} charts: text {text_bytes / 1024:.1f} KiB, pickled {pickled_bytes / 1024:.1f} KiB, "
+          f"encoded {encoded_bytes / 1024:.1f} KiB (x{pickled_bytes / encoded_bytes:.2f} smaller than pickle)")
+
+    print_comparison("serialize + deserialize one parsed chart", [
+        ('pickle', measure(lambda item: pickle.loads(pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)),
+                           parsed, args.repeat)),
+        ('ChartCodec', measure(lambda item: codec.decode(codec.encode_parsed(*item)), parsed, args.repeat)),
+    ])
+
+    def best_of(func):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return {'best': min(timings), 'mean': statistics.mean(timings), 'peak_bytes': 0}
+
+    workers = args.workers or os.cpu_count()
+    with SharedChartBatch(encoded) as batch, Pool(workers) as pool:
+        jobs = batch.jobs()
+        # Warm the workers so process start-up is not measured
+        pool.map(render_shared, jobs[:workers])
+        rows = [
+            ('pickled (lines, rows)', best_of(lambda: pool.map(render_pickled, parsed, chunksize=args.chunksize))),
+            ('encoded bytes', best_of(lambda: pool.map(render_encoded, encoded, chunksize=args.chunksize))),
+            ('shared memory', best_of(lambda: pool.map(render_shared, jobs, chunksize=args.chunksize))),
+        ]
+    print_comparison(f"render every chart in a pool of {workers} workers (wall clock)", rows)
+
+
+def bench_stages(args):
+    """Per-stage tracemalloc peak and net allocation of the CLI pipeline"""
+    charts = make_songbook(args.songs, seed=args.seed, lyric_lines=args.lyric_lines)
+    if args.medley:
+        # One huge document, like a medley or a whole songbook pasted at once
+        charts = ['\n\n'.join(charts[i:i + args.medley]) for i in range(0, len(charts), args.medley)]
+
+    profiler = MemoryProfiler()
+    processor = ChartProcessor(profiler)
+    profiler.start()
+    try:
+        for number, chart in enumerate(charts, 1):
+            with profiler.chart(f"chart {number} ({len(chart) / 1024:.1f} KiB)"):
+                processor.process(chart, target_key=args.target_key, number_style=args.numbers)
+    finally:
+        profiler.restore()
+        profiler.stop()
+
+    print(f"{len(charts)} documents, {sum(len(chart) for chart in charts) / 1024:.1f} KiB of text")
+    print(profiler.format_report(top_charts=5))
+
+
+def chord_sections(lines, is_chord_line):
+    """Runs of consecutive chord lines, as align_bars_in_section receives them"""
+    sections = []
+    section = []
+    for line in lines:
+        if is_chord_line(line):
+            section.append(line)
+        elif section:
+            sections.append(section)
+            section = []
+    if section:
+        sections.append(section)
+    return sections
+
+
+def repeat_sections(chart, structure='I V C V C B C O'):
+    """Lay a chart's sections out as its song structure (repeated verses and choruses)"""
+    header, *sections = [block for block in chart.split('\n\n') if block.strip()]
+    if not sections:
+        return chart
+    names = {}
+    for part in structure.split():
+        names.setdefault(part, sections[len(names) % len(sections)])
+    return '\n\n'.join([header] + [names[part] for part in structure.split()])
+
+
+def bench_memo(args):
+    """Section alignment memo against re-aligning every section"""
+    formatter = SmartFormatter()
+    charts = [repeat_sections(chart) for chart in make_songbook(args.songs, seed=args.seed)]
+    sections = [chord_sections(formatter.format_chart(chart).split('\n'), formatter.is_chord_line)
+                for chart in charts]
+    total = sum(len(chart_sections) for chart_sections in sections)
+
+    def uncached(chart_sections):
+        return [align_rows([parse_bar_tokens(line) for line in section]) for section in chart_sections]
+
+    def cached(chart_sections):
+        return [list(align_section(tuple(section))) for section in chart_sections]
+
+    same = all(uncached(chart_sections) == cached(chart_sections) for chart_sections in sections)
+    print(f"{len(sections)} charts, {total} sections: memoized output identical: {same}")
+
+    base = None
+    for name, func in (('re-align every section', uncached), ('memoized sections', cached)):
+        timings = []
+        for _ in range(args.repeat):
+            align_section.cache_clear()
+            start = time.perf_counter()
+            for chart_sections in sections:
+                func(chart_sections)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        base = base or best
+        print(f"  {name:<24} best {best * 1000:9.2f} ms  x{base / best:5.2f} speed")
+    info = align_section.cache_info()
+    print(f"  cache: {info.hits} hits, {info.misses} misses ({info.hits / max(info.hits + info.misses, 1):.0%}), "
+          f"{info.currsize}/{info.maxsize} entries")
+
+
+def bench_pdf(args):
+    """Section-aware PDF layout and rendering of a songbook of --pages pages"""
+    formatter = SmartFormatter()
+    try:
+        metrics = FontMetrics()
+    except ImportError:
+        print("The pdf benchmark requires reportlab (pip install reportlab)")
+        return
+    engine = PDFLayoutEngine(LayoutOptions(landscape=args.landscape), metrics=metrics)
+
+    rng = random.Random(args.seed)
+    texts = []
+    pages = 0
+    while pages < args.pages:
+        text = formatter.format_and_align(make_chart(rng, number=len(texts) + 1, sections=6, lyric_lines=1))
+        texts.append(text)
+        pages += len(engine.layout_chart(text).pages)
+    print(f"{len(texts)} charts, {pages} {'landscape' if args.landscape else 'portrait'} pages")
+
+    def best_of(func):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def cold_layout():
+        metrics.clear()
+        engine.layout_book(texts)
+
+    cold = best_of(cold_layout)
+    warm = best_of(lambda: engine.layout_book(texts))
+    layouts = engine.layout_book(texts)
+    renderer = PDFRenderer(engine)
+    temp_path = os.path.join(tempfile.gettempdir(), f'chord_benchmark_{os.getpid()}.pdf')
+    try:
+        render = best_of(lambda: renderer.render(layouts, temp_path))
+        size = os.path.getsize(temp_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    print(f"  layout, cold metrics     {cold * 1000:9.2f} ms  ({cold / pages * 1000:.3f} ms/page)")
+    print(f"  layout, cached metrics   {warm * 1000:9.2f} ms  ({warm / pages * 1000:.3f} ms/page)")
+    print(f"  render                   {render * 1000:9.2f} ms  ({render / pages * 1000:.3f} ms/page, "
+          f"{size / 1024:.0f} KiB)")
+    print(f"  metrics cache: {len(metrics.widths)} strings, {metrics.hits} hits, {metrics.misses} misses")
+
+
+def bench_pdfcache(args):
+    """Songbook rebuilds from the page cache after editing a few of --songs charts"""
+    formatter = SmartFormatter()
+    try:
+        engine = PDFLayoutEngine(LayoutOptions(landscape=args.landscape))
+    except ImportError:
+        print("The pdfcache benchmark requires reportlab (pip install reportlab)")
+        return
+    rng = random.Random(args.seed)
+    texts = [formatter.format_and_align(make_chart(rng, number=i + 1, sections=6, lyric_lines=1))
+             for i in range(args.songs)]
+    changed_counts = [int(count) for count in args.changed.split(',')]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output = os.path.join(temp_dir, 'book.pdf')
+        cache_dir = os.path.join(temp_dir, 'pages')
+
+        def build(book_texts):
+            # A fresh engine and cache per build, as in separate runs of chord_pdf.py --cache
+            book = BookRenderer(PDFLayoutEngine(engine.options), PageCache(cache_dir))
+            start = time.perf_counter()
+            stats = book.render(book_texts, output)
+            return time.perf_counter() - start, stats
+
+        start = time.perf_counter()
+        renderer = PDFRenderer(PDFLayoutEngine(engine.options))
+        renderer.render(renderer.engine.layout_book(texts), output)
+        plain = time.perf_counter() - start
+        cold, stats = build(texts)
+        print(f"{args.songs} charts, {stats['pages']} pages")
+        print(f"  uncached render          {plain * 1000:9.2f} ms")
+        print(f"  cold build (fills cache) {cold * 1000:9.2f} ms")
+        warm, stats = build(texts)
+        print(f"  rebuild, 0 changed       {warm * 1000:9.2f} ms  ({stats['rendered']} drawn)")
+
+        for count in changed_counts:
+            edited = list(texts)
+            for index in rng.sample(range(len(texts)), min(count, len(texts))):
+                edited[index] = texts[index] + f"\nEdited {count}"
+            rebuild, stats = build(edited)
+            print(f"  rebuild, {count:>3} changed     {rebuild * 1000:9.2f} ms  ({stats['rendered']} drawn)")
+
+
+def bench_metrics(args):
+    """Cost of the metrics recorded per chart, next to the fused pipeline that records them"""
+    charts = make_songbook(args.songs, seed=args.seed)
+    pipeline = ChartPipeline()
+    registry = MetricsRegistry()
+    charts_processed = registry.counter('charts_total', "Charts")
+    lines_classified = registry.counter('lines_total', "Lines")
+    chords_transposed = registry.counter('chords_total', "Chords")
+    stage_seconds = registry.histogram('stage_seconds', "Stage latency", ['stage']).labels('pipeline')
+
+    def record(chart):
+        # What ChartPipeline.run records for one chart
+        charts_processed.inc()
+        lines_classified.inc(40)
+        chords_transposed.inc(60)
+        stage_seconds.observe(0.0004)
+
+    print_comparison(f"{args.songs} charts, one call per chart", [
+        ('pipeline.run', measure(lambda chart: pipeline.run(chart, 'C', args.target_key), charts, args.repeat)),
+        ('metric recording', measure(record, charts, args.repeat)),
+        ('Prometheus exposition', measure(lambda chart: REGISTRY.exposition(), charts, args.repeat)),
+    ])
+
+
+def bench_record(args):
+    """Run the core benchmarks and append the results to the history file"""
+    charts = make_songbook(args.songs, seed=args.seed, lyric_lines=1)
+    transposer = ChordTransposer()
+    formatter = SmartFormatter()
+    pipeline = ChartPipeline(transposer, formatter)
+    keyed = [(chart, pipeline._find_key(chart.split('\n'))) for chart in charts]
+    sections = [chord_sections(formatter.format_chart(chart).split('\n'), formatter.is_chord_line) for chart in charts]
+    target = args.target_key
+
+    workloads = {
+        'format_chart': (formatter.format_chart, charts),
+        # Cold memo per chart, so repetitions do not time pure cache hits
+        'align_bars_in_section': (lambda chart_sections: align_section.cache_clear() or
+                                  [formatter.align_bars_in_section(section) for section in chart_sections], sections),
+        'transpose_chart': (lambda item: transposer.transpose_chart(item[0], item[1], target), keyed),
+        'pipeline': (lambda item: pipeline.run(item[0], item[1], target), keyed),
+    }
+
+    results = {}
+    for name, (func, inputs) in workloads.items():
+        results[name] = measure_latency(func, inputs, args.repeat)
+        result = results[name]
+        print(f"  {name:<24} {result['throughput']:9.1f} charts/s  p50 {result['p50_ms']:7.3f} ms  "
+              f"p90 {result['p90_ms']:7.3f} ms  p99 {result['p99_ms']:7.3f} ms  peak {result['peak_kib']:8.1f} KiB")
+
+    history = BenchmarkHistory(args.history)
+    history.append({
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'label': args.label,
+        'version': source_version(),
+        'machine': machine_fingerprint(),
+        'songs': args.songs,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'results': results,
+    })
+    print(f"Appended to {args.history}")
+
+    if args.report:
+        write_report(args.history, args.report, args.threshold)
+        print(f"Report written to {args.report}")
+
+    found = regressions(history.runs(), args.threshold)
+    for benchmark, metric, change in found:
+        print(f"Regression: {benchmark} {METRICS[metric][0]} {change:+.1%}")
+    if found and args.fail_on_regression:
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chord chart engine benchmarks")
+    parser.add_argument('--songs', type=int, default=50, help="number of synthetic charts")
+    parser.add_argument('--repeat', type=int, default=5, help="timing repetitions")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the synthetic songbook")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    pipeline_parser = subparsers.add_parser('pipeline', help=bench_pipeline.__doc__)
+    pipeline_parser.add_argument('--target-key', default='Eb')
+    pipeline_parser.set_defaults(func=bench_pipeline)
+
+    classifier_parser = subparsers.add_parser('classifier', help=bench_classifier.__doc__)
+    classifier_parser.add_argument('--lyric-lines', type=int, default=3, help="lyric lines after each chord line")
+    classifier_parser.set_defaults(func=bench_classifier)
+
+    scanner_parser = subparsers.add_parser('scanner', help=bench_scanner.__doc__)
+    scanner_parser.set_defaults(func=bench_scanner)
+
+    codec_parser = subparsers.add_parser('codec', help=bench_codec.__doc__)
+    codec_parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    codec_parser.add_argument('--chunksize', type=int, default=8, help="charts per pool task")
+    codec_parser.set_defaults(func=bench_codec)
+
+    stages_parser = subparsers.add_parser('stages', help=bench_stages.__doc__)
+    stages_parser.add_argument('--target-key', default='Eb')
+    stages_parser.add_argument('--numbers', choices=['roman', 'arabic'], help="also run the number stage")
+    stages_parser.add_argument('--lyric-lines', type=int, default=1, help="lyric lines after each chord line")
+    stages_parser.add_argument('--medley', type=int, default=0, metavar='N',
+                               help="join every N charts into one document")
+    stages_parser.set_defaults(func=bench_stages)
+
+    memo_parser = subparsers.add_parser('memo', help=bench_memo.__doc__)
+    memo_parser.set_defaults(func=bench_memo)
+
+    pdf_parser = subparsers.add_parser('pdf', help=bench_pdf.__doc__)
+    pdf_parser.add_argument('--pages', type=int, default=50, help="songbook length in pages")
+    pdf_parser.add_argument('--landscape', action='store_true', help="2-column landscape pages")
+    pdf_parser.set_defaults(func=bench_pdf)
+
+    pdfcache_parser = subparsers.add_parser('pdfcache', help=bench_pdfcache.__doc__)
+    pdfcache_parser.add_argument('--changed', default='1,10,50', help="comma-separated numbers of charts to edit")
+    pdfcache_parser.add_argument('--landscape', action='store_true', help="2-column landscape pages")
+    pdfcache_parser.set_defaults(func=bench_pdfcache)
+
+    metrics_parser = subparsers.add_parser('metrics', help=bench_metrics.__doc__)
+    metrics_parser.add_argument('--target-key', default='Eb')
+    metrics_parser.set_defaults(func=bench_metrics)
+
+    record_parser = subparsers.add_parser('record', help=bench_record.__doc__)
+    record_parser.add_argument('--history', default=DEFAULT_HISTORY, help="JSON Lines history file")
+    record_parser.add_argument('--label', help="release or branch name stored with the run")
+    record_parser.add_argument('--target-key', default='Eb')
+    record_parser.add_argument('--report', metavar='HTML', help="also write the HTML trend report")
+    record_parser.add_argument('--threshold', type=float, default=0.10, help="relative change counted as a regression")
+    record_parser.add_argument('--fail-on-regression', action='store_true', help="exit with status 1 on a regression")
+    record_parser.set_defaults(func=bench_record)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Capo and key optimizer
+Ranks every target key x capo position of a chart by how easy the resulting
+guitar chord shapes are to play
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter, namedtuple
+from functools import lru_cache
+from multiprocessing import Pool
+
+try:
+    from chord_transpose import ChordTransposer
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose import ChordTransposer
+
+from chord_classifier import ChordLineClassifier
+from chord_pipeline import KEY_PATTERN
+from chord_transposition import CHORD_TOKEN_PATTERN
+
+MAX_CAPO = 7
+CAPO_PENALTY = 0.05        # per fret: prefer lower capos when shapes are equally easy
+KEY_CHANGE_PENALTY = 0.1   # prefer keeping the chart's own key
+HARD_CHORD = 3.0           # difficulty from which a shape counts as hard (barre or rare)
+
+PITCHES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+
+# Shape family -> (roots with an open shape, open difficulty, barre/movable difficulty)
+SHAPES = {
+    'major': ('C A G E D', 1.0, 3.0),
+    'minor': ('A E D', 1.0, 3.0),
+    'dominant': ('C A G E D B', 1.2, 3.2),
+    'major7': ('C A D E F G', 1.3, 3.5),
+    'minor7': ('A E D B', 1.2, 3.2),
+    'suspended': ('A D E G C', 1.2, 3.2),
+    'sixth': ('A C D E G', 1.5, 3.5),
+    'minor6': ('A D E', 1.5, 3.5),
+    'power': ('E A D', 1.0, 1.5),
+    'rare': ('', 4.0, 4.0),
+}
+# Slash chords whose bass falls under the open shape
+EASY_SLASHES = ('G/B G/D G/F# C/E C/G C/B D/F# D/A D/C A/C# A/E A/G E/G# E/B E/D '
+                'Am/G Am/C Am/E Em/D Em/B Dm/F Dm/C')
+EASY_SLASH_COST = 0.3
+SLASH_COST = 1.5
+
+Suggestion = namedtuple('Suggestion', ['key', 'capo', 'shapes_key', 'difficulty', 'hard_chords', 'score'])
+
+
+def key_name(transposer, index):
+    """Conventional spelling of the key with pitch class `index`"""
+    flat_name = transposer.NOTES_FLAT[index % 12]
+    return flat_name if transposer.should_use_flats(flat_name) else transposer.NOTES_SHARP[index % 12]
+
+
+def capo_shapes_key(transposer, key, capo):
+    """Key whose chord shapes sound in `key` with a capo on fret `capo`"""
+    return key_name(transposer, transposer.get_note_index(key) - capo)
+
+
+def pitch_class(note):
+    """Pitch class of a note name with any spelling"""
+    pitch = PITCHES[note[0]]
+    for accidental in note[1:]:
+        pitch += 1 if accidental == '#' else -1
+    return pitch % 12
+
+
+def shape_family(quality):
+    """Group a chord quality into the shape family a guitarist would use"""
+    quality = quality or ''
+    if quality in ('', 'M'):
+        return 'major'
+    if quality == 'm':
+        return 'minor'
+    if quality == '7':
+        return 'dominant'
+    if quality in ('maj7', 'M7'):
+        return 'major7'
+    if quality == 'm7':
+        return 'minor7'
+    if quality in ('sus', 'sus2', 'sus4', '7sus4', 'add9', '2'):
+        return 'suspended'
+    if quality == '6':
+        return 'sixth'
+    if quality == 'm6':
+        return 'minor6'
+    if quality == '5':
+        return 'power'
+    return 'rare'
+
+
+@lru_cache(maxsize=4096)
+def parse_symbol(token):
+    """(family, root_pc, bass_pc) for a chord token, or None"""
+    match = CHORD_TOKEN_PATTERN.match(token)
+    if not match:
+        return None
+    root, quality, bass, _ = match.groups()
+    return shape_family(quality), pitch_class(root), pitch_class(bass) if bass else -1
+
+
+SHAPE_TABLE = {family: ({PITCHES[root] for root in roots.split()}, open_cost, barre_cost)
+               for family, (roots, open_cost, barre_cost) in SHAPES.items()}
+EASY_SLASH_TABLE = {parse_symbol(chord) for chord in EASY_SLASHES.split()}
+
+
+def shape_difficulty(family, root_pc, bass_pc):
+    """Difficulty of one chord shape (root and bass as pitch classes, bass -1 for none)"""
+    open_roots, open_cost, barre_cost = SHAPE_TABLE[family]
+    cost = open_cost if root_pc in open_roots else barre_cost
+    if bass_pc >= 0 and bass_pc != root_pc:
+        cost += EASY_SLASH_COST if (family, root_pc, bass_pc) in EASY_SLASH_TABLE else SLASH_COST
+    return cost
+
+
+@lru_cache(maxsize=None)
+def shift_profile(family, root_pc, bass_pc):
+    """Difficulty of a chord after each of the 12 possible shifts, as a 12-tuple"""
+    return tuple(shape_difficulty(family, (root_pc + shift) % 12, (bass_pc + shift) % 12 if bass_pc >= 0 else -1)
+                 for shift in range(12))
+
+
+class CapoOptimizer:
+    """Scores all 12 keys x capo 0-7 for a chart
+
+    A chart is reduced to a histogram of (shape family, root, bass) pitch
+    classes. Each distinct entry has a cached 12-vector of its difficulty
+    under every shift, so the whole chart is scored for all shifts with one
+    weighted vector sum; the 96 key/capo candidates only ever need 12
+    distinct shape sets.
+    """
+
+    def __init__(self, transposer=None, max_capo=MAX_CAPO, classifier=None):
+        self.transposer = transposer or ChordTransposer()
+        self.max_capo = max_capo
+        self.classifier = classifier or ChordLineClassifier()
+
+    def chord_histogram(self, content):
+        """Counter of (family, root_pc, bass_pc) over every chord in the chart"""
+        histogram = Counter()
+        lines = content.split('\n')
+        for index in self.classifier.chord_line_indices(lines):
+            for token in lines[index].replace('|', ' ').split():
+                symbol = parse_symbol(token)
+                if symbol:
+                    histogram[symbol] += 1
+        return histogram
+
+    def shift_scores(self, histogram):
+        """(mean difficulty, hard chord count) of the chart's shapes for every shift"""
+        total = sum(histogram.values())
+        difficulty = [0.0] * 12
+        hard = [0] * 12
+        for symbol, count in histogram.items():
+            for shift, cost in enumerate(shift_profile(*symbol)):
+                difficulty[shift] += count * cost
+                if cost >= HARD_CHORD:
+                    hard[shift] += count
+        return [value / total for value in difficulty] if total else difficulty, hard
+
+    def source_key(self, content):
+        """Pitch class of the chart's key ('Do = X', else the first chord's root)"""
+        key_match = KEY_PATTERN.search(content)
+        if key_match:
+            return self.transposer.get_note_index(key_match.group(1))
+        lines = content.split('\n')
+        for index in self.classifier.chord_line_indices(lines):
+            for token in lines[index].replace('|', ' ').split():
+                symbol = parse_symbol(token)
+                if symbol:
+                    return symbol[1]
+        return None
+
+    def suggest(self, content, keys=None, top=5):
+        """Ranked suggestions; `keys` restricts the sounding key (e.g. the singer's key)"""
+        histogram = self.chord_histogram(content)
+        source = self.source_key(content)
+        if source is None or not histogram:
+            return []
+
+        difficulty, hard = self.shift_scores(histogram)
+        targets = [self.transposer.get_note_index(key) for key in keys] if keys else range(12)
+
+        suggestions = []
+        for target in targets:
+            for capo in range(self.max_capo + 1):
+                shift = (target - capo - source) % 12
+                score = difficulty[shift] + CAPO_PENALTY * capo + (KEY_CHANGE_PENALTY if target != source else 0.0)
+                suggestions.append(Suggestion(
+                    key=key_name(self.transposer, target),
+                    capo=capo,
+                    shapes_key=key_name(self.transposer, target - capo),
+                    difficulty=round(difficulty[shift], 3),
+                    hard_chords=hard[shift],
+                    score=round(score, 3),
+                ))
+        suggestions.sort(key=lambda suggestion: (suggestion.score, suggestion.capo))
+        return suggestions[:top] if top else suggestions
+
+
+_worker_optimizer = None
+
+
+def _suggest_file(job):
+    """Worker: suggestions for one chart file"""
+    global _worker_optimizer
+    path, keys, top = job
+    if _worker_optimizer is None:
+        _worker_optimizer = CapoOptimizer()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return path, _worker_optimizer.suggest(f.read(), keys=keys, top=top), None
+    except Exception as e:
+        return path, [], str(e)
+
+
+def chart_files(paths):
+    """Expand files and directories into chart .txt files"""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith('.txt'):
+                        yield os.path.join(directory, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suggest the easiest key and capo position for guitar")
+    parser.add_argument('charts', nargs='+', help="chart files or directories")
+    parser.add_argument('--key', action='append', dest='keys', metavar='KEY',
+                        help="sounding key(s) to keep, e.g. the singer's key (repeatable; default: all 12)")
+    parser.add_argument('--top', type=int, default=3, help="suggestions per chart")
+    parser.add_argument('--workers', type=int, help="worker processes for whole libraries (default: all cores)")
+    parser.add_argument('--json', action='store_true', help="print JSON lines instead of text")
+    args = parser.parse_args(argv)
+
+    jobs = [(path, args.keys, args.top) for path in chart_files(args.charts)]
+    if len(jobs) == 1 or args.workers == 1:
+        results = map(_suggest_file, jobs)
+        pool = None
+    else:
+        pool = Pool(args.workers)
+        results = pool.imap(_suggest_file, jobs, chunksize=16)
+
+    failures = 0
+    try:
+        for path, suggestions, error in results:
+            if error:
+                failures += 1
+                print(f"Error: {path}: {error}", file=sys.stderr)
+            elif args.json:
+                print(json.dumps({'chart': path, 'suggestions': [s._asdict() for s in suggestions]}))
+            else:
+                print(path)
+                for s in suggestions:
+                    capo = f"capo {s.capo}, play {s.shapes_key} shapes" if s.capo else "no capo"
+                    print(f"  {s.key:<3} {capo:<28} difficulty {s.difficulty:.2f}  hard chords {s.hard_chords}")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Chord Chart Transposer command line
+Batch transpose, format, number and export chord charts without the GUI
+"""
+
+import argparse
+import os
+import re
+import sys
+from contextlib import contextmanager
+
+try:
+    from chord_transpose import ChordTransposer, PDFExporter
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose import ChordTransposer, PDFExporter
+
+from chord_formats import OUTPUT_EXTENSIONS, convert_library
+from chord_metrics import CHARTS_PROCESSED, STAGE_SECONDS
+from chord_profiling import MemoryProfiler, NullProfiler, PipelineProfiler
+from chord_transpose_gui_smart_format import NumberedChordConverter, SmartFormatter
+
+KEY_PATTERN = re.compile(r'Do\s*=\s*([A-G][#b]?)')
+
+
+class ChartProcessor:
+    """Runs the detect -> transpose -> format -> align -> number -> PDF stages for one chart"""
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler or NullProfiler()
+        self.transposer = ChordTransposer()
+        self.formatter = SmartFormatter()
+        self.number_converter = NumberedChordConverter()
+        self.pdf_exporter = None
+
+        if self.profiler.enabled:
+            for engine in (self.transposer, self.formatter, self.number_converter):
+                self.profiler.instrument(engine)
+
+    def process(self, content, target_key=None, number_style=None, chart_wide=False, apply_formatting=True):
+        """Return the processed chart text"""
+        stage = self._stage
+
+        with stage('detect'):
+            key_match = KEY_PATTERN.search(content)
+            source_key = key_match.group(1) if key_match else None
+            self.formatter.detect_time_signature(content)
+
+        if target_key:
+            if not source_key:
+                raise ValueError("No key found (looking for 'Do = X')")
+            with stage('transpose'):
+                content = self.transposer.transpose_chart(content, source_key, target_key)
+
+        if apply_formatting:
+            with stage('format'):
+                formatted = self.formatter.format_chart(content)
+            with stage('align'):
+                content = '\n'.join(self.formatter.align_chart(formatted.split('\n'), chart_wide=chart_wide))
+
+        if number_style:
+            with stage('number'):
+                content = self.number_converter.convert_chart_to_numbers(content, number_style == 'roman')
+
+        CHARTS_PROCESSED.inc()
+        return content
+
+    def export_pdf(self, content, filename, landscape=False):
+        """Render processed text to a PDF file"""
+        if self.pdf_exporter is None:
+            self.pdf_exporter = PDFExporter()
+            if self.profiler.enabled:
+                self.profiler.instrument(self.pdf_exporter)
+        with self._stage('pdf'):
+            self.pdf_exporter.export_to_pdf(content, filename, landscape_mode=landscape)
+
+    @contextmanager
+    def _stage(self, name):
+        """Profile a stage and record its latency in the metrics registry"""
+        with self.profiler.stage(name), STAGE_SECONDS.labels(name).time():
+            yield
+
+
+def output_path(source, output_dir, extension):
+    """Place an output file next to the source or in output_dir"""
+    base = os.path.splitext(os.path.basename(source))[0] + extension
+    return os.path.join(output_dir or os.path.dirname(os.path.abspath(source)), base)
+
+
+def cmd_process(args, profiler):
+    """Transpose, format and number chart files"""
+    processor = ChartProcessor(profiler)
+    to_stdout = not args.output_dir and not args.pdf and len(args.files) == 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    failures = 0
+    for path in args.files:
+        try:
+            with profiler.chart(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read().rstrip()
+
+                result = processor.process(content, target_key=args.to, number_style=args.numbers,
+                                           chart_wide=args.chart_wide, apply_formatting=not args.no_format)
+
+                if args.pdf:
+                    processor.export_pdf(result, output_path(path, args.output_dir, '.pdf'), landscape=args.landscape)
+                elif to_stdout:
+                    print(result)
+                else:
+                    suffix = f'.{args.to}' if args.to else '.formatted'
+                    with open(output_path(path, args.output_dir, suffix + '.txt'), 'w', encoding='utf-8') as f:
+                        f.write(result + '\n')
+        except Exception as e:
+            failures += 1
+            print(f"Error: {path}: {e}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+def cmd_convert(args, profiler):
+    """Convert charts between chart text, ChordPro and MusicXML"""
+    failures = 0
+    converted = 0
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    for source, destination, error in convert_library(args.sources, args.output_dir, args.to,
+                                                      workers=args.workers, apply_formatting=args.format):
+        if error:
+            failures += 1
+            print(f"Error: {source}: {error}", file=sys.stderr)
+        else:
+            converted += 1
+
+    print(f"Converted {converted} file(s), {failures} failed", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Chord chart transposer and formatter")
+    instrumentation = parser.add_mutually_exclusive_group()
+    instrumentation.add_argument('--profile', metavar='DIR',
+                                 help="profile the run and write a report and a .pstats file into DIR")
+    instrumentation.add_argument('--memory', action='store_true',
+                                 help="report tracemalloc peak and net allocation per stage on stderr")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    process_parser = subparsers.add_parser('process', help=cmd_process.__doc__)
+    process_parser.add_argument('files', nargs='+', help="chart text files")
+    process_parser.add_argument('--to', metavar='KEY', help="transpose to this key")
+    process_parser.add_argument('--numbers', choices=['roman', 'arabic'], help="convert to numbered notation")
+    process_parser.add_argument('--chart-wide', action='store_true', help="align all sections on one grid")
+    process_parser.add_argument('--no-format', action='store_true', help="skip smart formatting")
+    process_parser.add_argument('--pdf', action='store_true', help="export PDF instead of text")
+    process_parser.add_argument('--landscape', action='store_true', help="landscape PDF (2 columns)")
+    process_parser.add_argument('-o', '--output-dir', help="directory for output files")
+    process_parser.set_defaults(func=cmd_process)
+
+    convert_parser = subparsers.add_parser('convert', help=cmd_convert.__doc__)
+    convert_parser.add_argument('sources', nargs='+', help="files or directories (.txt, .cho, .musicxml, .mxl, ...)")
+    convert_parser.add_argument('--to', choices=sorted(OUTPUT_EXTENSIONS), required=True, help="output format")
+    convert_parser.add_argument('--format', action='store_true', help="smart-format and align chart text output")
+    convert_parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    convert_parser.add_argument('-o', '--output-dir', required=True, help="directory for converted files")
+    convert_parser.set_defaults(func=cmd_convert)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.memory:
+        profiler = MemoryProfiler()
+        profiler.start()
+        try:
+            return args.func(args, profiler)
+        finally:
+            profiler.restore()
+            profiler.stop()
+            print(profiler.format_report(), file=sys.stderr)
+
+    if not args.profile:
+        return args.func(args, NullProfiler())
+
+    profiler = PipelineProfiler(args.profile)
+    profiler.start()
+    try:
+        status = args.func(args, profiler)
+    finally:
+        profiler.stop()
+        profiler.restore()
+        report_path, stats_path = profiler.write_report()
+        print(f"Profile written to {report_path} ({stats_path})", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
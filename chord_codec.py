@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+Compact binary encoding of parsed chord charts
+Cheap IPC format for handing charts to worker processes, with optional
+multiprocessing.shared_memory transport
+"""
+
+import os
+import sys
+from multiprocessing import shared_memory
+
+try:
+    from chord_pipeline import KEY_PATTERN, ChartPipeline
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_pipeline import KEY_PATTERN, ChartPipeline
+
+from chord_transposition import CHORD_TOKEN_PATTERN
+
+MAGIC = b'CHC1'
+
+# Line records
+RECORD_TEXT = 0      # non-chord line, kept verbatim
+RECORD_FALLBACK = 1  # chord line whose bars could not be parsed, kept as formatted text
+RECORD_BARS = 2      # parsed chord line: bars of interned tokens
+RECORD_KEY = 3       # 'Do = X' line with the key stored as a packed note
+
+# Symbol table entries
+SYMBOL_LITERAL = 0
+SYMBOL_CHORD = 1
+
+# A note is packed into one byte: pitch class in the low nibble, accidental above it
+NATURAL, SHARP, FLAT = 0, 1, 2
+NO_NOTE = 0xFF
+NATURAL_PITCHES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+NATURAL_NAMES = {pitch: letter for letter, pitch in NATURAL_PITCHES.items()}
+SHARP_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+FLAT_NAMES = ('C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B')
+
+
+def pack_note(name):
+    """'Bb' -> packed byte; any spelling (Cb, E#, ...) round-trips"""
+    pitch = NATURAL_PITCHES[name[0]]
+    if len(name) == 1:
+        return pitch
+    if name[1] == '#':
+        return ((pitch + 1) % 12) | (SHARP << 4)
+    return ((pitch - 1) % 12) | (FLAT << 4)
+
+
+def unpack_note(packed):
+    """Packed byte -> note name"""
+    pitch, accidental = packed & 0x0F, packed >> 4
+    if accidental == SHARP:
+        return NATURAL_NAMES[(pitch - 1) % 12] + '#'
+    if accidental == FLAT:
+        return NATURAL_NAMES[(pitch + 1) % 12] + 'b'
+    return NATURAL_NAMES[pitch]
+
+
+def transpose_note(packed, semitones, prefer_flats):
+    """Transpose a packed note, spelling it like TranspositionTable does"""
+    names = FLAT_NAMES if prefer_flats else SHARP_NAMES
+    return pack_note(names[((packed & 0x0F) + semitones) % 12])
+
+
+def write_varint(out, value):
+    """Append an unsigned LEB128 varint to a bytearray"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    """Read a varint at pos; returns (value, next_pos)"""
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    result = byte & 0x7F
+    shift = 7
+    while True:
+        pos += 1
+        byte = data[pos]
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos + 1
+        shift += 7
+
+
+def _write_string(out, text):
+    encoded = text.encode('utf-8')
+    write_varint(out, len(encoded))
+    out += encoded
+
+
+def _read_string(data, pos):
+    length, pos = read_varint(data, pos)
+    return bytes(data[pos:pos + length]).decode('utf-8'), pos + length
+
+
+class ChartCodec:
+    """Encodes charts parsed the way ChartPipeline parses them
+
+    Layout: magic, the chart's symbol table (one length-prefixed entry per
+    distinct token, with chord roots and basses as packed pitch-class
+    bytes), the byte length of every line record as varints, then the
+    records. Chord tokens in bars are varint symbol ids (0 is the '.' beat),
+    so a typical chord line costs about one byte per token and transposing
+    a chart only rewrites its symbol table. Symbol entries are cached in
+    both directions, since charts share a small chord vocabulary.
+    """
+
+    def __init__(self, pipeline=None, max_cached_symbols=65536):
+        self.pipeline = pipeline or ChartPipeline()
+        self.max_cached_symbols = max_cached_symbols
+        self._entries = {}   # token -> length-prefixed symbol entry
+        self._symbols = {}   # symbol entry -> token
+
+    def parse(self, content):
+        """Split a chart into (lines, rows) as used by ChartPipeline"""
+        lines = content.split('\n')
+        is_chord_line = self.pipeline.formatter.is_chord_line
+        parse_row = self.pipeline._parse_row
+        return lines, [parse_row(line, None) if is_chord_line(line) else None for line in lines]
+
+    def encode(self, content):
+        """Parse and encode a chart"""
+        return self.encode_parsed(*self.parse(content))
+
+    def _symbol_entry(self, token):
+        """Length-prefixed symbol table entry for a token"""
+        entry = self._entries.get(token)
+        if entry is not None:
+            return entry
+
+        match = CHORD_TOKEN_PATTERN.match(token)
+        if match:
+            root, quality, bass, annotation = match.groups()
+            body = bytearray((SYMBOL_CHORD, pack_note(root), pack_note(bass) if bass else NO_NOTE))
+            _write_string(body, quality)
+            body += (annotation or '').encode('utf-8')
+        else:
+            body = bytearray((SYMBOL_LITERAL,))
+            body += token.encode('utf-8')
+
+        entry = bytearray()
+        write_varint(entry, len(body))
+        entry = bytes(entry + body)
+        if len(self._entries) >= self.max_cached_symbols:
+            self._entries.clear()
+        self._entries[token] = entry
+        return entry
+
+    def _entry_symbol(self, body):
+        """Token for a symbol table entry (without its length prefix)"""
+        symbol = self._symbols.get(body)
+        if symbol is not None:
+            return symbol
+
+        if body[0] == SYMBOL_LITERAL:
+            symbol = body[1:].decode('utf-8')
+        else:
+            quality, pos = _read_string(body, 3)
+            symbol = unpack_note(body[1]) + quality
+            if body[2] != NO_NOTE:
+                symbol += '/' + unpack_note(body[2])
+            symbol += body[pos:].decode('utf-8')
+
+        if len(self._symbols) >= self.max_cached_symbols:
+            self._symbols.clear()
+        self._symbols[body] = symbol
+        return symbol
+
+    def encode_parsed(self, lines, rows):
+        """Encode already parsed (lines, rows)"""
+        symbols = {'.': 0}
+        symbol_table = bytearray()
+        symbol_entry = self._symbol_entry
+
+        def symbol_id(token):
+            sid = symbols[token] = len(symbols)
+            symbol_table.extend(symbol_entry(token))
+            return sid
+
+        get_symbol = symbols.get
+        records = bytearray()
+        lengths = []
+        for line, row in zip(lines, rows):
+            start = len(records)
+            if row is None:
+                key_match = KEY_PATTERN.search(line) if 'Do' in line else None
+                if key_match:
+                    records.append(RECORD_KEY)
+                    _write_string(records, line[:key_match.start(1)])
+                    records.append(pack_note(key_match.group(1)))
+                    _write_string(records, line[key_match.end(1):])
+                else:
+                    records.append(RECORD_TEXT)
+                    _write_string(records, line)
+            elif isinstance(row, str):
+                records.append(RECORD_FALLBACK)
+                _write_string(records, row)
+            else:
+                # Bar lengths first, then every token id of the row
+                counts = [len(tokens) for tokens in row]
+                ids = [sid if (sid := get_symbol(token)) is not None else symbol_id(token)
+                       for tokens in row for token in tokens]
+                records.append(RECORD_BARS)
+                write_varint(records, len(row))
+                if len(symbols) <= 0x80 and (not counts or max(counts) < 0x80):
+                    # Every varint is a single byte
+                    records += bytes(counts)
+                    records += bytes(ids)
+                else:
+                    for value in counts:
+                        write_varint(records, value)
+                    for value in ids:
+                        write_varint(records, value)
+            lengths.append(len(records) - start)
+
+        out = bytearray(MAGIC)
+        write_varint(out, len(symbols) - 1)
+        out += symbol_table
+        write_varint(out, len(lengths))
+        if not lengths or max(lengths) < 0x80:
+            out += bytes(lengths)
+        else:
+            for length in lengths:
+                write_varint(out, length)
+        out += records
+        return bytes(out)
+
+    @staticmethod
+    def _symbol_spans(data):
+        """(start, end) of every symbol table entry; returns (spans, pos)"""
+        if data[:4] != MAGIC:
+            raise ValueError("Not an encoded chart")
+        count, pos = read_varint(data, 4)
+        spans = []
+        for _ in range(count):
+            length, pos = read_varint(data, pos)
+            spans.append((pos, pos + length))
+            pos += length
+        return spans, pos
+
+    def _read_header(self, data):
+        """Read the symbol table; returns (symbols, pos)"""
+        if data[:4] != MAGIC:
+            raise ValueError("Not an encoded chart")
+        count, pos = read_varint(data, 4)
+        cached_symbol = self._symbols.get
+        entry_symbol = self._entry_symbol
+        symbols = ['.']
+        for _ in range(count):
+            length = data[pos]
+            if length < 0x80:
+                pos += 1
+            else:
+                length, pos = read_varint(data, pos)
+            body = data[pos:pos + length]
+            symbols.append(cached_symbol(body) or entry_symbol(body))
+            pos += length
+        return symbols, pos
+
+    @staticmethod
+    def _read_lengths(data, pos):
+        count, pos = read_varint(data, pos)
+        lengths = data[pos:pos + count]
+        if not lengths or max(lengths) < 0x80:
+            return list(lengths), pos + count
+
+        lengths = []
+        for _ in range(count):
+            length, pos = read_varint(data, pos)
+            lengths.append(length)
+        return lengths, pos
+
+    def decode(self, data):
+        """Decode to (lines, rows); lines of chord rows are empty strings"""
+        data = bytes(data)
+        symbols, pos = self._read_header(data)
+        lengths, pos = self._read_lengths(data, pos)
+
+        small_table = len(symbols) <= 0x80
+        symbol_at = symbols.__getitem__
+        lines = []
+        rows = []
+        for length in lengths:
+            kind = data[pos]
+            end = pos + length
+            pos += 1
+            if kind == RECORD_BARS:
+                bar_count, pos = read_varint(data, pos)
+                counts = data[pos:pos + bar_count]
+                if small_table and (not counts or max(counts) < 0x80):
+                    # Single-byte varints: the ids run to the end of the record
+                    tokens = list(map(symbol_at, data[pos + bar_count:end]))
+                else:
+                    counts = []
+                    for _ in range(bar_count):
+                        count, pos = read_varint(data, pos)
+                        counts.append(count)
+                    tokens = []
+                    while pos < end:
+                        sid, pos = read_varint(data, pos)
+                        tokens.append(symbols[sid])
+
+                row = []
+                i = 0
+                for count in counts:
+                    row.append(tokens[i:i + count])
+                    i += count
+                lines.append('')
+                rows.append(row)
+            elif kind == RECORD_FALLBACK:
+                text, _ = _read_string(data, pos)
+                lines.append(text)
+                rows.append(text)
+            elif kind == RECORD_KEY:
+                prefix, pos = _read_string(data, pos)
+                note = unpack_note(data[pos])
+                suffix, _ = _read_string(data, pos + 1)
+                lines.append(prefix + note + suffix)
+                rows.append(None)
+            else:
+                text, _ = _read_string(data, pos)
+                lines.append(text)
+                rows.append(None)
+            pos = end
+        return lines, rows
+
+    def render(self, data, chart_wide=False):
+        """Decode and emit formatted, aligned chart text"""
+        lines, rows = self.decode(data)
+        return '\n'.join(self.pipeline._emit(lines, rows, chart_wide))
+
+    def transpose(self, data, semitones, prefer_flats):
+        """Transpose an encoded chart without decoding its lines
+
+        Only the packed notes in the symbol table and in 'Do = X' records
+        change; every entry and record keeps its length, so the bytes are
+        patched in place.
+        """
+        data = bytes(data)
+        spans, header_end = self._symbol_spans(data)
+        semitones %= 12
+        out = bytearray(data)
+
+        for start, _ in spans:
+            if out[start] == SYMBOL_CHORD:
+                out[start + 1] = transpose_note(out[start + 1], semitones, prefer_flats)
+                if out[start + 2] != NO_NOTE:
+                    out[start + 2] = transpose_note(out[start + 2], semitones, prefer_flats)
+
+        lengths, pos = self._read_lengths(out, header_end)
+        for length in lengths:
+            if out[pos] == RECORD_KEY:
+                prefix_length, note_pos = read_varint(out, pos + 1)
+                note_pos += prefix_length
+                out[note_pos] = transpose_note(out[note_pos], semitones, prefer_flats)
+            pos += length
+        return bytes(out)
+
+
+class SharedChartBatch:
+    """Encoded charts packed back to back into one shared memory block
+
+    Workers receive (name, offset, length) triples instead of the chart
+    bytes and read their chart straight from the block. Create the batch
+    before starting the worker pool, so the workers share the parent's
+    resource tracker and do not try to clean the block up themselves.
+    """
+
+    def __init__(self, encoded_charts):
+        encoded_charts = list(encoded_charts)
+        size = sum(len(data) for data in encoded_charts)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.spans = []
+        offset = 0
+        for data in encoded_charts:
+            self.shm.buf[offset:offset + len(data)] = data
+            self.spans.append((offset, len(data)))
+            offset += len(data)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def jobs(self):
+        """One (name, offset, length) triple per chart"""
+        return [(self.shm.name, offset, length) for offset, length in self.spans]
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_attached = None
+
+
+def read_shared(name, offset, length):
+    """Copy one encoded chart out of a shared block
+
+    Each worker keeps its most recent block attached, since consecutive jobs
+    almost always come from the same batch.
+    """
+    global _attached
+    if _attached is None or _attached.name != name:
+        if _attached is not None:
+            _attached.close()
+        try:
+            _attached = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always registers the block with the resource tracker
+            _attached = shared_memory.SharedMemory(name=name)
+    return bytes(_attached.buf[offset:offset + length])
+
+
+_worker_codec = None
+
+
+def worker_codec():
+    """Per-process codec, created on first use"""
+    global _worker_codec
+    if _worker_codec is None:
+        _worker_codec = ChartCodec()
+    return _worker_codec
+
+
+def render_encoded(data, chart_wide=False):
+    """Worker entry point: encoded chart -> formatted text"""
+    return worker_codec().render(data, chart_wide)
+
+
+def render_shared(job, chart_wide=False):
+    """Worker entry point: (name, offset, length) -> formatted text"""
+    return worker_codec().render(read_shared(*job), chart_wide)
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+Pre-warmed chart worker daemon
+Loads the engine and the PDF stack once, forks workers from the warmed parent
+and serves transpose/format/number/PDF jobs over a local Unix socket
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    from chord_cli import ChartProcessor, output_path
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_cli import ChartProcessor, output_path
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f'chord_daemon_{os.getuid()}.sock')
+# Standard fonts the PDF exporters use; loading their metrics is part of the warm-up
+WARM_FONTS = ('Courier', 'Courier-Bold', 'Helvetica', 'Helvetica-Bold')
+
+WARM_CHART = """Amazing Grace
+Do = C
+Time Signature = 3/4
+
+Verse 1
+| C  C7 | F  C | C  Am | G |
+Amazing grace how sweet the sound
+| C  C7 | F  C | Am  G | C |
+That saved a wretch like me"""
+
+
+class DaemonError(RuntimeError):
+    """A job failed in the daemon, or the daemon could not be reached"""
+
+
+def warm_up(processor):
+    """Run every stage once so imports, compiled patterns and font metrics are loaded
+
+    Returns True when the PDF stack (reportlab) is available.
+    """
+    processor.process(WARM_CHART, target_key='G', number_style='roman')
+    processor.process(WARM_CHART, number_style='arabic', chart_wide=True)
+    try:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfgen import canvas  # noqa: F401
+    except ImportError:
+        return False
+    for font in WARM_FONTS:
+        pdfmetrics.getFont(font)
+    fd, scratch_path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        processor.export_pdf(processor.process(WARM_CHART), scratch_path)
+    finally:
+        os.remove(scratch_path)
+    return True
+
+
+def handle_job(processor, request, pdf_available):
+    """Run one decoded request; returns the response dict"""
+    op = request.get('op')
+    start = time.perf_counter()
+    try:
+        if op == 'ping':
+            response = {'ok': True, 'pid': os.getpid(), 'pdf': pdf_available}
+        elif op in ('process', 'pdf'):
+            if op == 'pdf' and not pdf_available:
+                raise DaemonError("PDF export requires reportlab library. Install with: pip install reportlab")
+            text = processor.process(request['content'], target_key=request.get('target_key'),
+                                     number_style=request.get('number_style'),
+                                     chart_wide=request.get('chart_wide', False),
+                                     apply_formatting=request.get('format', True))
+            if op == 'pdf':
+                processor.export_pdf(text, request['output'], landscape=request.get('landscape', False))
+                response = {'ok': True, 'output': request['output']}
+            else:
+                response = {'ok': True, 'text': text}
+        else:
+            raise DaemonError(f"Unknown operation '{op}'")
+    except KeyError as e:
+        response = {'ok': False, 'error': f"Missing field {e}"}
+    except Exception as e:
+        response = {'ok': False, 'error': str(e)}
+    response['elapsed'] = time.perf_counter() - start
+    return response
+
+
+def serve_connection(conn, processor, pdf_available):
+    """Answer newline-delimited JSON requests until the client hangs up; returns the job count"""
+    jobs = 0
+    with conn.makefile('rb') as reader, conn.makefile('wb') as writer:
+        for line in reader:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {'ok': False, 'error': "Request is not valid JSON"}
+            else:
+                if not isinstance(request, dict):
+                    response = {'ok': False, 'error': "Request must be a JSON object"}
+                elif request.get('op') == 'shutdown':
+                    writer.write(b'{"ok": true}\n')
+                    writer.flush()
+                    # The parent stops every worker, this one included
+                    os.kill(os.getppid(), signal.SIGTERM)
+                    break
+                else:
+                    response = handle_job(processor, request, pdf_available)
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            writer.flush()
+            jobs += 1
+    return jobs
+
+
+class WorkerDaemon:
+    """Pre-fork server: one warmed parent, `workers` forked children accepting jobs
+
+    The parent pays interpreter start-up, imports, pattern compilation and
+    font loading once. Children inherit all of it through fork, so a job
+    costs only its own work. Each child serves one connection at a time and
+    is replaced when it exits, which it does after `max_jobs` jobs when set,
+    to bound memory growth.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, workers=None, max_jobs=None):
+        self.socket_path = socket_path
+        self.workers = workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.children = set()
+        self.running = False
+        self.listener = None
+        self.processor = None
+        self.pdf_available = False
+
+    def bind(self):
+        """Create the listening socket, replacing a stale one left by a dead daemon"""
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except OSError:
+                os.remove(self.socket_path)
+            else:
+                raise DaemonError(f"A daemon is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Only the current user may submit jobs; they read and write files with the daemon's rights
+        old_umask = os.umask(0o177)
+        try:
+            self.listener.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        self.listener.listen(max(64, self.workers * 4))
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid:
+            self.children.add(pid)
+            return
+        # Child: default signal handling, serve until max_jobs, never return into the parent's code
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            jobs = 0
+            while self.max_jobs is None or jobs < self.max_jobs:
+                conn, _ = self.listener.accept()
+                with conn:
+                    try:
+                        jobs += serve_connection(conn, self.processor, self.pdf_available)
+                    except OSError:
+                        pass  # client went away mid-response
+        except Exception as e:
+            print(f"Worker {os.getpid()}: {e}", file=sys.stderr)
+            status = 1
+        finally:
+            os._exit(status)
+
+    def _stop(self, signum, frame):
+        self.running = False
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self):
+        """Warm up, fork the workers and replace any that exit until SIGTERM/SIGINT"""
+        self.bind()
+        try:
+            self.processor = ChartProcessor()
+            self.pdf_available = warm_up(self.processor)
+            # Move everything loaded so far out of the collector's reach, so collections
+            # in the children do not touch (and copy) the shared pages
+            gc.collect()
+            gc.freeze()
+
+            self.running = True
+            signal.signal(signal.SIGTERM, self._stop)
+            signal.signal(signal.SIGINT, self._stop)
+            for _ in range(self.workers):
+                self._spawn()
+            print(f"Serving on {self.socket_path} with {self.workers} worker(s), "
+                  f"PDF {'ready' if self.pdf_available else 'unavailable (no reportlab)'}", file=sys.stderr)
+
+            while self.children:
+                pid, status = os.wait()
+                self.children.discard(pid)
+                if self.running:
+                    self._spawn()
+        finally:
+            self.listener.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+class DaemonClient:
+    """Submits jobs to a running WorkerDaemon over one connection"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+
+    def request(self, **fields):
+        """Send one request; returns the response dict, raising DaemonError on failure"""
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(self.timeout)
+            try:
+                self._sock.connect(self.socket_path)
+            except OSError as e:
+                self.close()
+                raise DaemonError(f"No daemon on {self.socket_path}: {e}")
+            self._reader = self._sock.makefile('rb')
+        self._sock.sendall(json.dumps(fields).encode('utf-8') + b'\n')
+        line = self._reader.readline()
+        if not line:
+            self.close()
+            raise DaemonError("Daemon closed the connection")
+        response = json.loads(line)
+        if not response['ok']:
+            raise DaemonError(response['error'])
+        return response
+
+    def ping(self):
+        return self.request(op='ping')
+
+    def process(self, content, target_key=None, number_style=None, chart_wide=False, apply_formatting=True):
+        """ChartProcessor.process in the daemon; returns the processed text"""
+        return self.request(op='process', content=content, target_key=target_key, number_style=number_style,
+                            chart_wide=chart_wide, format=apply_formatting)['text']
+
+    def export_pdf(self, content, filename, target_key=None, number_style=None, chart_wide=False,
+                   apply_formatting=True, landscape=False):
+        """Process a chart and export it to filename in the daemon"""
+        self.request(op='pdf', content=content, output=os.path.abspath(filename), target_key=target_key,
+                     number_style=number_style, chart_wide=chart_wide, format=apply_formatting, landscape=landscape)
+
+    def shutdown(self):
+        """Ask the daemon to stop its workers and exit"""
+        self.request(op='shutdown')
+        self.close()
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def wait_for_daemon(socket_path, timeout=30.0):
+    """Block until a daemon answers a ping on socket_path"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with DaemonClient(socket_path) as client:
+                return client.ping()
+        except DaemonError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def cmd_serve(args):
+    try:
+        WorkerDaemon(args.socket, args.workers, args.max_jobs).serve_forever()
+    except DaemonError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_submit(args):
+    to_stdout = not args.output_dir and not args.pdf and len(args.files) == 1
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    failures = 0
+    with DaemonClient(args.socket) as client:
+        for path in args.files:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read().rstrip()
+                options = dict(target_key=args.to, number_style=args.numbers, chart_wide=args.chart_wide,
+                               apply_formatting=not args.no_format)
+                if args.pdf:
+                    client.export_pdf(content, output_path(path, args.output_dir, '.pdf'),
+                                      landscape=args.landscape, **options)
+                    continue
+
+                result = client.process(content, **options)
+                if to_stdout:
+                    print(result)
+                else:
+                    suffix = f'.{args.to}' if args.to else '.formatted'
+                    with open(output_path(path, args.output_dir, suffix + '.txt'), 'w', encoding='utf-8') as f:
+                        f.write(result + '\n')
+            except (OSError, DaemonError) as e:
+                failures += 1
+                print(f"Error: {path}: {e}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def cmd_stop(args):
+    try:
+        DaemonClient(args.socket).shutdown()
+    except DaemonError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_bench(args):
+    """Per-job time: a fresh chord_cli.py process vs the daemon vs the work itself"""
+    chart_dir = tempfile.mkdtemp(prefix='chord_daemon_')
+    chart_path = os.path.join(chart_dir, 'song.txt')
+    with open(chart_path, 'w', encoding='utf-8') as f:
+        f.write(WARM_CHART + '\n')
+    cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chord_cli.py')
+    socket_path = os.path.join(chart_dir, 'daemon.sock')
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--socket', socket_path, 'serve',
+                               '--workers', '1'], stderr=subprocess.DEVNULL)
+    try:
+        pdf = wait_for_daemon(socket_path)['pdf'] and args.pdf
+        extra = ['--pdf', '-o', chart_dir] if pdf else ['-o', chart_dir]
+
+        def per_job(func):
+            start = time.perf_counter()
+            for _ in range(args.jobs):
+                func()
+            return (time.perf_counter() - start) / args.jobs
+
+        spawn = per_job(lambda: subprocess.run([sys.executable, cli, 'process', chart_path, '--to', 'G'] + extra,
+                                               check=True))
+        with DaemonClient(socket_path) as client:
+            if pdf:
+                daemon = per_job(lambda: client.export_pdf(WARM_CHART, os.path.join(chart_dir, 'd.pdf'),
+                                                           target_key='G'))
+            else:
+                daemon = per_job(lambda: client.process(WARM_CHART, target_key='G'))
+        processor = ChartProcessor()
+        warm_up(processor)
+        if pdf:
+            work = per_job(lambda: processor.export_pdf(processor.process(WARM_CHART, target_key='G'),
+                                                        os.path.join(chart_dir, 'w.pdf')))
+        else:
+            work = per_job(lambda: processor.process(WARM_CHART, target_key='G'))
+    finally:
+        server.terminate()
+        server.wait()
+        for name in os.listdir(chart_dir):
+            os.remove(os.path.join(chart_dir, name))
+        os.rmdir(chart_dir)
+
+    print(f"{args.jobs} {'PDF' if pdf else 'text'} jobs")
+    print(f"  new process per job  {spawn * 1000:9.2f} ms/job")
+    print(f"  daemon               {daemon * 1000:9.2f} ms/job")
+    print(f"  in-process work      {work * 1000:9.2f} ms/job")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-warmed chart worker daemon on a Unix socket")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help=f"socket path (default: {DEFAULT_SOCKET})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="warm up, fork workers and serve jobs")
+    serve_parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    serve_parser.add_argument('--max-jobs', type=int, help="replace a worker after this many jobs")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    submit_parser = subparsers.add_parser('submit', help="process chart files in the daemon")
+    submit_parser.add_argument('files', nargs='+', help="chart text files")
+    submit_parser.add_argument('--to', metavar='KEY', help="transpose to this key")
+    submit_parser.add_argument('--numbers', choices=['roman', 'arabic'], help="convert to numbered notation")
+    submit_parser.add_argument('--chart-wide', action='store_true', help="align all sections on one grid")
+    submit_parser.add_argument('--no-format', action='store_true', help="skip smart formatting")
+    submit_parser.add_argument('--pdf', action='store_true', help="export PDF instead of text")
+    submit_parser.add_argument('--landscape', action='store_true', help="landscape PDF (2 columns)")
+    submit_parser.add_argument('-o', '--output-dir', help="directory for output files")
+    submit_parser.set_defaults(func=cmd_submit)
+
+    stop_parser = subparsers.add_parser('stop', help="shut the daemon down")
+    stop_parser.set_defaults(func=cmd_stop)
+
+    bench_parser = subparsers.add_parser('bench', help=cmd_bench.__doc__)
+    bench_parser.add_argument('--jobs', type=int, default=20, help="jobs per variant")
+    bench_parser.add_argument('--pdf', action='store_true', help="PDF jobs (needs reportlab)")
+    bench_parser.set_defaults(func=cmd_bench)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+"""
+ChordPro and MusicXML import/export
+Streaming converters between external formats and the '|'-bar, 'Do = X' chart
+format understood by SmartFormatter, plus a parallel bulk converter
+"""
+
+import os
+import re
+import sys
+import zipfile
+from itertools import islice
+from multiprocessing import Pool
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+    from chord_classifier import LINE_BLANK, LINE_CHORD, LINE_HEADER, LINE_KEY, ChordLineClassifier
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_classifier import LINE_BLANK, LINE_CHORD, LINE_HEADER, LINE_KEY, ChordLineClassifier
+
+from chord_transposition import CHORD_TOKEN_PATTERN
+
+FORMAT_EXTENSIONS = {
+    '.txt': 'chart',
+    '.cho': 'chordpro', '.chopro': 'chordpro', '.chordpro': 'chordpro', '.crd': 'chordpro', '.pro': 'chordpro',
+    '.xml': 'musicxml', '.musicxml': 'musicxml', '.mxl': 'musicxml',
+}
+OUTPUT_EXTENSIONS = {'chart': '.txt', 'chordpro': '.cho', 'musicxml': '.musicxml'}
+
+KEY_LINE_PATTERN = re.compile(r'Do\s*=\s*([A-G][#b]?)')
+META_LINE_PATTERN = re.compile(r'\s*([^=]+?)\s*=\s*(.*?)\s*$')
+TIME_PATTERN = re.compile(r'(\d+)\s*/\s*(\d+)')
+
+# ChordPro
+DIRECTIVE_PATTERN = re.compile(r'\s*\{\s*([A-Za-z_-]+)\s*(?:[:\s]\s*(.*?))?\s*\}\s*$')
+INLINE_CHORD_PATTERN = re.compile(r'\[([^\]]*)\]')
+LABEL_ATTRIBUTE_PATTERN = re.compile(r'label\s*=\s*"([^"]*)"')
+GRID_BARLINE_PATTERN = re.compile(r':?\|\|?:?')
+SECTION_NAMES = {
+    'chorus': 'Chorus', 'soc': 'Chorus',
+    'verse': 'Verse', 'sov': 'Verse',
+    'bridge': 'Bridge', 'sob': 'Bridge',
+    'grid': None, 'sog': None,
+}
+DIRECTIVE_ALIASES = {'t': 'title', 'st': 'subtitle', 'c': 'comment', 'ci': 'comment', 'cb': 'comment',
+                     'comment_italic': 'comment', 'comment_box': 'comment', 'highlight': 'comment'}
+
+# MusicXML harmony kinds <-> chord quality suffixes
+KIND_TO_QUALITY = {
+    'major': '', 'minor': 'm', 'augmented': 'aug', 'diminished': 'dim',
+    'dominant': '7', 'major-seventh': 'maj7', 'minor-seventh': 'm7', 'diminished-seventh': 'dim7',
+    'augmented-seventh': 'aug7', 'half-diminished': 'm7b5', 'major-minor': 'mM7',
+    'major-sixth': '6', 'minor-sixth': 'm6',
+    'dominant-ninth': '9', 'major-ninth': 'maj9', 'minor-ninth': 'm9',
+    'dominant-11th': '11', 'major-11th': 'maj11', 'minor-11th': 'm11',
+    'dominant-13th': '13', 'major-13th': 'maj13', 'minor-13th': 'm13',
+    'suspended-second': 'sus2', 'suspended-fourth': 'sus4', 'power': '5',
+}
+QUALITY_TO_KIND = {quality: kind for kind, quality in KIND_TO_QUALITY.items()}
+QUALITY_TO_KIND.update({'M7': 'major-seventh', 'o': 'diminished', '+': 'augmented', 'sus': 'suspended-fourth'})
+FIFTHS_TO_KEY = {-7: 'Cb', -6: 'Gb', -5: 'Db', -4: 'Ab', -3: 'Eb', -2: 'Bb', -1: 'F', 0: 'C',
+                 1: 'G', 2: 'D', 3: 'A', 4: 'E', 5: 'B', 6: 'F#', 7: 'C#'}
+KEY_TO_FIFTHS = {key: fifths for fifths, key in FIFTHS_TO_KEY.items()}
+KEY_TO_FIFTHS.update({'D#': -3, 'G#': -4, 'A#': -2})
+# MusicXML divisions per quarter note for 4/4-style meters: bars of 1, 2, 3, 4, 6 or 12 slots split evenly
+MUSICXML_DIVISIONS = 12
+
+
+def parse_time_signature(value, default=(4, 4)):
+    """Parse '3/4' into (3, 4)"""
+    match = TIME_PATTERN.search(value or '')
+    return (int(match.group(1)), int(match.group(2))) if match else default
+
+
+def bar_line(chords, beats):
+    """Build a chord line with one chord per bar"""
+    return '| ' + ' | '.join(' '.join([chord] + ['.'] * (beats - 1)) for chord in chords) + ' |'
+
+
+# ---------------------------------------------------------------------------
+# ChordPro
+# ---------------------------------------------------------------------------
+
+def read_chordpro(lines):
+    """Convert ChordPro lines to chart lines (generator)
+
+    Lyric lines with inline [chords] become a chord line with one chord per
+    bar followed by the lyric text. {start_of_grid} blocks are already bar
+    notation and are passed through. Tab blocks have no chart equivalent and
+    are skipped.
+    """
+    header = {}
+    header_done = False
+    beats = 4
+    in_tab = False
+    section_ended = False
+
+    def header_lines():
+        title = header.get('title')
+        if title:
+            subtitle = header.get('subtitle')
+            yield f"{title} ({subtitle})" if subtitle else title
+        if 'key' in header:
+            yield f"Do = {header['key']}"
+        if 'time' in header:
+            yield f"Time Signature = {header['time']}"
+        if 'tempo' in header:
+            yield f"Tempo (1/4) = {header['tempo']} BPM"
+        for name, value in header.get('meta', []):
+            yield f"{name} = {value}"
+        yield ''
+
+    for raw in lines:
+        line = raw.rstrip('\r\n')
+        if line.startswith('#'):
+            continue
+
+        directive = DIRECTIVE_PATTERN.match(line)
+        if directive:
+            name = directive.group(1).lower().replace('-', '_')
+            name = DIRECTIVE_ALIASES.get(name, name)
+            value = (directive.group(2) or '').strip()
+
+            if name in ('start_of_tab', 'sot'):
+                in_tab = True
+                continue
+            if name in ('end_of_tab', 'eot'):
+                in_tab = False
+                continue
+
+            if name in ('title', 'subtitle', 'key', 'time', 'tempo') and not header_done:
+                header[name] = value
+                if name == 'time':
+                    beats = parse_time_signature(value)[0]
+                continue
+            if name == 'meta' and not header_done:
+                meta_name, _, meta_value = value.partition(' ')
+                header.setdefault('meta', []).append((meta_name.strip().capitalize(), meta_value.strip()))
+                continue
+            if name == 'time':
+                beats = parse_time_signature(value)[0]
+                yield f"Time Signature = {value}"
+                continue
+
+            if not header_done:
+                header_done = True
+                yield from header_lines()
+
+            if name.startswith('start_of_') or name in SECTION_NAMES:
+                section = name[len('start_of_'):] if name.startswith('start_of_') else name
+                label_match = LABEL_ATTRIBUTE_PATTERN.search(value)
+                label = label_match.group(1) if label_match else value
+                label = label or SECTION_NAMES.get(section, section.capitalize())
+                if section_ended:
+                    section_ended = False
+                    yield ''
+                if label:
+                    yield f"{label} :"
+            elif name.startswith('end_of_') or name in ('eoc', 'eov', 'eob', 'eog'):
+                section_ended = True
+            elif name == 'comment' and value:
+                yield value
+            continue
+
+        if in_tab:
+            continue
+
+        if not header_done:
+            if not line.strip():
+                continue
+            header_done = True
+            yield from header_lines()
+
+        if section_ended:
+            # Sections are separated by one blank line
+            section_ended = False
+            if line.strip():
+                yield ''
+
+        if '|' in line and '[' not in line:
+            # Grid line: normalize repeat and double bar lines to plain bars
+            yield GRID_BARLINE_PATTERN.sub('|', line).rstrip()
+            continue
+
+        chords = INLINE_CHORD_PATTERN.findall(line)
+        lyric = INLINE_CHORD_PATTERN.sub('', line).rstrip()
+        if chords:
+            yield bar_line([chord.strip() for chord in chords if chord.strip()], beats)
+        if lyric or not chords:
+            yield lyric
+
+    if not header_done and header:
+        yield from header_lines()
+
+
+def write_chordpro(lines):
+    """Convert chart lines to ChordPro lines (generator)
+
+    Chord lines are written as {start_of_grid} blocks labelled with the
+    section name that precedes them.
+    """
+    classifier = ChordLineClassifier()
+    seen_content = False
+    in_grid = False
+    label = None
+
+    for line in lines:
+        kind = classifier.classify(line, first_line=not seen_content and '=' not in line)
+
+        if kind == LINE_CHORD:
+            if not in_grid:
+                yield '{start_of_grid: ' + label + '}' if label else '{start_of_grid}'
+                in_grid = True
+                label = None
+            yield line.strip()
+            seen_content = True
+            continue
+
+        if in_grid:
+            yield '{end_of_grid}'
+            in_grid = False
+        if label and kind != LINE_BLANK:
+            yield '{comment: ' + label + '}'
+            label = None
+
+        if kind == LINE_BLANK:
+            yield ''
+            continue
+
+        if kind == LINE_KEY:
+            yield '{key: ' + KEY_LINE_PATTERN.search(line).group(1) + '}'
+        elif kind == LINE_HEADER and not seen_content and '=' not in line:
+            yield '{title: ' + line.strip() + '}'
+        elif kind == LINE_HEADER and '=' in line:
+            name, value = META_LINE_PATTERN.match(line).groups()
+            lowered = name.lower()
+            if lowered.startswith('time signature'):
+                yield '{time: ' + value + '}'
+            elif lowered.startswith('tempo'):
+                tempo = re.search(r'\d+', value)
+                yield '{tempo: ' + (tempo.group(0) if tempo else value) + '}'
+            else:
+                yield '{meta: ' + name.lower().replace(' ', '_') + ' ' + value + '}'
+        elif kind == LINE_HEADER:
+            name, _, note = line.partition(':')
+            label = name.strip() + (f" ({note.strip()})" if note.strip() else '')
+        else:
+            yield line.rstrip()
+        seen_content = True
+
+    if in_grid:
+        yield '{end_of_grid}'
+    if label:
+        yield '{comment: ' + label + '}'
+
+
+# ---------------------------------------------------------------------------
+# MusicXML
+# ---------------------------------------------------------------------------
+
+def _local(tag):
+    """Strip an XML namespace from a tag"""
+    return tag.rpartition('}')[2]
+
+
+def _child_text(elem, name, default=None):
+    for child in elem:
+        if _local(child.tag) == name:
+            return (child.text or '').strip()
+    return default
+
+
+def _child(elem, name):
+    for child in elem:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _harmony_symbol(harmony):
+    """Chord symbol for a <harmony> element, or None for N.C."""
+    root = _child(harmony, 'root')
+    if root is None:
+        return None
+    symbol = _child_text(root, 'root-step', '') + _alter(_child_text(root, 'root-alter'))
+
+    kind = _child(harmony, 'kind')
+    kind_value = (kind.text or '').strip() if kind is not None else 'major'
+    if kind_value == 'none':
+        return None
+    if kind_value in KIND_TO_QUALITY:
+        symbol += KIND_TO_QUALITY[kind_value]
+    elif kind is not None:
+        symbol += kind.get('text', '')
+
+    bass = _child(harmony, 'bass')
+    if bass is not None:
+        symbol += '/' + _child_text(bass, 'bass-step', '') + _alter(_child_text(bass, 'bass-alter'))
+    return symbol
+
+
+def _alter(value):
+    if not value:
+        return ''
+    alter = int(float(value))
+    return '#' * alter if alter > 0 else 'b' * -alter
+
+
+def _open_musicxml(source):
+    """Open a .musicxml/.xml file or the root score inside a compressed .mxl"""
+    if not str(source).endswith('.mxl'):
+        return open(source, 'rb')
+
+    archive = zipfile.ZipFile(source)
+    container = ElementTree.fromstring(archive.read('META-INF/container.xml'))
+    for elem in container.iter():
+        if _local(elem.tag) == 'rootfile':
+            return archive.open(elem.get('full-path'))
+    raise ValueError(f"{source}: no rootfile in META-INF/container.xml")
+
+
+def read_musicxml(source, bars_per_line=4):
+    """Convert a MusicXML score to chart lines (generator)
+
+    Uses iterparse and clears each measure after it is converted, so memory
+    stays bounded by one measure. Harmony from the first part is used; each
+    chord is placed on the beat where it occurs and empty bars repeat the
+    previous chord. Rehearsal marks become section labels.
+    """
+    stream = _open_musicxml(source) if isinstance(source, (str, os.PathLike)) else source
+    title = None
+    key = None
+    beats, beat_type = 4, 4
+    divisions = 1
+    header_done = False
+    bars = []
+    measures_read = 0
+    last_chord = None
+
+    # State of the measure being read
+    position = 0
+    measure_chords = []
+    label = None
+
+    def flush_bars():
+        if bars:
+            line = '| ' + ' | '.join(bars) + ' |'
+            bars.clear()
+            return line
+        return None
+
+    try:
+        for event, elem in ElementTree.iterparse(stream, events=('start', 'end')):
+            tag = _local(elem.tag)
+
+            if event == 'start':
+                if tag == 'measure':
+                    position = 0
+                    measure_chords = []
+                continue
+
+            if tag in ('work-title', 'movement-title') and not title:
+                title = (elem.text or '').strip()
+            elif tag == 'divisions':
+                divisions = int(elem.text)
+            elif tag == 'fifths' and key is None:
+                key = FIFTHS_TO_KEY.get(int(elem.text), 'C')
+            elif tag == 'time':
+                beats = int(_child_text(elem, 'beats', beats))
+                beat_type = int(_child_text(elem, 'beat-type', beat_type))
+            elif tag == 'rehearsal':
+                label = (elem.text or '').strip() or None
+            elif tag == 'harmony':
+                offset = _child_text(elem, 'offset')
+                symbol = _harmony_symbol(elem)
+                if symbol:
+                    measure_chords.append((position + int(float(offset or 0)), symbol))
+                elem.clear()
+            elif tag == 'note':
+                if _child(elem, 'chord') is None and _child(elem, 'grace') is None:
+                    position += int(_child_text(elem, 'duration', 0))
+                elem.clear()
+            elif tag == 'backup':
+                position -= int(_child_text(elem, 'duration', 0))
+            elif tag == 'forward':
+                position += int(_child_text(elem, 'duration', 0))
+            elif tag == 'measure':
+                if not header_done:
+                    header_done = True
+                    if title:
+                        yield title
+                    if key:
+                        yield f"Do = {key}"
+                    yield f"Time Signature = {beats}/{beat_type}"
+                    yield ''
+
+                if label:
+                    line = flush_bars()
+                    if line:
+                        yield line
+                    if measures_read:
+                        yield ''
+                    yield f"{label} :"
+                    label = None
+
+                slots = ['.'] * beats
+                divisions_per_beat = divisions * 4 / beat_type
+                for offset, symbol in measure_chords:
+                    beat = min(max(int(offset / divisions_per_beat), 0), beats - 1)
+                    slots[beat] = symbol
+                    last_chord = symbol
+                if not measure_chords and last_chord:
+                    slots[0] = last_chord
+                bars.append(' '.join(slots))
+                measures_read += 1
+                if len(bars) == bars_per_line:
+                    yield flush_bars()
+                elem.clear()
+            elif tag == 'part':
+                # Chord symbols live in the first part
+                break
+    finally:
+        stream.close()
+
+    line = flush_bars()
+    if line:
+        yield line
+
+
+def _harmony_xml(symbol):
+    match = CHORD_TOKEN_PATTERN.match(symbol)
+    if not match:
+        return ''
+    root, quality, bass, annotation = match.groups()
+    quality = (quality or '') + (annotation or '')
+
+    parts = ['<harmony><root><root-step>', root[0], '</root-step>']
+    if len(root) > 1:
+        parts.append(f"<root-alter>{1 if root[1] == '#' else -1}</root-alter>")
+    parts.append('</root>')
+    if quality in QUALITY_TO_KIND:
+        parts.append(f"<kind>{QUALITY_TO_KIND[quality]}</kind>")
+    else:
+        parts.append(f"<kind text={quoteattr(quality)}>other</kind>")
+    if bass:
+        parts.append(f"<bass><bass-step>{bass[0]}</bass-step>")
+        if len(bass) > 1:
+            parts.append(f"<bass-alter>{1 if bass[1] == '#' else -1}</bass-alter>")
+        parts.append('</bass>')
+    parts.append('</harmony>')
+    return ''.join(parts)
+
+
+def split_duration(total, count):
+    """Split a measure's duration over count slots; earlier slots take any remainder"""
+    base, extra = divmod(total, count)
+    return [base + 1 if i < extra else base for i in range(count)]
+
+
+def _musicxml_start(title):
+    parts = ['<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n',
+             '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+             '"http://www.musicxml.org/dtds/partwise.dtd">\n',
+             '<score-partwise version="4.0">\n']
+    if title:
+        parts.append(f"  <work><work-title>{escape(title)}</work-title></work>\n")
+    parts.append('  <part-list><score-part id="P1"><part-name>Chords</part-name></score-part></part-list>\n'
+                 '  <part id="P1">\n')
+    return ''.join(parts)
+
+
+def write_musicxml(lines):
+    """Convert chart lines to a MusicXML partwise score (generator of text chunks)
+
+    Each bar becomes a measure of rests carrying <harmony> elements where
+    chords occur; the bar's tokens share the measure's duration, so '| G |'
+    is one whole-bar rest. Section labels become rehearsal marks. Lyrics
+    have no notes to attach to and are not exported. A chart without chord
+    lines still gives a valid score, with one empty measure.
+    """
+    classifier = ChordLineClassifier()
+    title = None
+    key = 'C'
+    beats, beat_type = 4, 4
+    seen_content = False
+    started = False
+    measure_number = 0
+    label = None
+
+    def attributes():
+        return (f"<attributes><divisions>{divisions}</divisions>"
+                f"<key><fifths>{KEY_TO_FIFTHS.get(key, 0)}</fifths></key>"
+                f"<time><beats>{beats}</beats><beat-type>{beat_type}</beat-type></time></attributes>")
+
+    for line in lines:
+        kind = classifier.classify(line, first_line=not seen_content and '=' not in line)
+        if kind == LINE_BLANK:
+            continue
+
+        if kind != LINE_CHORD:
+            if kind == LINE_KEY and not started:
+                key = KEY_LINE_PATTERN.search(line).group(1)
+            elif kind == LINE_HEADER and not seen_content and '=' not in line:
+                title = line.strip()
+            elif kind == LINE_HEADER and '=' in line:
+                name, value = META_LINE_PATTERN.match(line).groups()
+                if name.lower().startswith('time signature') and not started:
+                    beats, beat_type = parse_time_signature(value)
+            elif kind == LINE_HEADER:
+                label = line.partition(':')[0].strip()
+            seen_content = True
+            continue
+        seen_content = True
+
+        if not started:
+            started = True
+            divisions = MUSICXML_DIVISIONS * max(1, beat_type // 4)
+            measure_duration = beats * 4 * divisions // beat_type
+            yield _musicxml_start(title)
+
+        stripped = line.strip().strip('|')
+        for bar in stripped.split('|'):
+            tokens = bar.split()
+            measure_number += 1
+            parts = [f'    <measure number="{measure_number}">']
+            if measure_number == 1:
+                parts.append(attributes())
+            if label:
+                parts.append(f"<direction placement=\"above\"><direction-type><rehearsal>{escape(label)}"
+                             f"</rehearsal></direction-type></direction>")
+                label = None
+            tokens = tokens or ['.']
+            for token, duration in zip(tokens, split_duration(measure_duration, len(tokens))):
+                if token != '.':
+                    parts.append(_harmony_xml(token))
+                if duration:
+                    parts.append(f"<note><rest/><duration>{duration}</duration></note>")
+            parts.append('</measure>\n')
+            yield ''.join(parts)
+
+    if not started:
+        divisions = MUSICXML_DIVISIONS * max(1, beat_type // 4)
+        measure_duration = beats * 4 * divisions // beat_type
+        yield _musicxml_start(title)
+        yield (f'    <measure number="1">{attributes()}'
+               f'<note><rest/><duration>{measure_duration}</duration></note></measure>\n')
+    yield '  </part>\n</score-partwise>\n'
+
+
+# ---------------------------------------------------------------------------
+# Files and bulk conversion
+# ---------------------------------------------------------------------------
+
+def detect_format(path):
+    """Guess a file's format from its extension"""
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError(f"{path}: unknown chart format '{extension}'")
+    return FORMAT_EXTENSIONS[extension]
+
+
+def read_chart_lines(path):
+    """Stream any supported file as chart lines"""
+    source_format = detect_format(path)
+    if source_format == 'musicxml':
+        yield from read_musicxml(path)
+        return
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        if source_format == 'chordpro':
+            yield from read_chordpro(f)
+        else:
+            for line in f:
+                yield line.rstrip('\r\n')
+
+
+def convert_file(source, destination, to_format, formatter=None):
+    """Convert one file; with a formatter, chart output is formatted and aligned"""
+    lines = read_chart_lines(source)
+
+    if to_format == 'chart' and formatter is not None:
+        # Alignment needs the whole chart; a single chart is small
+        chunks = [formatter.format_and_align('\n'.join(lines)) + '\n']
+    elif to_format == 'chart':
+        chunks = (line + '\n' for line in lines)
+    elif to_format == 'chordpro':
+        chunks = (line + '\n' for line in write_chordpro(lines))
+    elif to_format == 'musicxml':
+        chunks = write_musicxml(lines)
+    else:
+        raise ValueError(f"Unknown output format '{to_format}'")
+
+    temp_path = destination + '.part'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, destination)
+    return destination
+
+
+_worker_formatter = None
+
+
+def _convert_job(job):
+    global _worker_formatter
+    source, destination, to_format, apply_formatting = job
+    try:
+        if apply_formatting and _worker_formatter is None:
+            # Imported lazily: the GUI module pulls in tkinter
+            from chord_transpose_gui_smart_format import SmartFormatter
+            _worker_formatter = SmartFormatter()
+        convert_file(source, destination, to_format, _worker_formatter if apply_formatting else None)
+        return source, destination, None
+    except Exception as e:
+        return source, destination, str(e)
+
+
+def iter_sources(paths):
+    """Expand files and directories into convertible source files"""
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, files in os.walk(path):
+                for name in sorted(files):
+                    if os.path.splitext(name)[1].lower() in FORMAT_EXTENSIONS:
+                        yield os.path.join(directory, name), os.path.relpath(os.path.join(directory, name), path)
+        else:
+            yield path, os.path.basename(path)
+
+
+def convert_library(paths, output_dir, to_format, workers=None, apply_formatting=False, chunksize=16):
+    """Convert many files across a process pool; yields (source, destination, error)
+
+    Jobs are submitted in bounded batches (Pool.imap_unordered would pull
+    the whole job list at once) and every worker streams its own files, so
+    memory stays bounded no matter how large the library is; only the output
+    paths are kept. A source whose output path is already taken (song.cho and
+    song.xml both become song.txt) is reported as an error and not converted,
+    since both would write the same file.
+    """
+    extension = OUTPUT_EXTENSIONS[to_format]
+    claimed = {}    # normalized destination -> source writing it
+    collisions = []
+
+    def jobs():
+        for source, relative in iter_sources(paths):
+            destination = os.path.join(output_dir, os.path.splitext(relative)[0] + extension)
+            other = claimed.setdefault(os.path.normcase(os.path.abspath(destination)), source)
+            if other != source:
+                collisions.append((source, destination, f"Output {destination} collides with the output of {other}"))
+                continue
+            os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+            yield source, destination, to_format, apply_formatting
+
+    if workers == 1:
+        for result in map(_convert_job, jobs()):
+            yield result
+            yield from collisions
+            collisions.clear()
+        yield from collisions
+        return
+
+    pending = jobs()
+    batch_size = (workers or os.cpu_count() or 1) * chunksize * 4
+    with Pool(workers) as pool:
+        while True:
+            batch = list(islice(pending, batch_size))
+            yield from collisions
+            collisions.clear()
+            if not batch:
+                break
+            yield from pool.imap_unordered(_convert_job, batch, chunksize=chunksize)
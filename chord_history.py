@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Benchmark history for the chord chart engine
+Local JSON Lines store of benchmark runs and a static HTML trend report
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+
+DEFAULT_HISTORY = 'benchmark_history.jsonl'
+
+# Metric -> (label, True if higher is better)
+METRICS = {
+    'throughput': ('charts/s', True),
+    'p50_ms': ('p50 ms', False),
+    'p90_ms': ('p90 ms', False),
+    'p99_ms': ('p99 ms', False),
+    'peak_kib': ('peak KiB', False),
+}
+
+
+def machine_fingerprint():
+    """Describe the machine; runs are only compared with runs from the same fingerprint"""
+    info = {
+        'system': platform.system(),
+        'release': platform.release(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+    }
+    digest = hashlib.sha256(json.dumps(info, sort_keys=True).encode('utf-8')).hexdigest()
+    info['fingerprint'] = digest[:12]
+    info['node'] = platform.node()
+    return info
+
+
+def source_version():
+    """'git describe' of the working tree, or None outside a git checkout"""
+    try:
+        result = subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def latency_summary(samples, total_time, charts):
+    """Throughput and latency percentiles for per-chart timings (seconds)"""
+    if len(samples) > 1:
+        cuts = statistics.quantiles(samples, n=100, method='inclusive')
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = samples[0] if samples else 0.0
+    return {
+        'throughput': charts / total_time if total_time else 0.0,
+        'p50_ms': p50 * 1000,
+        'p90_ms': p90 * 1000,
+        'p99_ms': p99 * 1000,
+    }
+
+
+class BenchmarkHistory:
+    """Append-only history of benchmark runs, one JSON object per line"""
+
+    def __init__(self, path=DEFAULT_HISTORY):
+        self.path = path
+
+    def append(self, run):
+        """Add one run"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run, sort_keys=True) + '\n')
+
+    def runs(self):
+        """All runs, oldest first; unreadable lines are skipped"""
+        if not os.path.exists(self.path):
+            return []
+        runs = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+        return runs
+
+
+def compare_runs(runs, threshold=0.10, window=5):
+    """Change of every metric against the median of the previous comparable runs
+
+    Runs are comparable when they share the machine fingerprint and the
+    workload settings (songs, seed, repeat).
+
+    Returns one dict per run: {(benchmark, metric): relative change}, where a
+    positive change is always an improvement and a negative one a regression.
+    A change counts as a regression when it is below -threshold.
+    """
+    changes = []
+    previous_by_setup = {}
+    for run in runs:
+        setup = (run.get('machine', {}).get('fingerprint'), run.get('songs'), run.get('seed'), run.get('repeat'))
+        previous = previous_by_setup.setdefault(setup, [])
+        run_changes = {}
+        for benchmark, result in run.get('results', {}).items():
+            for metric, (_, higher_is_better) in METRICS.items():
+                if metric not in result:
+                    continue
+                history = [old['results'][benchmark][metric] for old in previous[-window:]
+                           if metric in old.get('results', {}).get(benchmark, {})]
+                if not history:
+                    continue
+                baseline = statistics.median(history)
+                if not baseline:
+                    continue
+                change = (result[metric] - baseline) / baseline
+                run_changes[(benchmark, metric)] = change if higher_is_better else -change
+        changes.append(run_changes)
+        previous.append(run)
+    return changes
+
+
+def regressions(runs, threshold=0.10, window=5):
+    """(benchmark, metric, change) regressions of the latest run"""
+    if not runs:
+        return []
+    latest = compare_runs(runs, threshold, window)[-1]
+    return sorted((benchmark, metric, change) for (benchmark, metric), change in latest.items()
+                  if change < -threshold)
+
+
+def _svg_trend(values, flagged, width=560, height=140, pad=24):
+    """Inline SVG line chart; flagged points are drawn as regressions"""
+    if not values:
+        return ''
+    low, high = min(values), max(values)
+    span = (high - low) or abs(high) or 1.0
+    step = (width - 2 * pad) / max(len(values) - 1, 1)
+
+    def point(i, value):
+        return pad + i * step, height - pad - (value - low) / span * (height - 2 * pad)
+
+    points = [point(i, value) for i, value in enumerate(values)]
+    parts = [f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}">',
+             f'<line x1="{pad}" y1="{height - pad}" x2="{width - pad}" y2="{height - pad}" class="axis"/>',
+             f'<text x="2" y="{pad}" class="label">{high:.3g}</text>',
+             f'<text x="2" y="{height - pad}" class="label">{low:.3g}</text>',
+             '<polyline fill="none" class="trend" points="' +
+             ' '.join(f"{x:.1f},{y:.1f}" for x, y in points) + '"/>']
+    for i, (x, y) in enumerate(points):
+        css = 'bad' if i in flagged else 'point'
+        parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{5 if i in flagged else 3}" class="{css}">'
+                     f'<title>{values[i]:.4g}</title></circle>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+
+def render_html(runs, threshold=0.10, window=5, trend_metrics=('throughput', 'p50_ms', 'p99_ms', 'peak_kib')):
+    """Static HTML report: per machine, a trend chart per benchmark/metric and a table of runs"""
+    changes = compare_runs(runs, threshold, window)
+    esc = html.escape
+
+    out = ['<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Chord engine benchmark history</title>',
+           '<style>body{font-family:sans-serif;margin:2em;color:#222}table{border-collapse:collapse;font-size:13px}'
+           'td,th{border:1px solid #ccc;padding:3px 6px;text-align:right}th{background:#f3f3f3}'
+           'td.name{text-align:left}.regression{background:#f8d0d0;font-weight:bold}.improvement{background:#d4f0d4}'
+           '.axis{stroke:#999}.trend{stroke:#3367d6;stroke-width:2}.point{fill:#3367d6}.bad{fill:#d33}'
+           '.label{font-size:10px;fill:#666}.charts{display:flex;flex-wrap:wrap;gap:12px}'
+           '.chart{border:1px solid #ddd;padding:6px}.chart h4{margin:0 0 4px 0;font-size:13px}</style></head><body>',
+           '<h1>Chord engine benchmark history</h1>',
+           f'<p>{len(runs)} runs. Each run is compared with the median of up to {window} earlier runs on the '
+           f'same machine with the same songs, seed and repeat settings; changes worse than {threshold:.0%} '
+           'are highlighted as regressions.</p>']
+
+    machines = {}
+    for index, run in enumerate(runs):
+        machines.setdefault(run.get('machine', {}).get('fingerprint'), []).append(index)
+
+    for fingerprint, indices in machines.items():
+        machine = runs[indices[-1]].get('machine', {})
+        out.append(f"<h2>Machine {esc(str(fingerprint))}</h2><p>{esc(machine.get('system', ''))} "
+                   f"{esc(machine.get('release', ''))} {esc(machine.get('machine', ''))}, "
+                   f"{machine.get('cpu_count')} CPUs, {esc(machine.get('implementation', ''))} "
+                   f"{esc(machine.get('python', ''))}</p>")
+
+        benchmarks = []
+        for index in indices:
+            for benchmark in runs[index].get('results', {}):
+                if benchmark not in benchmarks:
+                    benchmarks.append(benchmark)
+
+        for benchmark in benchmarks:
+            out.append(f'<h3>{esc(benchmark)}</h3><div class="charts">')
+            for metric in trend_metrics:
+                series = [(position, runs[index]['results'][benchmark][metric], index)
+                          for position, index in enumerate(indices)
+                          if metric in runs[index].get('results', {}).get(benchmark, {})]
+                if not series:
+                    continue
+                flagged = {i for i, (_, _, index) in enumerate(series)
+                           if changes[index].get((benchmark, metric), 0) < -threshold}
+                out.append(f'<div class="chart"><h4>{esc(METRICS[metric][0])}</h4>'
+                           f'{_svg_trend([value for _, value, _ in series], flagged)}</div>')
+            out.append('</div>')
+
+        out.append('<h3>Runs</h3><table><tr><th>time</th><th>version</th><th>label</th>')
+        for benchmark in benchmarks:
+            out.append(f'<th colspan="{len(METRICS)}">{esc(benchmark)}</th>')
+        out.append('</tr><tr><th></th><th></th><th></th>')
+        out.append(''.join(f'<th>{esc(label)}</th>' for _ in benchmarks for label, _ in METRICS.values()))
+        out.append('</tr>')
+
+        for index in reversed(indices):
+            run = runs[index]
+            out.append(f"<tr><td class=\"name\">{esc(run.get('timestamp', ''))}</td>"
+                       f"<td class=\"name\">{esc(str(run.get('version') or ''))}</td>"
+                       f"<td class=\"name\">{esc(str(run.get('label') or ''))}</td>")
+            for benchmark in benchmarks:
+                result = run.get('results', {}).get(benchmark, {})
+                for metric in METRICS:
+                    if metric not in result:
+                        out.append('<td></td>')
+                        continue
+                    change = changes[index].get((benchmark, metric))
+                    css = ''
+                    note = ''
+                    if change is not None:
+                        note = f' title="{change:+.1%} vs baseline"'
+                        if change < -threshold:
+                            css = ' class="regression"'
+                        elif change > threshold:
+                            css = ' class="improvement"'
+                    out.append(f'<td{css}{note}>{result[metric]:.3g}</td>')
+            out.append('</tr>')
+        out.append('</table>')
+
+    out.append('</body></html>\n')
+    return '\n'.join(out)
+
+
+def write_report(history_path, html_path, threshold=0.10, window=5):
+    """Render the history file to a static HTML file; returns the number of runs"""
+    runs = BenchmarkHistory(history_path).runs()
+    temp_path = html_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(render_html(runs, threshold, window))
+    os.replace(temp_path, html_path)
+    return len(runs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the benchmark history as a static HTML trend report")
+    parser.add_argument('--history', default=DEFAULT_HISTORY, help="history file written by 'chord_benchmark.py record'")
+    parser.add_argument('-o', '--output', default='benchmark_report.html', help="HTML file to write")
+    parser.add_argument('--threshold', type=float, default=0.10, help="relative change counted as a regression")
+    parser.add_argument('--window', type=int, default=5, help="earlier runs in the baseline median")
+    args = parser.parse_args(argv)
+
+    count = write_report(args.history, args.output, args.threshold, args.window)
+    print(f"{count} runs -> {args.output}")
+    for benchmark, metric, change in regressions(BenchmarkHistory(args.history).runs(), args.threshold, args.window):
+        print(f"Regression: {benchmark} {METRICS[metric][0]} {change:+.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
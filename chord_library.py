@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Canonical chart library
+Stores each chart once in numbered (Nashville) form and renders it to any key on demand
+"""
+
+import os
+import re
+import sys
+
+try:
+    from chord_transpose_gui_smart_format import NumberedChordConverter
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose_gui_smart_format import NumberedChordConverter
+
+KEY_PATTERN = re.compile(r'Do\s*=\s*([A-G][#b]?)')
+
+
+class NashvilleChartStore:
+    """Key-independent chart storage
+
+    Charts are converted to numbered notation once when added. Rendering a
+    key is a table lookup per chord through the converter's precomputed
+    degree -> note tables, so no per-key copies are kept and nothing is
+    re-transposed.
+    """
+
+    def __init__(self, number_converter=None, use_roman=True):
+        self.number_converter = number_converter or NumberedChordConverter()
+        self.use_roman = use_roman
+        self.charts = {}  # chart_id -> (numbered content, original key)
+
+    def add(self, chart_id, content):
+        """Store a chart in canonical numbered form; returns its original key"""
+        key_match = KEY_PATTERN.search(content)
+        if not key_match:
+            raise ValueError(f"Chart {chart_id!r} has no key (looking for 'Do = X')")
+
+        numbered = self.number_converter.convert_chart_to_numbers(content, self.use_roman)
+        self.charts[chart_id] = (numbered, key_match.group(1))
+        return key_match.group(1)
+
+    def remove(self, chart_id):
+        """Drop a chart from the store"""
+        del self.charts[chart_id]
+
+    def numbered(self, chart_id):
+        """Return the canonical numbered chart"""
+        return self.charts[chart_id][0]
+
+    def original_key(self, chart_id):
+        """Return the key the chart was added in"""
+        return self.charts[chart_id][1]
+
+    def render(self, chart_id, key=None):
+        """Render a chart with chord symbols in the given key (default: original key)"""
+        numbered, original_key = self.charts[chart_id]
+        return self.number_converter.convert_chart_from_numbers(numbered, key or original_key)
+
+    def __contains__(self, chart_id):
+        return chart_id in self.charts
+
+    def __len__(self):
+        return len(self.charts)
+
+    def __iter__(self):
+        return iter(self.charts)
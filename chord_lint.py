@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Chart library linter
+Checks every chord line's bars against the chart's time signature, flags
+tokens the formatter passes through unrecognized and charts without a key
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from multiprocessing import Pool
+
+try:
+    from chord_transpose_gui_smart_format import SmartFormatter
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose_gui_smart_format import SmartFormatter
+
+from chord_capo import chart_files
+from chord_classifier import LINE_CHORD
+from chord_pipeline import KEY_PATTERN
+from chord_scanner import TOKEN_BAR, TOKEN_CHORD, TOKEN_DOT, TOKEN_TEXT, find_chord, scan_line
+
+SEVERITIES = ('error', 'warning')
+# Words that are not chords but have an agreed meaning in a bar: beat slashes and rests,
+# repeat-bar and no-chord marks
+BEAT_WORDS = frozenset(['-', '/', '%', 'N.C.', 'NC'])
+# Charts per worker task; linting one chart takes well under a millisecond
+CHUNK_SIZE = 64
+
+Diagnostic = namedtuple('Diagnostic', ['path', 'line', 'column', 'severity', 'code', 'message'])
+
+
+def allowed_slots(time_signature):
+    """Token counts a bar may hold: one chord for the whole bar, or one slot per beat
+
+    Compound meters (6/8, 9/8, 12/8) may also be written one slot per dotted beat.
+    """
+    beats, unit = time_signature
+    slots = {1, beats}
+    if unit == 8 and beats % 3 == 0 and beats > 3:
+        slots.add(beats // 3)
+    return slots
+
+
+def is_repeat_mark(word):
+    """'x2', '(x2)', ':' and friends, which mark repeats rather than beats"""
+    word = word.strip('():')
+    return not word or (word[0] in 'xX' and word[1:].isdigit())
+
+
+class ChartLinter:
+    """Diagnostics for one chart
+
+    Uses the formatter's own chord-line test and time signature detection,
+    so it checks exactly the lines the formatter and alignment work on.
+    """
+
+    def __init__(self, formatter=None):
+        self.formatter = formatter or SmartFormatter()
+
+    def lint(self, content, path=''):
+        """Return the chart's diagnostics, in line order"""
+        diagnostics = []
+        if not KEY_PATTERN.search(content):
+            diagnostics.append(Diagnostic(path, 1, 1, 'error', 'missing-key', "no 'Do = X' key line"))
+
+        time_signature = self.formatter.detect_time_signature(content)
+        slots = allowed_slots(time_signature) if time_signature[0] > 0 else None
+        expected = ' or '.join(str(count) for count in sorted(slots or ()))
+        lines = content.split('\n')
+        kinds = self.formatter.classifier.classify_lines(lines)
+
+        for number, (line, kind) in enumerate(zip(lines, kinds), 1):
+            if kind != LINE_CHORD:
+                continue
+            stripped = line.strip()
+            if not stripped.startswith('|'):
+                diagnostics.append(Diagnostic(path, number, len(line) - len(line.lstrip()) + 1, 'warning',
+                                              'malformed-bar', "chord line does not start with '|'"))
+            if not stripped.endswith('|'):
+                diagnostics.append(Diagnostic(path, number, len(line.rstrip()) + 1, 'warning',
+                                              'malformed-bar', "chord line does not end with '|'"))
+
+            column = 1
+            bar_start = None
+            bar_slots = 0
+            for token_kind, text, _ in scan_line(line):
+                if token_kind == TOKEN_BAR:
+                    # Empty bars are placeholders (pickups, continued lines) and are not counted
+                    if slots and bar_start is not None and bar_slots and bar_slots not in slots:
+                        diagnostics.append(Diagnostic(
+                            path, number, bar_start, 'warning', 'beat-count',
+                            f"bar has {bar_slots} slots, {time_signature[0]}/{time_signature[1]} expects {expected}"))
+                    bar_start = column
+                    bar_slots = 0
+                elif token_kind in (TOKEN_CHORD, TOKEN_DOT) or text in BEAT_WORDS or find_chord(text):
+                    bar_slots += 1
+                elif token_kind == TOKEN_TEXT and not is_repeat_mark(text):
+                    diagnostics.append(Diagnostic(path, number, column, 'warning', 'unknown-token',
+                                                  f"'{text}' is neither a chord nor a beat mark"))
+                column += len(text)
+        return diagnostics
+
+
+_worker_linter = None
+
+
+def _lint_file(path):
+    """Worker: diagnostics for one chart file"""
+    global _worker_linter
+    if _worker_linter is None:
+        _worker_linter = ChartLinter()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return path, _worker_linter.lint(f.read(), path), None
+    except Exception as e:
+        return path, [], str(e)
+
+
+def lint_library(paths, workers=None):
+    """Lint chart files across a process pool; yields (path, diagnostics, error) in path order"""
+    paths = list(paths)
+    if len(paths) < CHUNK_SIZE or workers == 1:
+        yield from map(_lint_file, paths)
+        return
+    with Pool(workers) as pool:
+        yield from pool.imap(_lint_file, paths, chunksize=CHUNK_SIZE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check chord charts for bar/beat, token and key problems")
+    parser.add_argument('charts', nargs='+', help="chart files or directories")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--json', action='store_true', help="print one JSON object per diagnostic")
+    parser.add_argument('--ignore', action='append', default=[], metavar='CODE',
+                        help="skip a diagnostic code, e.g. beat-count (repeatable)")
+    parser.add_argument('--fail-on', choices=SEVERITIES, default='error',
+                        help="lowest severity that makes the exit status 1")
+    args = parser.parse_args(argv)
+
+    ignored = set(args.ignore)
+    failing = set(SEVERITIES[:SEVERITIES.index(args.fail_on) + 1])
+    counts = Counter()
+    charts = 0
+    failures = 0
+    start = time.perf_counter()
+    for path, diagnostics, error in lint_library(chart_files(args.charts), args.workers):
+        charts += 1
+        if error:
+            failures += 1
+            print(f"Error: {path}: {error}", file=sys.stderr)
+            continue
+        for diagnostic in diagnostics:
+            if diagnostic.code in ignored:
+                continue
+            counts[diagnostic.severity] += 1
+            if args.json:
+                print(json.dumps(diagnostic._asdict()))
+            else:
+                print(f"{diagnostic.path}:{diagnostic.line}:{diagnostic.column}: "
+                      f"{diagnostic.severity} [{diagnostic.code}] {diagnostic.message}")
+    elapsed = time.perf_counter() - start
+
+    print(f"{charts} chart(s), {counts['error']} error(s), {counts['warning']} warning(s) "
+          f"in {elapsed:.2f}s ({charts / elapsed * 60 if elapsed else 0:.0f} charts/min)", file=sys.stderr)
+    return 1 if failures or any(counts[severity] for severity in failing) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
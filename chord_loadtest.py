@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Load and soak testing for the chord chart engine
+Drives the transpose/format/number/PDF pipeline with concurrent synthetic
+traffic, in-process or through a localhost HTTP stand-in, and reports
+throughput, latency percentiles, error rate and RSS growth
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Process
+from multiprocessing import Queue as ProcessQueue
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+try:
+    from chord_cli import ChartProcessor
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_cli import ChartProcessor
+
+from chord_benchmark import KEYS, make_chart
+from chord_history import latency_summary
+
+# Chart sizes: make_chart options per size class
+CHART_SIZES = {
+    'small': {'sections': 2, 'lines_per_section': 2},
+    'medium': {'sections': 4, 'lines_per_section': 4},
+    'large': {'sections': 8, 'lines_per_section': 6, 'lyric_lines': 1},
+    'huge': {'sections': 40, 'lines_per_section': 6, 'lyric_lines': 1},
+}
+OPERATIONS = ('transpose', 'format', 'number', 'full', 'pdf')
+DEFAULT_SIZES = 'small:3,medium:5,large:2'
+DEFAULT_OPERATIONS = 'transpose:3,format:3,number:2,full:2'
+CHARTS_PER_SIZE = 50
+# Workers hand their samples to the collector in batches
+FLUSH_SECONDS = 0.5
+
+
+def parse_mix(text, choices):
+    """Parse 'name:weight,name:weight' ('name' alone weighs 1) into (names, weights)"""
+    names = []
+    weights = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, weight = item.partition(':')
+        name = name.strip()
+        if choices is not None and name not in choices:
+            raise ValueError(f"Unknown '{name}' (choose from {', '.join(choices)})")
+        try:
+            weight = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight in '{item}'") from None
+        if weight < 0:
+            raise ValueError(f"Negative weight in '{item}'")
+        names.append(name)
+        weights.append(weight)
+    if not names or not sum(weights):
+        raise ValueError(f"Empty mix '{text}'")
+    return names, weights
+
+
+def rss_bytes(pid=None):
+    """Resident set size of a process (default: this one), or None when unknown"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if pid is None or pid == os.getpid():
+        try:
+            import resource
+        except ImportError:
+            return None
+        # Peak rather than current RSS, but still shows growth
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+
+def run_operation(processor, operation, content, key, scratch_path):
+    """Run one request against a ChartProcessor; returns the response size in bytes"""
+    if operation == 'transpose':
+        result = processor.process(content, target_key=key, apply_formatting=False)
+    elif operation == 'format':
+        result = processor.process(content)
+    elif operation == 'number':
+        result = processor.process(content, number_style='roman')
+    elif operation == 'full':
+        result = processor.process(content, target_key=key, number_style='arabic')
+    elif operation == 'pdf':
+        processor.export_pdf(processor.process(content, target_key=key), scratch_path)
+        return os.path.getsize(scratch_path)
+    else:
+        raise ValueError(f"Unknown operation '{operation}'")
+    return len(result.encode('utf-8'))
+
+
+class TrafficGenerator:
+    """Random (operation, chart, key) requests following the configured mixes"""
+
+    def __init__(self, sizes, operations, keys, seed):
+        self.rng = random.Random(seed)
+        chart_rng = random.Random(0)  # every worker gets the same corpus
+        self.size_names, self.size_weights = sizes
+        self.charts = {size: [make_chart(chart_rng, number=i + 1, **CHART_SIZES[size])
+                              for i in range(CHARTS_PER_SIZE)] for size in self.size_names}
+        self.operations, self.operation_weights = operations
+        self.keys, self.key_weights = keys
+
+    def next_request(self):
+        size = self.rng.choices(self.size_names, self.size_weights)[0]
+        operation = self.rng.choices(self.operations, self.operation_weights)[0]
+        key = self.rng.choices(self.keys, self.key_weights)[0]
+        return operation, self.rng.choice(self.charts[size]), key
+
+
+class ChartRequestHandler(BaseHTTPRequestHandler):
+    """Localhost stand-in for a web back end: POST /<operation>?key=G with the chart as body"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this every response waits for a delayed ACK
+    disable_nagle_algorithm = True
+    _local = threading.local()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        operation = url.path.strip('/')
+        key = parse_qs(url.query).get('key', [None])[0]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+
+        local = self._local
+        if not hasattr(local, 'processor'):
+            local.processor = ChartProcessor()
+        # Handler threads come and go with connections, so the PDF scratch file
+        # lives for one request; a per-thread file would outlive its thread
+        scratch = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False).name if operation == 'pdf' else None
+        try:
+            run_operation(local.processor, operation, body, key, scratch)
+            if operation == 'pdf':
+                with open(scratch, 'rb') as f:
+                    payload = f.read()
+                status, content_type = 200, 'application/pdf'
+            else:
+                payload = b'ok'
+                status, content_type = 200, 'text/plain'
+        except ValueError as e:
+            payload, status, content_type = str(e).encode('utf-8'), 400, 'text/plain'
+        except Exception as e:
+            payload, status, content_type = str(e).encode('utf-8'), 500, 'text/plain'
+        finally:
+            if scratch and os.path.exists(scratch):
+                os.remove(scratch)
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(port_queue):
+    """Server process: bind an ephemeral localhost port and serve until terminated"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ChartRequestHandler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def _http_request(connection, operation, content, key):
+    """POST one request; raises on a non-200 response"""
+    # Keys such as 'F#' must be escaped, or '#' would start a fragment
+    connection.request('POST', f"/{operation}?{urlencode({'key': key})}", body=content.encode('utf-8'),
+                       headers={'Content-Type': 'text/plain; charset=utf-8'})
+    response = connection.getresponse()
+    payload = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"HTTP {response.status}: {payload[:200].decode('utf-8', 'replace')}")
+    return len(payload)
+
+
+def run_worker(worker_id, config, results, stop):
+    """Send requests until the deadline, request budget or stop flag; report batches to `results`
+
+    Each batch is (worker_id, [(operation, latency or None on error, error)], rss bytes or None).
+    """
+    traffic = TrafficGenerator(config['sizes'], config['operations'], config['keys'], config['seed'] + worker_id)
+    budget = config['requests']
+    deadline = config['deadline']
+    report_rss = config['report_rss']
+    perf_counter = time.perf_counter
+
+    processor = connection = None
+    scratch = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False).name
+    if config['port']:
+        connection = http.client.HTTPConnection('127.0.0.1', config['port'], timeout=60)
+    else:
+        processor = ChartProcessor()
+
+    batch = []
+    last_flush = perf_counter()
+    sent = 0
+    try:
+        while not stop.is_set() and (budget is None or sent < budget) and (deadline is None or time.time() < deadline):
+            operation, content, key = traffic.next_request()
+            start = perf_counter()
+            try:
+                if connection is not None:
+                    _http_request(connection, operation, content, key)
+                else:
+                    run_operation(processor, operation, content, key, scratch)
+                batch.append((operation, perf_counter() - start, None))
+            except Exception as e:
+                batch.append((operation, None, f"{type(e).__name__}: {e}"))
+                if connection is not None:
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', config['port'], timeout=60)
+            sent += 1
+
+            now = perf_counter()
+            if now - last_flush >= FLUSH_SECONDS:
+                results.put((worker_id, batch, rss_bytes() if report_rss else None))
+                batch = []
+                last_flush = now
+    finally:
+        results.put((worker_id, batch, rss_bytes() if report_rss else None))
+        results.put((worker_id, None, None))
+        if connection is not None:
+            connection.close()
+        try:
+            os.remove(scratch)
+        except OSError:
+            pass
+
+
+class _ProcessStop:
+    """Stop flag for process workers: only the deadline or budget ends them"""
+
+    @staticmethod
+    def is_set():
+        return False
+
+
+def _process_worker(worker_id, config, results):
+    run_worker(worker_id, config, results, _ProcessStop())
+
+
+class LoadReport:
+    """Aggregates worker batches into totals, per-operation latencies and an RSS series"""
+
+    def __init__(self):
+        self.latencies = array('d')
+        self.by_operation = {}
+        self.errors = {}
+        self.error_samples = []
+        self.rss = {}  # source -> [(elapsed seconds, bytes)]
+        self.started = time.perf_counter()
+        self.interval_latencies = []
+        self.interval_errors = 0
+
+    @property
+    def requests(self):
+        return len(self.latencies) + sum(self.errors.values())
+
+    def add_batch(self, batch):
+        for operation, latency, error in batch:
+            if error is None:
+                self.latencies.append(latency)
+                self.by_operation.setdefault(operation, array('d')).append(latency)
+                self.interval_latencies.append(latency)
+            else:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+                self.interval_errors += 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(f"{operation}: {error}")
+
+    def add_rss(self, source, value):
+        if value is not None:
+            self.rss.setdefault(source, []).append((time.perf_counter() - self.started, value))
+
+    def interval_line(self, seconds):
+        """One progress line for the last interval, then reset it"""
+        latencies = self.interval_latencies
+        p99 = statistics.quantiles(latencies, n=100, method='inclusive')[98] if len(latencies) > 1 else \
+            (latencies[0] if latencies else 0.0)
+        rss = sum(series[-1][1] for series in self.rss.values())
+        line = (f"[{time.perf_counter() - self.started:7.1f}s] {len(latencies) / seconds:8.1f} req/s  "
+                f"p99 {p99 * 1000:8.2f} ms  errors {self.interval_errors:4d}  rss {rss / 2 ** 20:8.1f} MiB")
+        self.interval_latencies = []
+        self.interval_errors = 0
+        return line
+
+    def summary(self, elapsed):
+        """Totals as a JSON-ready dict"""
+        errors = sum(self.errors.values())
+        result = latency_summary(list(self.latencies), elapsed, len(self.latencies))
+        result.update({
+            'requests': self.requests,
+            'errors': errors,
+            'error_rate': errors / self.requests if self.requests else 0.0,
+            'max_ms': max(self.latencies) * 1000 if self.latencies else 0.0,
+            'seconds': elapsed,
+            'operations': {},
+        })
+        for operation in sorted(set(self.by_operation) | set(self.errors)):
+            latencies = list(self.by_operation.get(operation, ()))
+            summary = latency_summary(latencies, elapsed, len(latencies))
+            summary['errors'] = self.errors.get(operation, 0)
+            summary['requests'] = len(latencies) + summary['errors']
+            result['operations'][operation] = summary
+
+        # RSS growth per source, measured from the first sample after warm-up
+        rss = {}
+        for source, series in self.rss.items():
+            warm = [sample for sample in series if sample[0] >= min(series[-1][0], elapsed * 0.1)] or series
+            start_time, start_rss = warm[0]
+            end_time, end_rss = series[-1]
+            hours = (end_time - start_time) / 3600
+            rss[source] = {
+                'start_mib': start_rss / 2 ** 20,
+                'end_mib': end_rss / 2 ** 20,
+                'peak_mib': max(value for _, value in series) / 2 ** 20,
+                'growth_mib': (end_rss - start_rss) / 2 ** 20,
+                'growth_mib_per_hour': (end_rss - start_rss) / 2 ** 20 / hours if hours > 0 else 0.0,
+            }
+        result['rss'] = rss
+        return result
+
+
+def format_summary(summary):
+    lines = [f"{summary['requests']} requests in {summary['seconds']:.1f}s: {summary['throughput']:.1f} req/s, "
+             f"{summary['errors']} errors ({summary['error_rate']:.2%})",
+             f"latency p50 {summary['p50_ms']:.2f} ms  p90 {summary['p90_ms']:.2f} ms  "
+             f"p99 {summary['p99_ms']:.2f} ms  max {summary['max_ms']:.2f} ms"]
+    for operation, result in summary['operations'].items():
+        lines.append(f"  {operation:<10} {result['requests']:8d} req  p50 {result['p50_ms']:8.2f} ms  "
+                     f"p99 {result['p99_ms']:8.2f} ms  errors {result['errors']}")
+    for source, rss in summary['rss'].items():
+        # An hourly rate extrapolated from a few seconds is noise
+        rate = f", {rss['growth_mib_per_hour']:+.1f} MiB/h" if summary['seconds'] >= 60 else ''
+        lines.append(f"  rss {source:<12} {rss['start_mib']:.1f} -> {rss['end_mib']:.1f} MiB "
+                     f"(peak {rss['peak_mib']:.1f}, {rss['growth_mib']:+.1f} MiB{rate})")
+    return '\n'.join(lines)
+
+
+def run_load(concurrency=4, mode='threads', target='inprocess', duration=10.0, requests=None,
+             sizes=DEFAULT_SIZES, operations=DEFAULT_OPERATIONS, keys=None, seed=0, interval=5.0, log=print):
+    """Run a load test and return its summary dict"""
+    config = {
+        'sizes': parse_mix(sizes, CHART_SIZES),
+        'operations': parse_mix(operations, OPERATIONS),
+        'keys': parse_mix(keys, KEYS) if keys else (list(KEYS), [1.0] * len(KEYS)),
+        'seed': seed,
+        'requests': -(-requests // concurrency) if requests else None,
+        'deadline': time.time() + duration if duration and not requests else None,
+        'port': None,
+        'report_rss': mode == 'processes' and target == 'inprocess',
+    }
+
+    server = None
+    if target == 'http':
+        port_queue = ProcessQueue()
+        server = Process(target=_serve, args=(port_queue,), daemon=True)
+        server.start()
+        config['port'] = port_queue.get(timeout=30)
+
+    report = LoadReport()
+    stop = threading.Event()
+    if mode == 'processes':
+        results = ProcessQueue()
+        workers = [Process(target=_process_worker, args=(i, config, results), daemon=True) for i in range(concurrency)]
+    else:
+        results = queue.Queue()
+        workers = [threading.Thread(target=run_worker, args=(i, config, results, stop), daemon=True)
+                   for i in range(concurrency)]
+
+    def sample_rss():
+        if server is not None:
+            report.add_rss('server', rss_bytes(server.pid))
+        elif mode == 'threads':
+            report.add_rss('process', rss_bytes())
+
+    sample_rss()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    running = len(workers)
+    next_report = started + interval
+    try:
+        while running:
+            try:
+                worker_id, batch, rss = results.get(timeout=0.25)
+            except queue.Empty:
+                batch = None
+                worker_id = None
+            if worker_id is not None:
+                if batch is None:
+                    running -= 1
+                else:
+                    report.add_batch(batch)
+                    report.add_rss(f"worker {worker_id}", rss)
+
+            now = time.perf_counter()
+            if now >= next_report:
+                sample_rss()
+                log(report.interval_line(interval))
+                next_report = now + interval
+    except KeyboardInterrupt:
+        log("Interrupted, stopping workers")
+        stop.set()
+        for worker in workers:
+            if isinstance(worker, Process):
+                worker.terminate()
+    finally:
+        elapsed = time.perf_counter() - started
+        sample_rss()
+        for worker in workers:
+            worker.join(timeout=10)
+        if server is not None:
+            server.terminate()
+            server.join()
+
+    summary = report.summary(elapsed)
+    summary['config'] = {'concurrency': concurrency, 'mode': mode, 'target': target, 'sizes': sizes,
+                         'operations': operations, 'keys': keys or 'all', 'seed': seed}
+    summary['error_samples'] = report.error_samples
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load and soak test the chart pipeline with synthetic traffic")
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help="concurrent clients")
+    parser.add_argument('--mode', choices=['threads', 'processes'], default='threads', help="how clients run")
+    parser.add_argument('--target', choices=['inprocess', 'http'], default='inprocess',
+                        help="call the engine directly or through a localhost HTTP stand-in")
+    run_length = parser.add_mutually_exclusive_group()
+    run_length.add_argument('-d', '--duration', type=float, default=10.0, help="seconds to run (soak: e.g. 3600)")
+    run_length.add_argument('-n', '--requests', type=int, help="stop after this many requests instead")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES,
+                        help=f"chart size mix ({', '.join(CHART_SIZES)}; default {DEFAULT_SIZES})")
+    parser.add_argument('--ops', default=DEFAULT_OPERATIONS,
+                        help=f"operation mix ({', '.join(OPERATIONS)}; default {DEFAULT_OPERATIONS})")
+    parser.add_argument('--keys', help="target key mix, e.g. 'G:3,D:2,Eb' (default: all keys equally)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for the traffic")
+    parser.add_argument('--interval', type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument('--json', metavar='FILE', help="also write the summary as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = run_load(args.concurrency, args.mode, args.target, args.duration, args.requests, args.sizes,
+                           args.ops, args.keys, args.seed, args.interval,
+                           log=lambda line: print(line, file=sys.stderr))
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    print(format_summary(summary))
+    for sample in summary['error_samples']:
+        print(f"  error: {sample}")
+    if args.json:
+        temp_path = args.json + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        os.replace(temp_path, args.json)
+    return 1 if summary['errors'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
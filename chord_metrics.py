@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Operational metrics for long-running engine processes
+Per-thread sharded counters and histograms, exported in the Prometheus text
+format as a file or on a localhost endpoint
+"""
+
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from a short chart stage to a large PDF
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+class _ThreadToken:
+    """Lives in a thread's local storage; it is freed, and its finalizer runs, when the thread exits"""
+
+    __slots__ = ('__weakref__',)
+
+
+class _Shards:
+    """One list of numbers per thread, summed when read
+
+    A thread only ever writes its own list, so recording takes no lock and
+    loses no updates, with or without the GIL. The lock is taken when a
+    thread creates its list and when the thread exits, at which point the
+    list is folded into the retired totals and dropped, so thread-per-request
+    servers do not accumulate lists.
+    """
+
+    __slots__ = ('size', 'local', '_lists', '_retired', '_lock')
+
+    def __init__(self, size):
+        self.size = size
+        # local.values is the calling thread's list once mine() has been called
+        self.local = threading.local()
+        self._lists = {}     # id(list) -> list, for threads that are still running
+        self._retired = [0] * size
+        self._lock = threading.Lock()
+
+    def mine(self):
+        try:
+            return self.local.values
+        except AttributeError:
+            values = [0] * self.size
+            token = _ThreadToken()
+            with self._lock:
+                self._lists[id(values)] = values
+            weakref.finalize(token, self._retire, values)
+            self.local.values = values
+            self.local.token = token
+            return values
+
+    def _retire(self, values):
+        with self._lock:
+            del self._lists[id(values)]
+            retired = self._retired
+            for i, value in enumerate(values):
+                retired[i] += value
+
+    def totals(self):
+        with self._lock:
+            lists = list(self._lists.values())
+            totals = list(self._retired)
+        for values in lists:
+            for i, value in enumerate(values):
+                totals[i] += value
+        return totals
+
+
+class Counter:
+    """Monotonic count, one child per label value combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._shards = _Shards(1)
+        self._local = self._shards.local
+
+    def inc(self, amount=1):
+        try:
+            self._local.values[0] += amount
+        except AttributeError:
+            self._shards.mine()[0] += amount
+
+    def samples(self, labels):
+        yield self.name, labels, self._shards.totals()[0]
+
+
+class Histogram:
+    """Distribution of observed values over fixed buckets, plus their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket, one for values above the last bucket, one for the sum
+        self._shards = _Shards(len(self.buckets) + 2)
+        self._local = self._shards.local
+
+    def observe(self, value):
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._shards.mine()
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, labels):
+        totals = self._shards.totals()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), totals):
+            cumulative += count
+            yield self.name + '_bucket', labels + (('le', _format_value(bound)),), cumulative
+        yield self.name + '_sum', labels, totals[-1]
+        yield self.name + '_count', labels, cumulative
+
+
+class MetricFamily:
+    """A metric with label names; labels(...) returns the child for one combination"""
+
+    def __init__(self, metric_class, name, help_text, label_names=(), **options):
+        self.metric_class = metric_class
+        self.kind = metric_class.kind
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.options = options
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            # Unlabelled families record straight into their only child
+            child = self.labels()
+            if hasattr(child, 'inc'):
+                self.inc = child.inc
+            if hasattr(child, 'observe'):
+                self.observe = child.observe
+                self.time = child.time
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self.metric_class(self.name, self.help_text, **self.options))
+        return child
+
+    def samples(self):
+        for values, child in sorted(self._children.items()):
+            yield from child.samples(tuple(zip(self.label_names, values)))
+
+
+class MetricsRegistry:
+    """The metrics of one process and their Prometheus text exposition
+
+    Forked or spawned workers each have their own registry and export their
+    own numbers.
+    """
+
+    def __init__(self):
+        self.families = {}
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    def _register(self, family):
+        with self._lock:
+            if family.name in self.families:
+                raise ValueError(f"Metric {family.name} is already registered")
+            self.families[family.name] = family
+        return family
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(MetricFamily(Counter, name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(MetricFamily(Histogram, name, help_text, label_names, buckets=buckets))
+
+    def register_cache(self, name, stats):
+        """Report a cache's hits and misses; stats() returns (hits, misses) and is called at export"""
+        self.caches[name] = stats
+
+    def exposition(self):
+        """All metrics in the Prometheus text format"""
+        lines = []
+        for family in self.families.values():
+            lines.append(f'# HELP {family.name} {family.help_text}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            for name, labels, value in family.samples():
+                names, values = zip(*labels) if labels else ((), ())
+                lines.append(f'{name}{_format_labels(names, values)} {_format_value(value)}')
+        if self.caches:
+            lines.append('# HELP chord_cache_requests_total Lookups in process-wide caches')
+            lines.append('# TYPE chord_cache_requests_total counter')
+            for cache, stats in sorted(self.caches.items()):
+                hits, misses = stats()
+                for result, value in (('hit', hits), ('miss', misses)):
+                    lines.append(f'chord_cache_requests_total{_format_labels(("cache", "result"), (cache, result))} '
+                                 f'{value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Write the exposition atomically, e.g. for node_exporter's textfile collector"""
+        temp_path = path + '.part'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.exposition())
+        os.replace(temp_path, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve GET /metrics from a background thread; returns the server (call shutdown() to stop)"""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.exposition().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+
+REGISTRY = MetricsRegistry()
+
+# Engine metrics, recorded once per chart, stage or document so they can stay on
+CHARTS_PROCESSED = REGISTRY.counter('chord_charts_processed_total', "Charts processed")
+LINES_CLASSIFIED = REGISTRY.counter('chord_lines_classified_total', "Chart lines classified")
+CHORDS_TRANSPOSED = REGISTRY.counter('chord_chords_transposed_total', "Chord tokens in transposed chord lines")
+STAGE_SECONDS = REGISTRY.histogram('chord_stage_duration_seconds', "Time spent per pipeline stage", ['stage'])
+PDF_PAGES = REGISTRY.counter('chord_pdf_pages_rendered_total', "PDF pages rendered")
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+Section-aware PDF layout for chord charts
+Cached font metrics, unbreakable chord-line sections and dynamic-programming
+page and column breaks, rendered with reportlab; rebuilt books reuse the
+rendered pages of unchanged charts
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import zlib
+from collections import namedtuple
+
+try:
+    from chord_classifier import ChordLineClassifier
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_classifier import ChordLineClassifier
+
+from chord_metrics import PDF_PAGES
+
+# Page sizes in points (portrait)
+PAGE_SIZES = {'a4': (595.2756, 841.8898), 'letter': (612.0, 792.0)}
+
+LayoutOptions = namedtuple('LayoutOptions', [
+    'page_size', 'landscape', 'font', 'chord_font', 'font_size', 'min_font_size', 'line_spacing',
+    'margin', 'column_gap', 'page_numbers',
+], defaults=('a4', False, 'Courier', 'Courier-Bold', 10.0, 6.0, 1.2, 36.0, 24.0, True))
+
+# One unbreakable run of lines; chord[i] marks chord lines (drawn in the chord font)
+Block = namedtuple('Block', ['lines', 'chord'])
+# A chart laid out: font size, line height and pages -> columns -> blocks
+ChartLayout = namedtuple('ChartLayout', ['font_size', 'leading', 'pages'])
+# A chart rendered: {internal font name: PostScript name} and one zlib-compressed content stream per page
+PageStreams = namedtuple('PageStreams', ['fonts', 'streams'])
+
+# Bump when rendering changes, so cached pages are drawn again
+RENDER_CACHE_VERSION = 1
+
+
+class FontMetrics:
+    """String widths measured once per (font, size, string)
+
+    `measure(text, font, size)` defaults to reportlab's stringWidth.
+    """
+
+    def __init__(self, measure=None):
+        if measure is None:
+            from reportlab.pdfbase.pdfmetrics import stringWidth as measure
+        self.measure = measure
+        self.widths = {}
+        self.hits = 0
+        self.misses = 0
+
+    def width(self, text, font, size):
+        key = (font, size, text)
+        width = self.widths.get(key)
+        if width is None:
+            self.misses += 1
+            width = self.widths[key] = self.measure(text, font, size)
+        else:
+            self.hits += 1
+        return width
+
+    def clear(self):
+        self.widths.clear()
+        self.hits = self.misses = 0
+
+
+def chart_blocks(lines, is_chord_line):
+    """Split a formatted chart into paragraphs (separated by blank lines) as Blocks
+
+    A paragraph holds a section label, its aligned chord lines and any lyrics,
+    so keeping it whole keeps every aligned chord-line section together.
+    """
+    blocks = []
+    current = []
+    for line in lines:
+        if not line.strip():
+            if current:
+                blocks.append(current)
+                current = []
+            continue
+        current.append(line)
+    if current:
+        blocks.append(current)
+    return [Block(tuple(block), tuple(is_chord_line(line) for line in block)) for block in blocks]
+
+
+def split_block(block, max_lines):
+    """Split a paragraph taller than a column, never inside a run of chord lines if avoidable"""
+    # Atomic pieces: each run of chord lines, and each other line
+    pieces = []
+    for i, is_chord in enumerate(block.chord):
+        if is_chord and pieces and pieces[-1][1] and pieces[-1][0][-1] == i - 1:
+            pieces[-1][0].append(i)
+        else:
+            pieces.append(([i], is_chord))
+
+    parts = []
+    current = []
+    for indices, _ in pieces:
+        # A chord section taller than a whole column has to be cut by lines
+        while len(indices) > max_lines:
+            if current:
+                parts.append(current)
+                current = []
+            parts.append(indices[:max_lines])
+            indices = indices[max_lines:]
+        if current and len(current) + len(indices) > max_lines:
+            parts.append(current)
+            current = []
+        current = current + indices
+    if current:
+        parts.append(current)
+    return [Block(tuple(block.lines[i] for i in part), tuple(block.chord[i] for i in part)) for part in parts]
+
+
+def break_columns(sizes, capacity, gap=1):
+    """Optimal column breaks for blocks of `sizes` lines in columns of `capacity` lines
+
+    Blocks in one column are separated by `gap` blank lines. Minimizes the
+    number of columns first, then the sum of squared empty space of every
+    column but the last (so columns fill evenly instead of greedily). Every
+    size must fit in a column. Returns a list of (start, end) block ranges.
+    """
+    n = len(sizes)
+    if not n:
+        return []
+    column_cost = (capacity + 1) ** 2 * n  # outweighs any amount of slack
+    best = [0.0] + [float('inf')] * n
+    previous = [0] * (n + 1)
+    for end in range(1, n + 1):
+        used = -gap
+        for start in range(end - 1, -1, -1):
+            used += sizes[start] + gap
+            if used > capacity:
+                break
+            slack = 0 if end == n else (capacity - used) ** 2
+            cost = best[start] + column_cost + slack
+            if cost < best[end]:
+                best[end] = cost
+                previous[end] = start
+
+    ranges = []
+    end = n
+    while end:
+        ranges.append((previous[end], end))
+        end = previous[end]
+    ranges.reverse()
+    return ranges
+
+
+def balance_columns(sizes, columns, capacity, gap=1):
+    """Split blocks into up to `columns` consecutive columns minimizing the tallest one"""
+    n = len(sizes)
+
+    def height(start, end):
+        return sum(sizes[start:end]) + gap * (end - start - 1) if end > start else 0
+
+    # best[k][i]: minimal tallest column placing the first i blocks in k columns
+    best = [[float('inf')] * (n + 1) for _ in range(columns + 1)]
+    split = [[0] * (n + 1) for _ in range(columns + 1)]
+    best[0][0] = 0
+    for k in range(1, columns + 1):
+        for i in range(n + 1):
+            for j in range(i + 1):
+                h = height(j, i)
+                if h > capacity:
+                    continue
+                value = max(best[k - 1][j], h)
+                if value < best[k][i]:
+                    best[k][i] = value
+                    split[k][i] = j
+    ranges = []
+    end = n
+    for k in range(columns, 0, -1):
+        start = split[k][end]
+        if end > start:
+            ranges.append((start, end))
+        end = start
+    ranges.reverse()
+    return ranges
+
+
+class PDFLayoutEngine:
+    """Lays charts out on pages and columns
+
+    Each chart gets the largest font size (up to font_size) whose widest line
+    fits a column, measured through the shared FontMetrics cache. Paragraphs
+    are unbreakable blocks; break_columns picks the column breaks and the
+    columns of the last page are balanced. Every chart starts on a new page.
+    """
+
+    def __init__(self, options=None, metrics=None, classifier=None):
+        self.options = options or LayoutOptions()
+        self.metrics = metrics or FontMetrics()
+        self.classifier = classifier or ChordLineClassifier()
+        width, height = PAGE_SIZES[self.options.page_size]
+        self.page_width, self.page_height = (height, width) if self.options.landscape else (width, height)
+        self.columns = 2 if self.options.landscape else 1
+        self.column_width = ((self.page_width - 2 * self.options.margin -
+                              (self.columns - 1) * self.options.column_gap) / self.columns)
+        # Room for the page number at the bottom
+        self.column_height = self.page_height - 2 * self.options.margin - (
+            2 * self.options.font_size if self.options.page_numbers else 0)
+
+    def fit_font_size(self, blocks):
+        """Largest size (in 0.5pt steps) whose widest line fits the column"""
+        options = self.options
+        width = self.metrics.width
+        widest = 0.0
+        for block in blocks:
+            for line, is_chord in zip(block.lines, block.chord):
+                font = options.chord_font if is_chord else options.font
+                widest = max(widest, width(line, font, options.font_size))
+        if widest <= self.column_width:
+            return options.font_size
+        # Widths scale linearly with the size
+        size = int(options.font_size * self.column_width / widest * 2) / 2
+        return max(size, options.min_font_size)
+
+    def layout_chart(self, text):
+        """Lay out one formatted chart; returns a ChartLayout"""
+        blocks = chart_blocks(text.split('\n'), self.classifier.is_chord_line)
+        font_size = self.fit_font_size(blocks)
+        leading = font_size * self.options.line_spacing
+        capacity = max(1, int(self.column_height // leading))
+
+        fitted = []
+        for block in blocks:
+            fitted.extend(split_block(block, capacity) if len(block.lines) > capacity else [block])
+        sizes = [len(block.lines) for block in fitted]
+
+        column_ranges = break_columns(sizes, capacity)
+        # Rebalance the columns of the last page
+        last_page_start = (len(column_ranges) - 1) // self.columns * self.columns
+        if self.columns > 1 and column_ranges:
+            first = column_ranges[last_page_start][0]
+            tail = balance_columns(sizes[first:], self.columns, capacity)
+            column_ranges = column_ranges[:last_page_start] + [(first + start, first + end) for start, end in tail]
+
+        columns = [fitted[start:end] for start, end in column_ranges]
+        pages = [columns[i:i + self.columns] for i in range(0, len(columns), self.columns)] or [[]]
+        return ChartLayout(font_size, leading, pages)
+
+    def layout_book(self, texts):
+        """Lay out several charts; returns a list of ChartLayouts"""
+        return [self.layout_chart(text) for text in texts]
+
+
+class PDFRenderer:
+    """Draws ChartLayouts with reportlab"""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def draw_page(self, canvas, layout, page, page_number):
+        """Draw one laid-out page onto the canvas (without showPage); page_number None skips the number"""
+        engine = self.engine
+        options = engine.options
+        top = engine.page_height - options.margin - layout.font_size
+        for column_index, column in enumerate(page):
+            x = options.margin + column_index * (engine.column_width + options.column_gap)
+            text = canvas.beginText(x, top)
+            text.setLeading(layout.leading)
+            current_font = None
+            for block_index, block in enumerate(column):
+                if block_index:
+                    text.textLine('')
+                for line, is_chord in zip(block.lines, block.chord):
+                    font = options.chord_font if is_chord else options.font
+                    if font != current_font:
+                        text.setFont(font, layout.font_size, layout.leading)
+                        current_font = font
+                    text.textLine(line)
+            canvas.drawText(text)
+        if options.page_numbers and page_number is not None:
+            canvas.setFont(options.font, options.font_size * 0.8)
+            canvas.drawCentredString(engine.page_width / 2, options.margin / 2 + options.font_size / 2,
+                                     str(page_number))
+
+    def render(self, layouts, filename):
+        """Write laid-out charts to one PDF file"""
+        from reportlab.pdfgen.canvas import Canvas
+
+        temp_path = filename + '.part'
+        canvas = Canvas(temp_path, pagesize=(self.engine.page_width, self.engine.page_height))
+        page_number = 0
+        for layout in layouts:
+            for page in layout.pages:
+                page_number += 1
+                self.draw_page(canvas, layout, page, page_number)
+                canvas.showPage()
+        canvas.save()
+        os.replace(temp_path, filename)
+        PDF_PAGES.inc(page_number)
+        return page_number
+
+
+def pdf_string(text):
+    """PDF literal string for WinAnsi text"""
+    data = text.encode('cp1252', 'replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def write_pdf(filename, page_size, fonts, pages):
+    """Write a PDF from prepared content streams
+
+    fonts maps internal names ('F1') to standard Type1 fonts; pages holds,
+    per page, a list of (stream bytes, compressed) pairs.
+    """
+    # Object numbers: 1 catalog, 2 page tree, 3 resources, then fonts, then pages with their streams
+    font_numbers = {name: 4 + i for i, name in enumerate(sorted(fonts))}
+    next_number = 4 + len(fonts)
+    page_objects = []
+    for streams in pages:
+        page_objects.append(next_number)
+        next_number += 1 + len(streams)
+
+    temp_path = filename + '.part'
+    offsets = {}
+    with open(temp_path, 'wb') as f:
+        def write_object(number, body, stream=None):
+            offsets[number] = f.tell()
+            f.write(b'%d 0 obj\n' % number + body)
+            if stream is not None:
+                f.write(b'\nstream\n' + stream + b'\nendstream')
+            f.write(b'\nendobj\n')
+
+        f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        kids = b' '.join(b'%d 0 R' % number for number in page_objects)
+        write_object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(pages)))
+        font_refs = b' '.join(b'/%s %d 0 R' % (name.encode('ascii'), number) for name, number in font_numbers.items())
+        write_object(3, b'<< /Font << %s >> /ProcSet [/PDF /Text] >>' % font_refs)
+        for name, number in font_numbers.items():
+            write_object(number, b'<< /Type /Font /Subtype /Type1 /Name /%s /BaseFont /%s /Encoding /WinAnsiEncoding >>'
+                         % (name.encode('ascii'), fonts[name].encode('ascii')))
+
+        media_box = b'[0 0 %.4f %.4f]' % page_size
+        for number, streams in zip(page_objects, pages):
+            contents = b' '.join(b'%d 0 R' % (number + 1 + i) for i in range(len(streams)))
+            write_object(number, b'<< /Type /Page /Parent 2 0 R /MediaBox %s /Resources 3 0 R /Contents [%s] >>'
+                         % (media_box, contents))
+            for i, (stream, compressed) in enumerate(streams):
+                write_object(number + 1 + i, b'<< /Length %d%s >>' % (len(stream), b' /Filter /FlateDecode' if compressed
+                                                                      else b''), stream)
+
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % next_number)
+        for number in range(1, next_number):
+            f.write(b'%010d 00000 n \n' % offsets[number])
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (next_number, xref))
+    os.replace(temp_path, filename)
+
+
+class PageCache:
+    """Rendered page streams per chart, in memory and optionally on disk
+
+    On disk every chart is one file: a JSON header line with the fonts and
+    stream lengths, followed by the compressed streams.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pages')
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None and self.directory:
+            entry = self._load(key)
+            if entry is not None:
+                self.entries[key] = entry
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        if not self.directory:
+            return
+        header = json.dumps({'fonts': entry.fonts, 'lengths': [len(stream) for stream in entry.streams]})
+        temp_path = self._path(key) + '.part'
+        with open(temp_path, 'wb') as f:
+            f.write(header.encode('utf-8') + b'\n')
+            for stream in entry.streams:
+                f.write(stream)
+        os.replace(temp_path, self._path(key))
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                header = json.loads(f.readline())
+                streams = [f.read(length) for length in header['lengths']]
+        except (OSError, ValueError, KeyError):
+            return None
+        if any(len(stream) != length for stream, length in zip(streams, header['lengths'])):
+            return None
+        return PageStreams(header['fonts'], streams)
+
+    def prune(self, keep):
+        """Drop entries (and files) whose key is not in `keep`"""
+        keep = set(keep)
+        for key in list(self.entries):
+            if key not in keep:
+                del self.entries[key]
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.pages') and name[:-len('.pages')] not in keep:
+                    os.remove(os.path.join(self.directory, name))
+
+
+class BookRenderer:
+    """Songbook PDF assembled from per-chart page streams
+
+    Every chart starts on a new page, so its pages depend only on its own
+    formatted text and the layout options. They are cached as compressed
+    content streams under a hash of both. Building a book lays out and
+    draws only the charts missing from the cache and copies every other page
+    as-is, so a rebuild costs in proportion to the charts that changed.
+    Page numbers are separate small streams added while assembling.
+    """
+
+    def __init__(self, engine, cache=None):
+        from reportlab import Version
+        from reportlab.pdfbase.pdfmetrics import standardFonts
+
+        options = engine.options
+        for font in (options.font, options.chord_font):
+            if font not in standardFonts:
+                raise ValueError(f"Cached book rendering supports the standard PDF fonts only, not {font!r}")
+        self.engine = engine
+        self.cache = cache if cache is not None else PageCache()
+        self.renderer = PDFRenderer(engine)
+        self._fingerprint = json.dumps([RENDER_CACHE_VERSION, Version, options, engine.page_width,
+                                        engine.page_height]).encode('utf-8')
+
+    def cache_key(self, text):
+        """Hash of a chart's formatted text and everything that shapes its pages"""
+        return hashlib.sha256(self._fingerprint + b'\0' + text.encode('utf-8')).hexdigest()
+
+    def render_chart(self, text):
+        """Lay out and draw one chart; returns its PageStreams"""
+        from reportlab.pdfgen.canvas import Canvas
+
+        engine = self.engine
+        canvas = Canvas(io.BytesIO(), pagesize=(engine.page_width, engine.page_height))
+        # Register the fonts in a fixed order so internal names agree across charts and builds
+        for font in (engine.options.font, engine.options.chord_font):
+            canvas._doc.getInternalFontName(font)
+        fonts = {internal.lstrip('/'): font for font, internal in canvas._doc.fontMapping.items()}
+
+        layout = engine.layout_chart(text)
+        streams = []
+        for page in layout.pages:
+            self.renderer.draw_page(canvas, layout, page, None)
+            # The page's content stream as reportlab would write it
+            stream = '\n'.join([canvas._preamble] + canvas._code)
+            streams.append(zlib.compress(stream.encode('latin-1'), 6))
+            canvas.showPage()
+        return PageStreams(fonts, streams)
+
+    def _page_number_stream(self, fonts, number):
+        options = self.engine.options
+        size = options.font_size * 0.8
+        label = str(number)
+        internal = next(name for name, font in fonts.items() if font == options.font)
+        x = self.engine.page_width / 2 - self.engine.metrics.width(label, options.font, size) / 2
+        y = options.margin / 2 + options.font_size / 2
+        return b'BT /%s %.2f Tf %.2f %.2f Td %s Tj ET' % (internal.encode('ascii'), size, x, y, pdf_string(label))
+
+    def render(self, texts, filename):
+        """Write the book; returns {'pages': n, 'rendered': charts drawn, 'reused': charts from the cache}"""
+        pages = []
+        fonts = {}
+        rendered = 0
+        for text in texts:
+            key = self.cache_key(text)
+            entry = self.cache.get(key)
+            if entry is None:
+                entry = self.render_chart(text)
+                self.cache.put(key, entry)
+                rendered += 1
+            fonts.update(entry.fonts)
+            for stream in entry.streams:
+                page = [(stream, True)]
+                if self.engine.options.page_numbers:
+                    page.append((self._page_number_stream(entry.fonts, len(pages) + 1), False))
+                pages.append(page)
+
+        write_pdf(filename, (self.engine.page_width, self.engine.page_height), fonts, pages)
+        PDF_PAGES.inc(len(pages))
+        return {'pages': len(pages), 'rendered': rendered, 'reused': len(texts) - rendered}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lay out formatted charts as a section-aware PDF songbook")
+    parser.add_argument('charts', nargs='+', help="formatted chart text files, in book order")
+    parser.add_argument('-o', '--output', required=True, help="PDF file to write")
+    parser.add_argument('--landscape', action='store_true', help="landscape pages with 2 balanced columns")
+    parser.add_argument('--page-size', choices=sorted(PAGE_SIZES), default='a4')
+    parser.add_argument('--font', default='Courier', help="font for lyrics and labels")
+    parser.add_argument('--chord-font', default='Courier-Bold', help="font for chord lines")
+    parser.add_argument('--font-size', type=float, default=10.0, help="largest font size; wide charts shrink")
+    parser.add_argument('--cache', metavar='DIR',
+                        help="keep rendered pages in DIR and redraw only charts that changed (standard fonts only)")
+    args = parser.parse_args(argv)
+
+    texts = []
+    for path in args.charts:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read().rstrip())
+
+    try:
+        engine = PDFLayoutEngine(LayoutOptions(page_size=args.page_size, landscape=args.landscape, font=args.font,
+                                               chord_font=args.chord_font, font_size=args.font_size))
+        if args.cache:
+            book = BookRenderer(engine, PageCache(args.cache))
+            stats = book.render(texts, args.output)
+            book.cache.prune(book.cache_key(text) for text in texts)
+            pages = stats['pages']
+        else:
+            pages = PDFRenderer(engine).render(engine.layout_book(texts), args.output)
+    except ImportError:
+        print("Error: PDF export requires reportlab library. Install with: pip install reportlab", file=sys.stderr)
+        return 2
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if args.cache:
+        print(f"{len(texts)} chart(s), {pages} page(s) -> {args.output} "
+              f"({stats['rendered']} drawn, {stats['reused']} from cache)")
+    else:
+        print(f"{len(texts)} chart(s), {pages} page(s) -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Fused chord chart pipeline
+Parses a chart once and applies transposition, numbering, bar formatting and
+alignment as per-token transforms, emitting the final text a single time
+"""
+
+import os
+import re
+import sys
+import time
+
+try:
+    from chord_transpose import ChordTransposer
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose import ChordTransposer
+
+from chord_alignment import BarGrid, parse_bar_tokens
+from chord_metrics import CHARTS_PROCESSED, CHORDS_TRANSPOSED, LINES_CLASSIFIED, STAGE_SECONDS
+from chord_transpose_gui_smart_format import NumberedChordConverter, SmartFormatter
+from chord_transposition import TranspositionTable, get_shared_table
+
+KEY_PATTERN = re.compile(r'Do\s*=\s*([A-G][#b]?)')
+
+
+class ChartPipeline:
+    """Single-pass transpose + number + format + align pipeline
+
+    Produces the same text as chaining transpose_chart, format_chart and
+    align_bars_in_section, without materializing the chart between stages.
+    When numbering is requested the numbered chord lines are formatted and
+    aligned as well (the chained path leaves them untouched, because
+    numbered lines no longer look like chord lines to the formatter).
+    """
+
+    def __init__(self, transposer=None, formatter=None, number_converter=None, transposition_table=None):
+        self.transposer = transposer or ChordTransposer()
+        if transposition_table is None:
+            # The shared table is only valid for the default transposer
+            transposition_table = TranspositionTable(self.transposer) if transposer else get_shared_table()
+        self.transposition_table = transposition_table
+        self.formatter = formatter or SmartFormatter()
+        self.number_converter = number_converter or NumberedChordConverter()
+
+    def run(self, content, from_key=None, to_key=None, number_style=None, chart_wide=False):
+        """Process a chart and return the final text
+
+        from_key/to_key enable transposition, number_style ('roman' or
+        'arabic') enables Nashville numbering relative to the output key.
+        """
+        if not content:
+            return content
+
+        start = time.perf_counter()
+        lines = content.split('\n')
+        transpose = bool(from_key and to_key and from_key != to_key)
+
+        token_transforms = []
+        if transpose:
+            semitones, prefer_flats = self.transposition_table.interval(from_key, to_key)
+            transpose_symbol = self.transposition_table.transpose
+            token_transforms.append(lambda token: transpose_symbol(token, semitones, prefer_flats))
+
+        if number_style:
+            # Like convert_chart_to_numbers, numbering needs a 'Do = X' line
+            number_key = self._find_key(lines)
+            if number_key:
+                if transpose:
+                    number_key = to_key
+                use_roman = number_style == 'roman'
+                token_transforms.append(lambda token: self._number_token(token, number_key, use_roman))
+
+        # Charts use a tiny chord vocabulary, so each distinct token is transformed once per run
+        transform = None
+        if token_transforms:
+            transformed = {}
+
+            def transform(token):
+                result = transformed.get(token)
+                if result is None:
+                    result = token
+                    for token_transform in token_transforms:
+                        result = token_transform(result)
+                    transformed[token] = result
+                return result
+
+        # Parse once: chord lines become rows of bars of transformed tokens. Each section is
+        # aligned and rendered as soon as it ends, so only one section's rows are alive at a time
+        # (chart-wide alignment needs every row first).
+        is_chord_line = self.formatter.is_chord_line
+        chords = 0
+        output = []
+        section = []
+        pending = []
+        for line in lines:
+            if transpose and 'Do' in line:
+                line = KEY_PATTERN.sub('Do = ' + to_key, line)
+            row = self._parse_row(line, transform) if is_chord_line(line) else None
+            if isinstance(row, list):
+                if transpose:
+                    chords += sum(len(bar) - bar.count('.') for bar in row)
+                if not chart_wide:
+                    section.append(row)
+                    continue
+            if chart_wide:
+                pending.append((line, row))
+                continue
+            if section:
+                output.extend(self._render_section(section))
+                section = []
+            output.append(line if row is None else row)
+
+        if chart_wide:
+            grid = BarGrid(row for _, row in pending if isinstance(row, list))
+            output = [self._render(grid, line, row) for line, row in pending]
+        elif section:
+            output.extend(self._render_section(section))
+        line_count = len(lines)
+        # Release the input lines and the token memo before building the result string
+        del lines, section, pending, transform
+        output = '\n'.join(output)
+
+        CHARTS_PROCESSED.inc()
+        LINES_CLASSIFIED.inc(line_count)
+        if transpose:
+            CHORDS_TRANSPOSED.inc(chords)
+        STAGE_SECONDS.labels('pipeline').observe(time.perf_counter() - start)
+        return output
+
+    def _parse_row(self, line, transform):
+        """Tokenize a chord line into bars, applying the token transform"""
+        stripped = line.strip()
+        parts = line.split('|')
+
+        bars = []
+        last = len(parts) - 1
+        for i, part in enumerate(parts):
+            tokens = part.split()
+            # Leading and trailing empty pieces are not bars
+            if not tokens and (i == 0 or i == last):
+                continue
+            if transform:
+                tokens = [transform(token) for token in tokens]
+            bars.append(tokens)
+
+        if stripped.startswith('|') and stripped.endswith('|'):
+            # A lone empty bar disappears when the formatted line is re-parsed
+            if len(bars) == 1 and not bars[0]:
+                return []
+            return bars
+
+        # Unclosed lines are aligned as a single bar of the formatted text
+        formatted = ' | '.join(' '.join(tokens) for tokens in bars)
+        if stripped.startswith('|'):
+            formatted = '|' + formatted
+        if not self.formatter.is_chord_line(formatted):
+            return formatted
+        return parse_bar_tokens(formatted)
+
+    def _emit(self, lines, rows, chart_wide):
+        """Render rows parsed ahead by _parse_row (the chart codec does this) and interleave the other lines"""
+        if chart_wide:
+            grid = BarGrid(row for row in rows if isinstance(row, list))
+            return [self._render(grid, line, row) for line, row in zip(lines, rows)]
+
+        output = []
+        section = []
+        for line, row in zip(lines, rows):
+            if isinstance(row, list):
+                section.append(row)
+                continue
+            if section:
+                output.extend(self._render_section(section))
+                section = []
+            output.append(line if row is None else row)
+        if section:
+            output.extend(self._render_section(section))
+        return output
+
+    @staticmethod
+    def _render_section(section):
+        """Align one run of chord rows on their own grid"""
+        grid = BarGrid(section)
+        return [grid.render_row(row) for row in section]
+
+    @staticmethod
+    def _render(grid, line, row):
+        if row is None:
+            return line
+        if isinstance(row, str):
+            return row
+        return grid.render_row(row)
+
+    def _number_token(self, token, key, use_roman):
+        """Convert one token to numbered notation if it is a chord symbol"""
+        return self.number_converter.convert_chord_to_number(token, key, use_roman)
+
+    @staticmethod
+    def _find_key(lines):
+        for line in lines:
+            key_match = KEY_PATTERN.search(line)
+            if key_match:
+                return key_match.group(1)
+        return None
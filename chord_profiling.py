@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Pipeline profiling for the chord chart engine
+Per-stage wall-clock time and call counts plus a cProfile of the whole run,
+or per-stage tracemalloc peak and net allocation
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Methods worth timing on each engine object, keyed by class name
+ENGINE_HOT_SPOTS = {
+    'SmartFormatter': ('format_chart', 'format_chord_line', 'format_bar_content', 'is_chord_line',
+                       'detect_time_signature', 'align_chart', 'align_bars_in_section'),
+    'NumberedChordConverter': ('convert_chart_to_numbers', 'convert_line_to_numbers', 'is_chord_line'),
+    'ChordTransposer': ('transpose_chart',),
+    'PDFExporter': ('export_to_pdf',),
+}
+
+# Functions in the cProfile output that belong to the regex engine
+REGEX_FUNCTIONS = ("of 're.Pattern'", "re.compile", "re.sub", "re.search", "re.match", "re.split")
+
+
+class NullProfiler:
+    """Stand-in used when profiling is off; every hook is a no-op"""
+
+    enabled = False
+
+    def instrument(self, obj, method_names=None):
+        return obj
+
+    def stage(self, name):
+        return nullcontext()
+
+    def chart(self, name):
+        return nullcontext()
+
+
+class PipelineProfiler:
+    """Collects per-stage timings and a cProfile for one run
+
+    Stage times are inclusive: a stage that calls another instrumented
+    method also contains that method's time.
+    """
+
+    enabled = True
+
+    def __init__(self, output_dir, run_name=None):
+        self.output_dir = output_dir
+        self.run_name = run_name or datetime.now().strftime('profile-%Y%m%d-%H%M%S-') + str(os.getpid())
+        self.stage_times = defaultdict(float)
+        self.stage_calls = defaultdict(int)
+        self.chart_times = {}
+        self.profile = cProfile.Profile()
+        self._patched = []
+        self._started = None
+
+    def start(self):
+        """Start the cProfile collector"""
+        self._started = time.perf_counter()
+        self.profile.enable()
+
+    def stop(self):
+        """Stop the cProfile collector"""
+        self.profile.disable()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a named pipeline stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[name] += time.perf_counter() - start
+            self.stage_calls[name] += 1
+
+    @contextmanager
+    def chart(self, name):
+        """Time all work done for one chart"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.chart_times[name] = self.chart_times.get(name, 0.0) + time.perf_counter() - start
+
+    def instrument(self, obj, method_names=None):
+        """Wrap methods of an engine object so every call is counted and timed"""
+        class_name = type(obj).__name__
+        for name in method_names or ENGINE_HOT_SPOTS.get(class_name, ()):
+            original = getattr(obj, name, None)
+            if original is None:
+                continue
+            setattr(obj, name, self._timed(original, f"{class_name}.{name}"))
+            self._patched.append((obj, name))
+        return obj
+
+    def _timed(self, func, stage_name):
+        stage_times = self.stage_times
+        stage_calls = self.stage_calls
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                stage_times[stage_name] += perf_counter() - start
+                stage_calls[stage_name] += 1
+
+        return wrapper
+
+    def restore(self):
+        """Remove all method wrappers installed by instrument()"""
+        while self._patched:
+            obj, name = self._patched.pop()
+            # The wrapper lives on the instance; deleting it exposes the class method again
+            delattr(obj, name)
+
+    def regex_time(self, stats):
+        """Total internal time spent in the regex engine according to cProfile"""
+        total = 0.0
+        for (filename, _, function), (_, _, tottime, _, _) in stats.stats.items():
+            label = f"{filename}:{function}"
+            if any(marker in label for marker in REGEX_FUNCTIONS) or filename.endswith(os.path.join('re', '__init__.py')):
+                total += tottime
+        return total
+
+    def format_report(self, top_charts=10, top_functions=30):
+        """Build the text report"""
+        out = io.StringIO()
+        elapsed = time.perf_counter() - self._started if self._started else sum(self.chart_times.values())
+        stats = pstats.Stats(self.profile, stream=out)
+
+        out.write(f"Profile run {self.run_name}\n")
+        out.write(f"Wall time: {elapsed * 1000:.1f} ms, charts: {len(self.chart_times)}\n\n")
+
+        out.write("Stages (inclusive wall-clock, sorted by time)\n")
+        out.write(f"  {'stage':<45} {'calls':>9} {'total ms':>11} {'per call us':>12}\n")
+        for name, total in sorted(self.stage_times.items(), key=lambda item: item[1], reverse=True):
+            calls = self.stage_calls[name]
+            out.write(f"  {name:<45} {calls:>9} {total * 1000:>11.2f} {total / calls * 1e6:>12.1f}\n")
+        out.write(f"  {'regex engine (cProfile internal time)':<45} {'':>9} {self.regex_time(stats) * 1000:>11.2f}\n\n")
+
+        if self.chart_times:
+            out.write(f"Slowest charts (top {top_charts})\n")
+            slowest = sorted(self.chart_times.items(), key=lambda item: item[1], reverse=True)
+            for name, total in slowest[:top_charts]:
+                out.write(f"  {total * 1000:>10.2f} ms  {name}\n")
+            out.write("\n")
+
+        out.write(f"cProfile (top {top_functions} by cumulative time)\n")
+        stats.sort_stats('cumulative').print_stats(top_functions)
+        return out.getvalue()
+
+    def write_report(self, top_charts=10):
+        """Write <run>.txt and <run>.pstats into the output directory; returns both paths"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, self.run_name)
+        report_path = base + '.txt'
+        stats_path = base + '.pstats'
+
+        self.profile.dump_stats(stats_path)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(self.format_report(top_charts=top_charts))
+        return report_path, stats_path
+
+
+class MemoryProfiler:
+    """Records tracemalloc peak and net allocation per pipeline stage
+
+    A stage's peak is the highest traced memory while it ran, relative to
+    the memory traced when it started; its net is what it left allocated.
+    Nested stages (an instrumented method inside a stage) are measured on
+    their own and also count towards the enclosing stage's peak.
+    """
+
+    enabled = True
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self.stage_calls = defaultdict(int)
+        self.stage_peaks = defaultdict(int)
+        self.stage_net = defaultdict(int)
+        self.chart_peaks = {}
+        self._stack = []   # [start, peak] of every open stage, innermost last
+        self._patched = []
+        self._started_tracing = False
+
+    def start(self):
+        """Start tracing allocations (if nobody else already is)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+
+    def stop(self):
+        """Stop tracing if start() began it"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _enter(self):
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._stack:
+            if peak > frame[1]:
+                frame[1] = peak
+        tracemalloc.reset_peak()
+        frame = [current, current]
+        self._stack.append(frame)
+        return frame
+
+    def _exit(self, frame):
+        current, peak = tracemalloc.get_traced_memory()
+        if peak > frame[1]:
+            frame[1] = peak
+        self._stack.pop()
+        for outer in self._stack:
+            if frame[1] > outer[1]:
+                outer[1] = frame[1]
+        return frame[1] - frame[0], current - frame[0]
+
+    @contextmanager
+    def stage(self, name):
+        """Measure a named pipeline stage"""
+        frame = self._enter()
+        try:
+            yield
+        finally:
+            peak, net = self._exit(frame)
+            self.stage_calls[name] += 1
+            self.stage_net[name] += net
+            if peak > self.stage_peaks[name]:
+                self.stage_peaks[name] = peak
+
+    @contextmanager
+    def chart(self, name):
+        """Measure the peak of all work done for one chart"""
+        frame = self._enter()
+        try:
+            yield
+        finally:
+            peak, _ = self._exit(frame)
+            self.chart_peaks[name] = max(self.chart_peaks.get(name, 0), peak)
+
+    def instrument(self, obj, method_names=None):
+        """Wrap methods of an engine object so every call is measured as a stage"""
+        class_name = type(obj).__name__
+        for name in method_names or ENGINE_HOT_SPOTS.get(class_name, ()):
+            original = getattr(obj, name, None)
+            if original is None:
+                continue
+            setattr(obj, name, self._measured(original, f"{class_name}.{name}"))
+            self._patched.append((obj, name))
+        return obj
+
+    def _measured(self, func, stage_name):
+        stage = self.stage
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    def restore(self):
+        """Remove all method wrappers installed by instrument()"""
+        while self._patched:
+            obj, name = self._patched.pop()
+            delattr(obj, name)
+
+    def stage_rows(self):
+        """(stage, calls, peak_bytes, net_bytes) sorted by peak, worst first"""
+        return sorted(((name, calls, self.stage_peaks[name], self.stage_net[name])
+                       for name, calls in self.stage_calls.items()),
+                      key=lambda row: row[2], reverse=True)
+
+    def format_report(self, top_charts=10):
+        """Build the text report"""
+        out = io.StringIO()
+        out.write("Memory by stage (tracemalloc, sorted by peak)\n")
+        out.write(f"  {'stage':<50} {'calls':>9} {'peak KiB':>11} {'net KiB':>11} {'net/call B':>11}\n")
+        for name, calls, peak, net in self.stage_rows():
+            out.write(f"  {name:<50} {calls:>9} {peak / 1024:>11.1f} {net / 1024:>11.1f} {net / calls:>11.0f}\n")
+
+        if self.chart_peaks:
+            out.write(f"\nLargest charts by peak (top {top_charts})\n")
+            largest = sorted(self.chart_peaks.items(), key=lambda item: item[1], reverse=True)
+            for name, peak in largest[:top_charts]:
+                out.write(f"  {peak / 1024:>10.1f} KiB  {name}\n")
+        return out.getvalue()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Chord line scanner
+Splits a line into bars, spaces, beat dots, chord symbols and other text;
+words are recognized in one pass of a table-driven state machine
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+from chord_metrics import REGISTRY
+
+# Token kinds returned by scan_line()
+TOKEN_SPACE = 0
+TOKEN_BAR = 1
+TOKEN_DOT = 2
+TOKEN_CHORD = 3
+TOKEN_TEXT = 4
+TOKEN_KIND_NAMES = ('space', 'bar', 'dot', 'chord', 'text')
+
+# A chord symbol split into its parts; quality and annotation may be ''
+Chord = namedtuple('Chord', ['root', 'quality', 'bass', 'annotation'])
+
+ROOT_LETTERS = frozenset('ABCDEFG')
+# Punctuation charts put around a chord: '(G)', 'G)', 'C*', 'Am7-'
+WRAP_OPEN = '([{\'"'
+WRAP_CLOSE = ')]}\'".,;:!?*-~'
+# Distinct words remembered by scan_word (chord vocabularies are small)
+WORD_CACHE_SIZE = 8192
+
+# Character classes of the automaton
+(C_OTHER, C_DOT, C_ROOT, C_SHARP, C_FLAT, C_DIGIT, C_m, C_M, C_a, C_j, C_d, C_i, C_u, C_g,
+ C_s, C_o, C_PLUS, C_SLASH, C_OPEN, C_CLOSE) = range(20)
+CLASS_COUNT = 20
+
+_CLASS_OF = {'.': C_DOT, '#': C_SHARP, 'b': C_FLAT, 'm': C_m, 'M': C_M, 'a': C_a, 'j': C_j,
+             'd': C_d, 'i': C_i, 'u': C_u, 'g': C_g, 's': C_s, 'o': C_o, '+': C_PLUS, '/': C_SLASH,
+             '(': C_OPEN, ')': C_CLOSE}
+_CLASS_OF.update((letter, C_ROOT) for letter in ROOT_LETTERS)
+_CLASS_OF.update((digit, C_DIGIT) for digit in '0123456789')
+
+# Automaton states for one word, following the chord grammar of lib/chords.ts:
+# root [A-G][#b]?, quality (maj|dim|aug|sus|add|o|+|m|M|[#b]?digits)*, /bass [A-G][#b]?, (annotation)
+# plus digit/digit extensions such as 6/9 (S_DIGITS_SLASH, then S_EXTENSION)
+(S_START, S_ROOT, S_ROOT_ACC, S_QUALITY, S_M, S_MA, S_A, S_AU, S_AD, S_D, S_DI, S_S, S_SU, S_ACC, S_DIGITS,
+ S_SLASH, S_BASS, S_BASS_ACC, S_ANNOTATION, S_ANNOTATION_BODY, S_END, S_DIGITS_SLASH, S_EXTENSION) = range(23)
+S_DEAD = -1
+
+_ACCEPTING = frozenset((S_ROOT, S_ROOT_ACC, S_QUALITY, S_M, S_DIGITS, S_BASS, S_BASS_ACC, S_END, S_EXTENSION))
+
+# Moves after a root or a complete quality element
+_QUALITY_MOVES = {C_m: S_M, C_M: S_QUALITY, C_o: S_QUALITY, C_PLUS: S_QUALITY, C_DIGIT: S_DIGITS,
+                  C_SHARP: S_ACC, C_FLAT: S_ACC, C_a: S_A, C_d: S_D, C_s: S_S, C_SLASH: S_SLASH,
+                  C_OPEN: S_ANNOTATION}
+_ANNOTATION_CLASSES = [c for c in range(CLASS_COUNT) if c != C_CLOSE]
+
+_MOVES = {
+    S_START: {C_ROOT: S_ROOT},
+    S_ROOT: {**_QUALITY_MOVES, C_SHARP: S_ROOT_ACC, C_FLAT: S_ROOT_ACC},
+    S_ROOT_ACC: _QUALITY_MOVES,
+    S_QUALITY: _QUALITY_MOVES,
+    S_DIGITS: {**_QUALITY_MOVES, C_SLASH: S_DIGITS_SLASH},
+    # After '6/' a digit continues the quality (6/9), a root starts the bass (C6/E)
+    S_DIGITS_SLASH: {C_DIGIT: S_EXTENSION, C_ROOT: S_BASS},
+    S_EXTENSION: {**_QUALITY_MOVES, C_DIGIT: S_EXTENSION},
+    # After 'm' an 'a' may start 'maj' or the 'aug'/'add' that follows a minor 'm'
+    S_M: {**_QUALITY_MOVES, C_a: S_MA},
+    S_MA: {C_j: S_QUALITY, C_u: S_AU, C_d: S_AD},
+    S_A: {C_u: S_AU, C_d: S_AD},
+    S_AU: {C_g: S_QUALITY},
+    S_AD: {C_d: S_QUALITY},
+    S_D: {C_i: S_DI},
+    S_DI: {C_m: S_QUALITY},
+    S_S: {C_u: S_SU},
+    S_SU: {C_s: S_QUALITY},
+    S_ACC: {C_DIGIT: S_DIGITS},
+    S_SLASH: {C_ROOT: S_BASS},
+    S_BASS: {C_SHARP: S_BASS_ACC, C_FLAT: S_BASS_ACC, C_OPEN: S_ANNOTATION},
+    S_BASS_ACC: {C_OPEN: S_ANNOTATION},
+    S_ANNOTATION: dict.fromkeys(_ANNOTATION_CLASSES, S_ANNOTATION_BODY),
+    S_ANNOTATION_BODY: {**dict.fromkeys(_ANNOTATION_CLASSES, S_ANNOTATION_BODY), C_CLOSE: S_END},
+    S_END: {},
+}
+# TRANSITIONS[state][character class] -> next state (S_DEAD when the word cannot be a chord)
+TRANSITIONS = tuple(tuple(_MOVES[state].get(c, S_DEAD) for c in range(CLASS_COUNT)) for state in range(len(_MOVES)))
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def scan_word(word):
+    """(kind, chord) of one word without spaces or bars, in a single pass of the automaton"""
+    transitions = TRANSITIONS
+    class_of = _CLASS_OF.get
+    state = S_START
+    slash = paren = -1
+    dots = True
+    for i, character in enumerate(word):
+        c = class_of(character, C_OTHER)
+        if c != C_DOT:
+            dots = False
+        if state >= 0:
+            state = transitions[state][c]
+            if state == S_SLASH or state == S_DIGITS_SLASH:
+                slash = i
+            elif state == S_EXTENSION:
+                # The slash was part of the quality
+                slash = -1
+            elif state == S_ANNOTATION:
+                paren = i
+
+    if state in _ACCEPTING:
+        root_end = 2 if len(word) > 1 and word[1] in '#b' else 1
+        quality_end = slash if slash >= 0 else paren if paren >= 0 else len(word)
+        bass = None
+        if slash >= 0:
+            bass = word[slash + 1:paren] if paren >= 0 else word[slash + 1:]
+        return TOKEN_CHORD, Chord(word[:root_end], word[root_end:quality_end], bass,
+                                  word[paren:] if paren >= 0 else '')
+    return (TOKEN_DOT if dots else TOKEN_TEXT), None
+
+
+REGISTRY.register_cache('scanner_words', lambda: scan_word.cache_info()[:2])
+
+
+def scan_line(line):
+    """Tokenize a line left to right; returns a list of (kind, text, chord)
+
+    Runs of whitespace are TOKEN_SPACE and every '|' is a TOKEN_BAR. Any
+    other run of characters is one word: TOKEN_CHORD when the whole word is
+    a chord symbol (chord is then its Chord tuple), TOKEN_DOT when it is
+    only beat dots, otherwise TOKEN_TEXT. Joining the texts gives the line.
+    """
+    tokens = []
+    append = tokens.append
+    find = line.find
+    position = 0
+    # Words and bars come from C-level splitting; the automaton only sees each distinct word once
+    for word in line.replace('|', ' | ').split():
+        start = find(word, position)
+        if start > position:
+            append((TOKEN_SPACE, line[position:start], None))
+        if word == '|':
+            append((TOKEN_BAR, word, None))
+        else:
+            kind, chord = scan_word(word)
+            append((kind, word, chord))
+        position = start + len(word)
+    if position < len(line):
+        append((TOKEN_SPACE, line[position:], None))
+    return tokens
+
+
+def parse_chord(word):
+    """Chord tuple for a complete chord symbol, or None"""
+    if '|' in word or word.split() != [word]:
+        return None
+    return scan_word(word)[1]
+
+
+@lru_cache(maxsize=WORD_CACHE_SIZE)
+def find_chord(word):
+    """(prefix, chord, suffix) for a chord wrapped in punctuation, such as '(G)' or 'Am7-'; None otherwise"""
+    if '|' in word or word.split() != [word]:
+        return None
+    start = len(word) - len(word.lstrip(WRAP_OPEN))
+    stop = len(word.rstrip(WRAP_CLOSE))
+    # Closing characters may belong to the chord itself, as in '(C(add9))'
+    for end in range(len(word), max(stop, start) - 1, -1):
+        kind, chord = scan_word(word[start:end])
+        if kind == TOKEN_CHORD:
+            return word[:start], chord, word[end:]
+    return None
+
+
+def split_bars(line):
+    """Words of every bar: one list per '|'-separated segment (count('|') + 1 lists)"""
+    return [segment.split() for segment in line.split('|')]
+
+
+def has_chord_root(line):
+    """True when the line contains a chord root letter (A-G) anywhere"""
+    return not ROOT_LETTERS.isdisjoint(line)
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Chart library search
+Incremental full-text index of titles, section names and lyrics with key and
+time-signature metadata, stored locally in SQLite
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import unicodedata
+from collections import namedtuple
+from multiprocessing import Pool
+
+try:
+    from chord_transpose_gui_smart_format import SmartFormatter
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose_gui_smart_format import SmartFormatter
+
+from chord_capo import pitch_class
+from chord_classifier import LINE_HEADER, LINE_LYRIC, ChordLineClassifier
+from chord_codec import read_varint, write_varint
+from chord_formats import iter_sources, read_chart_lines
+from chord_pipeline import KEY_PATTERN
+
+DEFAULT_INDEX = 'chart_index.db'
+SCHEMA_VERSION = 1
+
+# Fields a word can be found in
+FIELD_TITLE = 0
+FIELD_SECTION = 1
+FIELD_LYRICS = 2
+FIELDS = {'title': FIELD_TITLE, 'section': FIELD_SECTION, 'lyrics': FIELD_LYRICS}
+
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)*")
+# 'grace', "amazing grace", title:grace, lyrics:"how sweet", grac*, -storm, key=G, key:Bb, time=3/4, 3/4
+QUERY_TOKEN_PATTERN = re.compile(r'(-)?(?:(\w+)[:=])?(?:"([^"]*)"|\'([^\']*)\'|(\S+))')
+TIME_QUERY_PATTERN = re.compile(r'(\d+)/(\d+)$')
+NOTE_QUERY_PATTERN = re.compile(r'([A-Ga-g])([#b]?)$')
+# Header lines that carry metadata rather than a section name: 'Time Signature = 3/4', 'Tempo (1/4) = 80 BPM'
+METADATA_LINE_PATTERN = re.compile(r'\s*[A-Za-z][^=:|]{0,40}=')
+# Chart position gap between lines, so a phrase never matches across lines
+LINE_GAP = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charts (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    title TEXT,
+    key TEXT,
+    key_pc INTEGER,
+    time_signature TEXT
+);
+CREATE INDEX IF NOT EXISTS charts_key ON charts (key_pc);
+CREATE INDEX IF NOT EXISTS charts_time ON charts (time_signature);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    term TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS postings (
+    term_id INTEGER NOT NULL,
+    chart_id INTEGER NOT NULL,
+    field INTEGER NOT NULL,
+    positions BLOB NOT NULL,
+    PRIMARY KEY (term_id, chart_id, field)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_chart ON postings (chart_id);
+"""
+
+SearchHit = namedtuple('SearchHit', ['path', 'title', 'key', 'time_signature', 'hits'])
+Clause = namedtuple('Clause', ['words', 'field', 'prefix', 'negated'])
+
+
+def normalize_word(word):
+    """Case- and accent-insensitive form of a word"""
+    word = word.casefold()
+    if not word.isascii():
+        word = ''.join(c for c in unicodedata.normalize('NFKD', word) if not unicodedata.combining(c))
+    return word
+
+
+def tokenize(text):
+    """Normalized words of a line"""
+    return [normalize_word(word) for word in WORD_PATTERN.findall(text)]
+
+
+def encode_positions(positions):
+    """Delta + varint encode a sorted list of positions"""
+    out = bytearray()
+    previous = 0
+    for position in positions:
+        write_varint(out, position - previous)
+        previous = position
+    return bytes(out)
+
+
+def decode_positions(data):
+    """Inverse of encode_positions"""
+    positions = []
+    pos = 0
+    value = 0
+    while pos < len(data):
+        delta, pos = read_varint(data, pos)
+        value += delta
+        positions.append(value)
+    return positions
+
+
+class ChartDocument:
+    """Searchable content of one chart: metadata and {(word, field): positions}"""
+
+    __slots__ = ('title', 'key', 'time_signature', 'postings')
+
+    def __init__(self, title, key, time_signature, postings):
+        self.title = title
+        self.key = key
+        self.time_signature = time_signature
+        self.postings = postings
+
+    @classmethod
+    def from_lines(cls, lines, classifier, formatter):
+        """Index lyrics and header lines; the first header line is the title
+
+        Metadata headers (time signature, tempo, ...) are not indexed: they
+        are in every chart and are searched through the key=/time= filters.
+        """
+        kinds = classifier.classify_lines(lines)
+        postings = {}
+        title = None
+        position = 0
+
+        for line, kind in zip(lines, kinds):
+            if kind == LINE_HEADER:
+                if METADATA_LINE_PATTERN.match(line):
+                    continue
+                field = FIELD_SECTION if title is not None else FIELD_TITLE
+                if title is None:
+                    title = line.strip()
+            elif kind == LINE_LYRIC:
+                field = FIELD_LYRICS
+            else:
+                continue
+            for word in tokenize(line):
+                postings.setdefault((word, field), []).append(position)
+                position += 1
+            position += LINE_GAP
+
+        content = '\n'.join(lines)
+        key_match = KEY_PATTERN.search(content)
+        numerator, denominator = formatter.detect_time_signature(content)
+        return cls(title, key_match.group(1) if key_match else None, f"{numerator}/{denominator}", postings)
+
+
+_worker_state = {}
+
+
+def _read_document(job):
+    """Worker: read and tokenize one chart"""
+    path, mtime_ns, size = job
+    if not _worker_state:
+        _worker_state['classifier'] = ChordLineClassifier()
+        _worker_state['formatter'] = SmartFormatter()
+    try:
+        lines = list(read_chart_lines(path))
+        return path, mtime_ns, size, ChartDocument.from_lines(lines, _worker_state['classifier'],
+                                                              _worker_state['formatter']), None
+    except Exception as e:
+        return path, mtime_ns, size, None, str(e)
+
+
+def parse_query(text):
+    """Split a query into word clauses and metadata filters
+
+    Words and quoted phrases must all match (a bare 'AND' is ignored);
+    'title:', 'section:' and 'lyrics:' restrict a clause to one field, a
+    trailing '*' matches a prefix and a leading '-' excludes charts. 'key=G'
+    (or key:G) and 'time=3/4' (or a bare 3/4) filter on metadata; keys match
+    enharmonically. Returns (clauses, filters).
+    """
+    clauses = []
+    filters = {}
+    for match in QUERY_TOKEN_PATTERN.finditer(text):
+        negated, name, double_quoted, single_quoted, bare = match.groups()
+        name = name.lower() if name else None
+        value = double_quoted if double_quoted is not None else single_quoted if single_quoted is not None else bare
+
+        if bare == 'AND' and not name and not negated:
+            continue
+        if name == 'key':
+            note = NOTE_QUERY_PATTERN.match(value)
+            if not note:
+                raise ValueError(f"Invalid key '{value}'")
+            filters['key_pc'] = pitch_class(note.group(1).upper() + note.group(2))
+            continue
+        if name in ('time', 'timesig') or (not name and bare and TIME_QUERY_PATTERN.match(bare)):
+            time_match = TIME_QUERY_PATTERN.match(value.replace(' ', ''))
+            if not time_match:
+                raise ValueError(f"Invalid time signature '{value}'")
+            filters['time_signature'] = f"{int(time_match.group(1))}/{int(time_match.group(2))}"
+            continue
+        if name and name not in FIELDS:
+            raise ValueError(f"Unknown field '{name}' (use title, section, lyrics, key or time)")
+
+        prefix = bare is not None and value.endswith('*')
+        words = tokenize(value)
+        if words:
+            clauses.append(Clause(tuple(words), FIELDS.get(name), prefix, bool(negated)))
+    return clauses, filters
+
+
+class ChartIndex:
+    """Positional inverted index over a chart library
+
+    Each indexed word keeps its positions per chart and field, delta-encoded
+    as varints, so phrase queries are answered from the index alone. Charts
+    are re-read only when their size or modification time changes.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f"{path}: index schema {version} is not supported, delete it to rebuild")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+        self._term_ids = {}
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, paths, workers=None, parallel_threshold=64):
+        """Bring the index up to date with files and directories
+
+        Returns {'indexed': n, 'unchanged': n, 'removed': n, 'failed': [(path, error)]}.
+        Charts that disappeared from an indexed directory are dropped.
+        """
+        known = {path: (chart_id, mtime_ns, size)
+                 for chart_id, path, mtime_ns, size in self.db.execute('SELECT id, path, mtime_ns, size FROM charts')}
+        seen = set()
+        jobs = []
+        for source, _ in iter_sources(paths):
+            source = os.path.abspath(source)
+            try:
+                stat = os.stat(source)
+            except OSError:
+                continue
+            seen.add(source)
+            previous = known.get(source)
+            if previous is None or previous[1:] != (stat.st_mtime_ns, stat.st_size):
+                jobs.append((source, stat.st_mtime_ns, stat.st_size))
+
+        roots = [os.path.join(os.path.abspath(path), '') for path in paths if os.path.isdir(path)]
+        removed = [chart_id for path, (chart_id, _, _) in known.items()
+                   if path not in seen and (any(path.startswith(root) for root in roots) or not os.path.exists(path))]
+
+        if len(jobs) >= parallel_threshold and workers != 1:
+            pool = Pool(workers)
+            documents = pool.imap_unordered(_read_document, jobs, chunksize=16)
+        else:
+            pool = None
+            documents = map(_read_document, jobs)
+
+        failed = []
+        try:
+            with self.db:
+                for chart_id in removed:
+                    self._delete(chart_id)
+                for path, mtime_ns, size, document, error in documents:
+                    if error:
+                        failed.append((path, error))
+                        continue
+                    previous = known.get(path)
+                    if previous:
+                        self._delete(previous[0])
+                    self._insert(path, mtime_ns, size, document)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        return {'indexed': len(jobs) - len(failed), 'unchanged': len(seen) - len(jobs), 'removed': len(removed),
+                'failed': failed}
+
+    def _delete(self, chart_id):
+        self.db.execute('DELETE FROM postings WHERE chart_id = ?', (chart_id,))
+        self.db.execute('DELETE FROM charts WHERE id = ?', (chart_id,))
+
+    def _term_id(self, term):
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            self.db.execute('INSERT OR IGNORE INTO terms (term) VALUES (?)', (term,))
+            term_id = self.db.execute('SELECT id FROM terms WHERE term = ?', (term,)).fetchone()[0]
+            self._term_ids[term] = term_id
+        return term_id
+
+    def _insert(self, path, mtime_ns, size, document):
+        key_pc = pitch_class(document.key) if document.key else None
+        cursor = self.db.execute(
+            'INSERT INTO charts (path, mtime_ns, size, title, key, key_pc, time_signature) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (path, mtime_ns, size, document.title, document.key, key_pc, document.time_signature))
+        chart_id = cursor.lastrowid
+        self.db.executemany(
+            'INSERT INTO postings (term_id, chart_id, field, positions) VALUES (?, ?, ?, ?)',
+            [(self._term_id(word), chart_id, field, encode_positions(positions))
+             for (word, field), positions in document.postings.items()])
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM charts').fetchone()[0]
+
+    def search(self, query, limit=50):
+        """Charts matching a query (see parse_query), most hits first"""
+        clauses, filters = parse_query(query)
+        candidates = None
+        if filters:
+            conditions = ' AND '.join(f'{column} = ?' for column in filters)
+            candidates = {row[0] for row in self.db.execute(f'SELECT id FROM charts WHERE {conditions}',
+                                                            tuple(filters.values()))}
+
+        hits = {}
+        # Narrow with the positive clauses first, cheapest (rarest) first
+        positive = sorted((clause for clause in clauses if not clause.negated), key=self._clause_cost)
+        for clause in positive:
+            if candidates is not None and not candidates:
+                break
+            matches = self._match_clause(clause, candidates)
+            candidates = set(matches) if candidates is None else candidates & matches.keys()
+            for chart_id in candidates:
+                hits[chart_id] = hits.get(chart_id, 0) + matches[chart_id]
+
+        if candidates is None:
+            candidates = {row[0] for row in self.db.execute('SELECT id FROM charts')}
+        for clause in clauses:
+            if clause.negated and candidates:
+                candidates -= self._match_clause(clause, candidates).keys()
+        if not candidates:
+            return []
+
+        rows = self._chart_rows(candidates)
+        ranked = sorted(candidates, key=lambda chart_id: (-hits.get(chart_id, 0), rows[chart_id][0]))
+        return [SearchHit(*rows[chart_id], hits.get(chart_id, 0)) for chart_id in ranked[:limit]]
+
+    def _chart_rows(self, chart_ids):
+        rows = {}
+        chart_ids = list(chart_ids)
+        for start in range(0, len(chart_ids), 500):
+            batch = chart_ids[start:start + 500]
+            for row in self.db.execute(
+                    f"SELECT id, path, title, key, time_signature FROM charts WHERE id IN ({','.join('?' * len(batch))})",
+                    batch):
+                rows[row[0]] = row[1:]
+        return rows
+
+    def _term_ids_for(self, word, prefix):
+        if not prefix:
+            row = self.db.execute('SELECT id FROM terms WHERE term = ?', (word,)).fetchone()
+            return [row[0]] if row else []
+        # Range scan on the term index: every term starting with `word`
+        return [row[0] for row in self.db.execute('SELECT id FROM terms WHERE term >= ? AND term < ?',
+                                                  (word, word + '\U0010ffff'))]
+
+    def _clause_cost(self, clause):
+        """Rough posting count of a clause's rarest word, for ordering"""
+        costs = []
+        for i, word in enumerate(clause.words):
+            term_ids = self._term_ids_for(word, clause.prefix and i == len(clause.words) - 1)
+            if not term_ids:
+                return 0
+            costs.append(self.db.execute(
+                f"SELECT COUNT(*) FROM postings WHERE term_id IN ({','.join('?' * len(term_ids))})",
+                term_ids).fetchone()[0])
+        return min(costs)
+
+    def _positions(self, word, prefix, field, candidates):
+        """{chart_id: sorted positions} of one word (or prefix) within a field"""
+        term_ids = self._term_ids_for(word, prefix)
+        if not term_ids:
+            return {}
+        sql = f"SELECT chart_id, positions FROM postings WHERE term_id IN ({','.join('?' * len(term_ids))})"
+        parameters = list(term_ids)
+        if field is not None:
+            sql += ' AND field = ?'
+            parameters.append(field)
+
+        positions = {}
+        for chart_id, data in self.db.execute(sql, parameters):
+            if candidates is None or chart_id in candidates:
+                positions.setdefault(chart_id, []).extend(decode_positions(data))
+        return positions
+
+    def _match_clause(self, clause, candidates):
+        """{chart_id: occurrences} of a word or phrase clause"""
+        last = len(clause.words) - 1
+        current = self._positions(clause.words[0], clause.prefix and last == 0, clause.field, candidates)
+        if last == 0:
+            return {chart_id: len(positions) for chart_id, positions in current.items()}
+
+        # Phrase: keep start positions whose following words sit at +1, +2, ...
+        starts = {chart_id: set(positions) for chart_id, positions in current.items()}
+        for offset, word in enumerate(clause.words[1:], 1):
+            if not starts:
+                break
+            following = self._positions(word, clause.prefix and offset == last, clause.field, starts.keys())
+            matched = {}
+            for chart_id, positions in starts.items():
+                if chart_id in following:
+                    next_positions = set(following[chart_id])
+                    kept = {start for start in positions if start + offset in next_positions}
+                    if kept:
+                        matched[chart_id] = kept
+            starts = matched
+        return {chart_id: len(positions) for chart_id, positions in starts.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index and search the chart library by lyrics, titles and metadata")
+    parser.add_argument('--index', default=DEFAULT_INDEX, help="index database file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('index', help="add or refresh charts in the index")
+    index_parser.add_argument('paths', nargs='+', help="chart files or directories")
+    index_parser.add_argument('--workers', type=int, help="worker processes for large updates (default: all cores)")
+
+    query_parser = subparsers.add_parser('query', help="search the index")
+    query_parser.add_argument('query', nargs='*',
+                              help="e.g. grace key=G 3/4, \"amazing grace\", title:grace, lyrics:grac*, -storm")
+    query_parser.add_argument('--limit', type=int, default=50, help="maximum results")
+    query_parser.add_argument('--json', action='store_true', help="print JSON lines instead of text")
+    # Negated terms such as -storm look like options to argparse; keep them as query terms
+    args, negated = parser.parse_known_args(argv)
+    if negated and (args.command != 'query' or any(term.startswith('--') for term in negated)):
+        parser.error(f"unrecognized arguments: {' '.join(negated)}")
+    if args.command == 'query':
+        args.query += negated
+        if not args.query:
+            query_parser.error("the following arguments are required: query")
+
+    with ChartIndex(args.index) as index:
+        if args.command == 'index':
+            started = time.perf_counter()
+            summary = index.update(args.paths, workers=args.workers)
+            for path, error in summary['failed']:
+                print(f"Error: {path}: {error}", file=sys.stderr)
+            print(f"{summary['indexed']} indexed, {summary['unchanged']} unchanged, {summary['removed']} removed, "
+                  f"{len(summary['failed'])} failed in {time.perf_counter() - started:.2f}s ({len(index)} charts)")
+            return 1 if summary['failed'] else 0
+
+        started = time.perf_counter()
+        try:
+            results = index.search(' '.join(args.query), limit=args.limit)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 2
+        elapsed = time.perf_counter() - started
+        for hit in results:
+            if args.json:
+                print(json.dumps(hit._asdict()))
+            else:
+                print(f"{hit.path}  [{hit.key or '-'} {hit.time_signature}]  {hit.title or ''}  ({hit.hits} hits)")
+        print(f"{len(results)} result(s) in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
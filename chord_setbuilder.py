@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Set-list builder
+Processes every song of a set list in a worker pool and writes one packet per
+musician (concert-key chords, capo shapes for guitar, Nashville numbers)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from multiprocessing import Pool
+
+try:
+    from chord_transpose import PDFExporter
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose import PDFExporter
+
+from chord_capo import capo_shapes_key
+from chord_pipeline import KEY_PATTERN, ChartPipeline
+from chord_setlist import load_setlist
+
+PACKETS = ('chords', 'guitar', 'numbers')
+CACHE_DIR_NAME = '.setlist_cache'
+# Bump when the output of the engine changes, so cached songs are rebuilt
+CACHE_VERSION = 1
+UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|]+')
+
+
+def render_packets(pipeline, content, target_key, capo, number_style, packets):
+    """Render one song for every requested packet; returns {packet: text}"""
+    key_match = KEY_PATTERN.search(content)
+    source_key = key_match.group(1) if key_match else None
+    if target_key and not source_key:
+        raise ValueError("No key found (looking for 'Do = X')")
+    concert_key = target_key or source_key
+
+    texts = {}
+    if 'chords' in packets:
+        texts['chords'] = pipeline.run(content, source_key, concert_key)
+    if 'guitar' in packets:
+        if capo and concert_key:
+            shapes_key = capo_shapes_key(pipeline.transposer, concert_key, capo)
+            shapes = pipeline.run(content, source_key, shapes_key).split('\n')
+            # Note the capo right under the 'Do = X' line
+            at = next((i + 1 for i, line in enumerate(shapes) if KEY_PATTERN.search(line)), 0)
+            shapes.insert(at, f"Capo {capo} (sounds in {concert_key})")
+            texts['guitar'] = '\n'.join(shapes)
+        else:
+            texts['guitar'] = texts.get('chords') or pipeline.run(content, source_key, concert_key)
+    if 'numbers' in packets:
+        texts['numbers'] = pipeline.run(content, source_key, concert_key, number_style=number_style)
+    return texts, concert_key
+
+
+_worker_state = {}
+
+
+def _pipeline():
+    if 'pipeline' not in _worker_state:
+        _worker_state['pipeline'] = ChartPipeline()
+    return _worker_state['pipeline']
+
+
+def _export_pdf(text, filename, landscape):
+    if 'pdf' not in _worker_state:
+        _worker_state['pdf'] = PDFExporter()
+    temp_path = filename + '.part'
+    _worker_state['pdf'].export_to_pdf(text, temp_path, landscape_mode=landscape)
+    os.replace(temp_path, filename)
+
+
+def _build_song(job):
+    """Worker: render a song's packets and PDFs into the cache"""
+    try:
+        texts, concert_key = render_packets(_pipeline(), job['content'], job['key'], job['capo'],
+                                            job['number_style'], job['packets'])
+        if job['pdf']:
+            for packet, text in texts.items():
+                _export_pdf(text, f"{job['cache_base']}.{packet}.pdf", job['landscape'])
+
+        temp_path = job['cache_base'] + '.json.part'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'texts': texts, 'key': concert_key}, f)
+        os.replace(temp_path, job['cache_base'] + '.json')
+        return job['index'], None
+    except Exception as e:
+        return job['index'], str(e)
+
+
+def _build_packet_pdf(job):
+    """Worker: export one musician's combined packet"""
+    text, filename, landscape = job
+    try:
+        _export_pdf(text, filename, landscape)
+        return filename, None
+    except Exception as e:
+        return filename, str(e)
+
+
+class SetListBuilder:
+    """Builds per-musician packets for a set list
+
+    Every song is rendered once per packet in a worker pool. Results (text
+    and PDFs) are cached under the output directory by a hash of the chart
+    content and the song's options, so re-running after editing one song or
+    changing one key only rebuilds that song.
+    """
+
+    def __init__(self, output_dir, packets=PACKETS, pdf=False, landscape=False, number_style='roman',
+                 workers=None, log=print):
+        unknown = set(packets) - set(PACKETS)
+        if unknown:
+            raise ValueError(f"Unknown packet(s): {', '.join(sorted(unknown))}")
+        self.output_dir = output_dir
+        self.packets = tuple(packet for packet in PACKETS if packet in packets)
+        self.pdf = pdf
+        self.landscape = landscape
+        self.number_style = number_style
+        self.workers = workers
+        self.log = log
+        self.cache_dir = os.path.join(output_dir, CACHE_DIR_NAME)
+
+    def cache_key(self, content, entry):
+        """Hash of everything that determines a song's outputs"""
+        options = json.dumps([CACHE_VERSION, entry.key, entry.capo, entry.number_style or self.number_style,
+                              self.packets, self.pdf, self.landscape])
+        return hashlib.sha256(content.encode('utf-8') + b'\0' + options.encode('utf-8')).hexdigest()
+
+    def build(self, entries, name='setlist'):
+        """Build all packets; returns {'built': n, 'cached': n, 'failed': n}"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        songs = []
+        jobs = []
+        queued = set()
+        failed = 0
+
+        for index, entry in enumerate(entries):
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    content = f.read().rstrip()
+            except OSError as e:
+                self.log(f"Error: {entry.path}: {e}")
+                failed += 1
+                continue
+
+            cache_base = os.path.join(self.cache_dir, self.cache_key(content, entry))
+            songs.append((index, entry, cache_base))
+            # A song played twice with the same options (a reprise) is built once
+            if cache_base not in queued and not self._cached(cache_base):
+                queued.add(cache_base)
+                jobs.append({'index': index, 'content': content, 'key': entry.key, 'capo': entry.capo,
+                             'number_style': entry.number_style or self.number_style, 'packets': self.packets,
+                             'pdf': self.pdf, 'landscape': self.landscape, 'cache_base': cache_base})
+
+        with Pool(self.workers) as pool:
+            errors = dict(result for result in pool.imap_unordered(_build_song, jobs) if result[1])
+            for index, error in errors.items():
+                self.log(f"Error: {entries[index].path}: {error}")
+            failed_bases = {job['cache_base'] for job in jobs if job['index'] in errors}
+            failed += sum(1 for song in songs if song[2] in failed_bases)
+
+            songs = [song for song in songs if song[2] not in failed_bases]
+            packet_pdfs = self._write_packets(songs, name)
+            for filename, error in pool.imap_unordered(_build_packet_pdf, packet_pdfs):
+                if error:
+                    self.log(f"Error: {filename}: {error}")
+
+        summary = {'built': len(jobs) - len(errors), 'cached': len(songs) - (len(jobs) - len(errors)),
+                   'failed': failed}
+        self.log(f"{len(songs)} song(s): {summary['built']} built, {summary['cached']} cached, "
+                 f"{summary['failed']} failed -> {self.output_dir}")
+        return summary
+
+    def _cached(self, cache_base):
+        if not os.path.exists(cache_base + '.json'):
+            return False
+        return not self.pdf or all(os.path.exists(f"{cache_base}.{packet}.pdf") for packet in self.packets)
+
+    def _write_packets(self, songs, name):
+        """Copy cached songs into each packet folder in set order; returns combined-PDF jobs"""
+        packet_texts = {packet: [] for packet in self.packets}
+        written = {packet: set() for packet in self.packets}
+
+        for position, (_, entry, cache_base) in enumerate(songs, 1):
+            with open(cache_base + '.json', 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            stem = os.path.splitext(os.path.basename(entry.path))[0]
+            label = f"{position:02d} - {stem}" + (f" ({cached['key']})" if cached['key'] else '')
+            label = UNSAFE_FILENAME.sub('_', label)
+
+            for packet in self.packets:
+                directory = os.path.join(self.output_dir, packet)
+                os.makedirs(directory, exist_ok=True)
+                text = cached['texts'][packet]
+                packet_texts[packet].append(text)
+
+                with open(os.path.join(directory, label + '.txt'), 'w', encoding='utf-8') as f:
+                    f.write(text + '\n')
+                written[packet].add(label + '.txt')
+                if self.pdf:
+                    shutil.copyfile(f"{cache_base}.{packet}.pdf", os.path.join(directory, label + '.pdf'))
+                    written[packet].add(label + '.pdf')
+
+        packet_pdfs = []
+        for packet, texts in packet_texts.items():
+            directory = os.path.join(self.output_dir, packet)
+            combined = os.path.join(directory, f"{name} - {packet}")
+            with open(combined + '.txt', 'w', encoding='utf-8') as f:
+                f.write('\n\n\n'.join(texts) + '\n')
+            written[packet].add(os.path.basename(combined) + '.txt')
+            if self.pdf:
+                packet_pdfs.append(('\n\n\n'.join(texts), combined + '.pdf', self.landscape))
+                written[packet].add(os.path.basename(combined) + '.pdf')
+            self._remove_stale(directory, written[packet])
+        return packet_pdfs
+
+    @staticmethod
+    def _remove_stale(directory, keep):
+        """Remove songs that dropped out of the set list"""
+        for filename in os.listdir(directory):
+            if filename not in keep and filename.endswith(('.txt', '.pdf')):
+                os.remove(os.path.join(directory, filename))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build per-musician packets for a set list")
+    parser.add_argument('setlist', help="set-list file ('song.txt = G, capo 2, roman' per line)")
+    parser.add_argument('-o', '--output-dir', required=True, help="directory for the packets")
+    parser.add_argument('--packets', default=','.join(PACKETS),
+                        help=f"comma-separated packets to build (default: {','.join(PACKETS)})")
+    parser.add_argument('--numbers', choices=['roman', 'arabic'], default='roman',
+                        help="number style for songs that do not set one")
+    parser.add_argument('--pdf', action='store_true', help="also export PDFs per song and per packet")
+    parser.add_argument('--landscape', action='store_true', help="landscape PDF (2 columns)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    try:
+        entries = load_setlist(args.setlist)
+        builder = SetListBuilder(args.output_dir, packets=[p.strip() for p in args.packets.split(',') if p.strip()],
+                                 pdf=args.pdf, landscape=args.landscape, number_style=args.numbers,
+                                 workers=args.workers)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    name = os.path.splitext(os.path.basename(args.setlist))[0]
+    summary = builder.build(entries, name=name)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
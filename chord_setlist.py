@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Set-list files
+One song per line: '<chart path> = <target key>, capo <n>, <roman|arabic>';
+everything after the path is optional
+"""
+
+import os
+import re
+from collections import namedtuple
+
+SetListEntry = namedtuple('SetListEntry', ['path', 'key', 'capo', 'number_style'], defaults=(None, 0, None))
+
+# A target key; a minor key ('C#m') names its tonic, which is what 'Do = X' lines hold
+KEY_PATTERN = re.compile(r'([A-G][#b]?)m?$')
+CAPO_PATTERN = re.compile(r'capo\s*(\d+)$', re.IGNORECASE)
+NUMBER_STYLE_PATTERN = re.compile(r'(?:numbers\s+)?(roman|arabic)$', re.IGNORECASE)
+# '#' starts a comment only at the start of a line or after whitespace, so 'F#' stays a key
+COMMENT_PATTERN = re.compile(r'(?:^|\s)#.*$')
+
+
+def parse_options(text, line_number):
+    """Parse 'G, capo 2, roman' into (key, capo, number_style)"""
+    key = None
+    capo = 0
+    number_style = None
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        capo_match = CAPO_PATTERN.match(item)
+        style_match = NUMBER_STYLE_PATTERN.match(item)
+        key_match = KEY_PATTERN.match(item)
+        if key_match and key is None:
+            key = key_match.group(1)
+        elif capo_match:
+            capo = int(capo_match.group(1))
+            if capo > 11:
+                raise ValueError(f"Line {line_number}: capo must be between 0 and 11")
+        elif style_match:
+            number_style = style_match.group(1).lower()
+        else:
+            raise ValueError(f"Line {line_number}: unknown option '{item}'")
+    return key, capo, number_style
+
+
+def parse_setlist(text, base_dir='.'):
+    """Parse set-list text; chart paths are resolved relative to base_dir"""
+    entries = []
+    for line_number, line in enumerate(text.split('\n'), 1):
+        line = COMMENT_PATTERN.sub('', line).strip()
+        if not line:
+            continue
+
+        path, _, options = line.partition('=')
+        path = path.strip()
+        if not path:
+            raise ValueError(f"Line {line_number}: missing chart path")
+
+        key, capo, number_style = parse_options(options, line_number)
+        entries.append(SetListEntry(os.path.normpath(os.path.join(base_dir, path)), key, capo, number_style))
+    return entries
+
+
+def load_setlist(path):
+    """Read and parse a set-list file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_setlist(f.read(), os.path.dirname(os.path.abspath(path)))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Parallel formatting of very large documents
+Splits one document (e.g. a whole songbook in a single file) between chord-line
+sections, formats and aligns the pieces in a process pool and joins them in order
+"""
+
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+try:
+    from chord_transpose_gui_smart_format import SmartFormatter
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose_gui_smart_format import SmartFormatter
+
+# Documents shorter than this are formatted serially; a pool would not pay off
+MIN_PARALLEL_LINES = 2000
+# Pieces per worker, so a slow piece does not leave the other workers idle
+PIECES_PER_WORKER = 4
+
+_worker_formatter = None
+
+
+def _format_piece(text):
+    """Worker: format and align one piece of a document"""
+    global _worker_formatter
+    if _worker_formatter is None:
+        _worker_formatter = SmartFormatter()
+    return _worker_formatter.format_and_align(text)
+
+
+def split_document(lines, is_chord_line, pieces):
+    """Split lines into about `pieces` runs, cutting only after non-chord lines
+
+    Formatting never changes a non-chord line and alignment restarts after
+    every one, so each run formats exactly as it would inside the document.
+    Returns a list of line lists that concatenate back to `lines`.
+    """
+    target = max(1, len(lines) // max(pieces, 1))
+    runs = []
+    start = 0
+    for i in range(target - 1, len(lines) - 1):
+        if i + 1 - start >= target and not is_chord_line(lines[i]):
+            runs.append(lines[start:i + 1])
+            start = i + 1
+    runs.append(lines[start:])
+    return runs
+
+
+class ParallelDocumentFormatter:
+    """format_and_align for one huge document across a process pool
+
+    The output is byte-identical to SmartFormatter.format_and_align. Chart-wide
+    alignment puts every chord line on one grid, so it is not split and runs
+    serially.
+    """
+
+    def __init__(self, formatter=None, workers=None, min_parallel_lines=MIN_PARALLEL_LINES):
+        self.formatter = formatter or SmartFormatter()
+        self.workers = workers or os.cpu_count() or 1
+        self.min_parallel_lines = min_parallel_lines
+        self._pool = None
+
+    def format_and_align(self, content, chart_wide=False):
+        """Format and align a document, in parallel when it is large enough"""
+        lines = content.split('\n')
+        if chart_wide or self.workers == 1 or len(lines) < self.min_parallel_lines:
+            return self.formatter.format_and_align(content, chart_wide=chart_wide)
+
+        runs = split_document(lines, self.formatter.is_chord_line, self.workers * PIECES_PER_WORKER)
+        if self._pool is None:
+            self._pool = Pool(self.workers)
+        return '\n'.join(self._pool.imap(_format_piece, ('\n'.join(run) for run in runs)))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Format and align one very large chart document in parallel")
+    parser.add_argument('document', help="chart text file (e.g. a whole songbook)")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: all cores)")
+    parser.add_argument('--chart-wide', action='store_true', help="align all sections on one grid (serial)")
+    parser.add_argument('--verify', action='store_true',
+                        help="also run the serial formatter, compare the outputs and print both timings")
+    args = parser.parse_args(argv)
+
+    with open(args.document, 'r', encoding='utf-8') as f:
+        content = f.read().rstrip()
+
+    with ParallelDocumentFormatter(workers=args.workers) as formatter:
+        start = time.perf_counter()
+        result = formatter.format_and_align(content, chart_wide=args.chart_wide)
+        parallel_time = time.perf_counter() - start
+
+        if args.verify:
+            start = time.perf_counter()
+            serial = formatter.formatter.format_and_align(content, chart_wide=args.chart_wide)
+            serial_time = time.perf_counter() - start
+            print(f"{content.count(chr(10)) + 1} lines: serial {serial_time:.3f}s, parallel {parallel_time:.3f}s "
+                  f"({formatter.workers} workers), output {'identical' if serial == result else 'DIFFERENT'}",
+                  file=sys.stderr)
+            if serial != result:
+                return 1
+
+    if args.output:
+        temp_path = args.output + '.part'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(result + '\n')
+        os.replace(temp_path, args.output)
+    else:
+        print(result)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Thread-pool chart formatting
+Formats many charts concurrently with one shared, stateless SmartFormatter;
+scales across cores on free-threaded (3.13t) Python builds
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from chord_transpose_gui_smart_format import SmartFormatter
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose_gui_smart_format import SmartFormatter
+
+from chord_alignment import align_section
+
+FormattedChart = namedtuple('FormattedChart', ['time_signature', 'text'])
+
+
+def gil_enabled():
+    """False on a free-threaded build running without the GIL"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+class ThreadedFormatter:
+    """Formats and aligns charts on a thread pool
+
+    All threads share one formatter. That is safe because the formatter only
+    holds precompiled patterns and returns everything it detects, so charts
+    in different time signatures never see each other's state. With the GIL
+    the pool mostly overlaps file I/O; without it the formatting itself runs
+    in parallel.
+    """
+
+    def __init__(self, formatter=None, workers=None, chart_wide=False):
+        self.formatter = formatter or SmartFormatter()
+        self.workers = workers or os.cpu_count() or 1
+        self.chart_wide = chart_wide
+
+    def format_one(self, content):
+        """Format one chart; returns FormattedChart(time_signature, text)"""
+        return FormattedChart(self.formatter.detect_time_signature(content),
+                              self.formatter.format_and_align(content, chart_wide=self.chart_wide))
+
+    def format_all(self, contents):
+        """Format charts concurrently; results keep the input order"""
+        contents = list(contents)
+        if self.workers == 1 or len(contents) < 2:
+            return [self.format_one(content) for content in contents]
+        with ThreadPoolExecutor(self.workers) as executor:
+            return list(executor.map(self.format_one, contents))
+
+    def format_files(self, paths, output_dir):
+        """Format chart files into output_dir; yields (path, error)"""
+        os.makedirs(output_dir, exist_ok=True)
+
+        def format_file(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    result = self.format_one(f.read().rstrip())
+                destination = os.path.join(output_dir, os.path.basename(path))
+                temp_path = destination + '.part'
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(result.text + '\n')
+                os.replace(temp_path, destination)
+                return path, None
+            except Exception as e:
+                return path, str(e)
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            yield from executor.map(format_file, paths)
+
+
+def stress_check(charts=4000, workers=8, seed=0, rounds=2):
+    """Format mixed 3/4 and 4/4 charts concurrently on one shared formatter
+
+    Every result is compared with a serial run on a private formatter and
+    with the chart's own 'Time Signature' line. Returns
+    (checked, mismatches, serial seconds, threaded seconds).
+    """
+    # The benchmark module owns the synthetic chart generator
+    from chord_benchmark import make_songbook
+
+    songbook = make_songbook(charts, seed=seed)
+    expected_beats = [int(chart.split('Time Signature = ', 1)[1].split('/', 1)[0]) for chart in songbook]
+
+    start = time.perf_counter()
+    reference = ThreadedFormatter(SmartFormatter(), workers=1).format_all(songbook)
+    serial_time = time.perf_counter() - start
+
+    shared = ThreadedFormatter(SmartFormatter(), workers=workers)
+    # Start cold, so the threads align sections instead of reading the serial run's memo
+    align_section.cache_clear()
+    switch_interval = sys.getswitchinterval()
+    # Switch threads as often as possible to shake out races under the GIL too
+    sys.setswitchinterval(1e-6)
+    try:
+        start = time.perf_counter()
+        results = [shared.format_all(songbook) for _ in range(rounds)]
+        threaded_time = (time.perf_counter() - start) / rounds
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    mismatches = 0
+    for round_results in results:
+        for result, expected, beats in zip(round_results, reference, expected_beats):
+            if result != expected or result.time_signature != (beats, 4):
+                mismatches += 1
+    return charts * rounds, mismatches, serial_time, threaded_time
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Format charts on a thread pool sharing one formatter")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    format_parser = subparsers.add_parser('format', help="format and align chart files")
+    format_parser.add_argument('files', nargs='+', help="chart text files")
+    format_parser.add_argument('-o', '--output-dir', required=True, help="directory for formatted files")
+    format_parser.add_argument('--chart-wide', action='store_true', help="align all sections on one grid")
+    format_parser.add_argument('--workers', type=int, help="threads (default: all cores)")
+
+    stress_parser = subparsers.add_parser('stress', help="check concurrent output against a serial run")
+    stress_parser.add_argument('--charts', type=int, default=4000, help="synthetic 3/4 and 4/4 charts")
+    stress_parser.add_argument('--workers', type=int, default=8, help="threads sharing the formatter")
+    stress_parser.add_argument('--rounds', type=int, default=2, help="concurrent passes over the charts")
+    stress_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'format':
+        failures = 0
+        formatter = ThreadedFormatter(workers=args.workers, chart_wide=args.chart_wide)
+        for path, error in formatter.format_files(args.files, args.output_dir):
+            if error:
+                failures += 1
+                print(f"Error: {path}: {error}", file=sys.stderr)
+        return 1 if failures else 0
+
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil_enabled() else 'disabled'}, "
+          f"{os.cpu_count()} CPUs, {args.workers} threads")
+    checked, mismatches, serial_time, threaded_time = stress_check(args.charts, args.workers, args.seed, args.rounds)
+    print(f"{checked} charts checked, {mismatches} mismatches")
+    print(f"serial {args.charts / serial_time:8.1f} charts/s, threaded {args.charts / threaded_time:8.1f} charts/s "
+          f"(x{serial_time / threaded_time:.2f})")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,9 @@ from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import sys
 import re
+import difflib
+import argparse
+import itertools
 
 # Handle imports when run from different directories
 try:
@@ -18,6 +21,15 @@ except ImportError:
     sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
     from chord_transpose import ChordTransposer, PDFExporter
 
+from chord_alignment import align_chart_lines, align_section
+from chord_classifier import LINE_CHORD, ChordLineClassifier
+from chord_scanner import TOKEN_CHORD, TOKEN_SPACE, TOKEN_TEXT, find_chord, parse_chord, scan_line, split_bars
+from chord_profiling import NullProfiler, PipelineProfiler
+
+# Precompiled, read-only tables shared by every formatter (and thread)
+TIME_SIGNATURE_PATTERN = re.compile(r'Time Signature\s*=\s*(\d+)/(\d+)', re.IGNORECASE)
+DEFAULT_TIME_SIGNATURE = (4, 4)
+
 class NumberedChordConverter:
     """Converts chord symbols to numbered notation (Nashville Number System)"""
     
@@ -45,8 +57,41 @@ class NumberedChordConverter:
             5: 'v', 6: 'vi', 7: 'vii'
         }
         
-        self.chord_pattern = r'([A-G][#b]?)([mM]?[0-9]*(?:sus|dim|aug|add)?[0-9]*)?(?:/([A-G][#b]?))?'
+        self.classifier = ChordLineClassifier()
         
+        # Numbered chords as written by convert_chord_to_number
+        self.roman_number_pattern = re.compile(
+            r'([b#]?)(VII|VI|IV|V|III|II|I|vii|vi|iv|v|iii|ii|i)([^/]*)(?:/([b#]?)(VII|VI|IV|V|III|II|I))?$'
+        )
+        self.arabic_number_pattern = re.compile(r'([b#]?)([1-7])([^/]*)(?:/([b#]?)([1-7]))?$')
+        self.roman_to_degree = {numeral: degree for degree, numeral in self.roman_numerals.items()}
+        
+        # Semitones above the tonic for each major scale degree
+        self.major_scale = {1: 0, 2: 2, 3: 4, 4: 5, 5: 7, 6: 9, 7: 11}
+        self.note_names_sharp = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+        self.note_names_flat = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B']
+        self.flat_keys = {'F', 'Bb', 'Eb', 'Ab', 'Db', 'Gb', 'Cb'}
+        
+        # Precomputed degree -> note tables for every key spelling
+        self.degree_tables = {key: self._build_degree_table(key) for key in (
+            'C', 'C#', 'Db', 'D', 'D#', 'Eb', 'E', 'F', 'F#', 'Gb',
+            'G', 'G#', 'Ab', 'A', 'A#', 'Bb', 'B', 'Cb', 'E#', 'Fb', 'B#'
+        )}
+        
+    def _build_degree_table(self, key):
+        """Map (accidental, degree) to a note name in the given key"""
+        key_pos = self._get_chromatic_position(key)
+        key_uses_flats = key in self.flat_keys
+        table = {}
+        for degree, interval in self.major_scale.items():
+            for accidental, shift in (('', 0), ('b', -1), ('#', 1)):
+                position = (key_pos + interval + shift) % 12
+                # Flattened degrees read as flats, sharpened ones as sharps
+                use_flats = accidental == 'b' or (not accidental and key_uses_flats)
+                names = self.note_names_flat if use_flats else self.note_names_sharp
+                table[(accidental, degree)] = names[position]
+        return table
+    
     def get_scale_degree(self, note, key):
         """Get the scale degree of a note relative to the key"""
         # Get chromatic positions
@@ -100,13 +145,19 @@ class NumberedChordConverter:
             return chord
             
         # Parse the chord
-        match = re.match(self.chord_pattern, chord)
-        if not match:
+        parsed = parse_chord(chord)
+        if parsed:
+            return self._number_chord(parsed, key, use_roman)
+        # A chord wrapped in punctuation keeps its wrapping: '(G)' -> '(V)'
+        wrapped = find_chord(chord)
+        if not wrapped:
             return chord
-            
-        root = match.group(1)
-        quality = match.group(2) or ''
-        bass = match.group(3)
+        prefix, parsed, suffix = wrapped
+        return prefix + self._number_chord(parsed, key, use_roman) + suffix
+    
+    def _number_chord(self, chord, key, use_roman):
+        """Numbered notation for a scanned Chord"""
+        root, quality, bass, annotation = chord
         
         # Get scale degree of root
         degree, accidental = self.get_scale_degree(root, key)
@@ -132,8 +183,8 @@ class NumberedChordConverter:
             number = str(degree)
             if accidental:
                 number = accidental + number
-            # For arabic, explicitly show minor
-            if is_minor and quality not in ['m7', 'm9', 'm11', 'm13']:
+            # For arabic, explicitly show minor unless a minor extension (m7b5, m9, ...) already does
+            if is_minor and not quality.startswith(('m7', 'm9', 'm11', 'm13')):
                 number += 'm'
         
         # Handle quality suffixes
@@ -144,10 +195,6 @@ class NumberedChordConverter:
             elif not use_roman and quality == 'm':
                 # Already added 'm' above
                 quality = ''
-            
-            # Fix for maj7 appearing as 'i' instead of 'I'
-            if quality.startswith('aj7'):
-                quality = 'maj7'
                 
             number += quality
         
@@ -165,27 +212,86 @@ class NumberedChordConverter:
             
             number += '/' + bass_number
         
-        return number
+        return number + annotation
     
     def convert_line_to_numbers(self, line, key, use_roman=True):
         """Convert all chords in a line to numbered notation"""
         if not self.is_chord_line(line):
             return line
             
-        # Replace each chord with its numbered equivalent
-        def replace_chord(match):
-            chord = match.group(0)
-            return self.convert_chord_to_number(chord, key, use_roman)
+        # One scan of the line; only chords change, bars, beats and spacing stay
+        return ''.join(self._number_chord(chord, key, use_roman) if kind == TOKEN_CHORD
+                       else self.convert_chord_to_number(text, key, use_roman) if kind == TOKEN_TEXT
+                       else text
+                       for kind, text, chord in scan_line(line))
+    
+    def convert_number_to_chord(self, number, key):
+        """Convert a Roman or Arabic numbered chord back to a chord symbol"""
+        if not number or not key:
+            return number
+        
+        table = self.degree_tables.get(key) or self._build_degree_table(key)
+        
+        match = self.roman_number_pattern.match(number)
+        if match:
+            accidental, numeral, quality, bass_accidental, bass_numeral = match.groups()
+            degree = self.roman_to_degree[numeral.upper()]
+            # Lowercase numerals are minor chords
+            if numeral.islower():
+                quality = 'm' + quality
+            bass_degree = self.roman_to_degree[bass_numeral] if bass_numeral else None
+        else:
+            match = self.arabic_number_pattern.match(number)
+            if not match:
+                return number
+            accidental, degree, quality, bass_accidental, bass_degree = match.groups()
+            degree = int(degree)
+            bass_degree = int(bass_degree) if bass_degree else None
+            # Arabic numbers write the minor 'm' explicitly, sometimes twice (2mm6)
+            if quality.startswith('mm'):
+                quality = quality[1:]
+        
+        chord = table[(accidental, degree)] + quality
+        if bass_degree:
+            chord += '/' + table[(bass_accidental, bass_degree)]
+        return chord
+    
+    def is_numbered_line(self, line):
+        """Check if a line contains a numbered chord progression"""
+        if '|' not in line:
+            return False
+        symbol_ratio = (line.count('|') + line.count('.') + line.count('-')) / max(len(line), 1)
+        if symbol_ratio <= 0.1:
+            return False
+        return any(self.roman_number_pattern.match(token) or self.arabic_number_pattern.match(token)
+                   for token in line.replace('|', ' ').split())
+    
+    def convert_line_from_numbers(self, line, key):
+        """Convert all numbered chords in a line back to chord symbols"""
+        if not self.is_numbered_line(line):
+            return line
         
-        return re.sub(self.chord_pattern + r'(?![#b])', replace_chord, line)
+        # Keep bars and spacing, only numbered tokens change
+        parts = re.split(r'(\s+|\|)', line)
+        return ''.join(self.convert_number_to_chord(part, key) if part and part != '|' and not part.isspace()
+                       else part for part in parts)
+    
+    def convert_chart_from_numbers(self, content, key=None):
+        """Render a numbered chart in the given key (defaults to its 'Do = X' key)"""
+        key_match = re.search(r'Do\s*=\s*([A-G][#b]?)', content)
+        if not key:
+            if not key_match:
+                return content  # No key to render into
+            key = key_match.group(1)
+        elif key_match:
+            content = re.sub(r'Do\s*=\s*[A-G][#b]?', 'Do = ' + key, content)
+        
+        return '\n'.join(self.convert_line_from_numbers(line, key) for line in content.split('\n'))
     
     def is_chord_line(self, line):
         """Check if a line contains chord progressions"""
-        # Similar to SmartFormatter's method
-        has_bars = '|' in line
-        has_chords = bool(re.search(self.chord_pattern, line))
-        symbol_ratio = sum(1 for c in line if c in '|.-') / max(len(line), 1)
-        return has_bars and has_chords and symbol_ratio > 0.1
+        # Same test as SmartFormatter's method
+        return self.classifier.is_chord_line(line)
     
     def convert_chart_to_numbers(self, content, use_roman=True):
         """Convert entire chart to numbered notation"""
@@ -209,34 +315,28 @@ class NumberedChordConverter:
         return '\n'.join(converted_lines)
 
 class SmartFormatter:
-    """Handles smart formatting of chord charts"""
+    """Handles smart formatting of chord charts
+    
+    The formatter keeps no per-chart state: everything detected from a chart
+    is returned to the caller, and the instance only holds precompiled
+    patterns. One formatter can be shared by the GUI panes and by threads.
+    """
     
     def __init__(self):
         self.bar_pattern = r'\|'
-        self.chord_pattern = r'([A-G][#b]?)([mM]?[0-9]*(?:sus|dim|aug|add)?[0-9]*)?(?:/([A-G][#b]?))?'
-        self.time_signature = None  # Will be detected from content
+        self.classifier = ChordLineClassifier()
         
     def format_chart(self, content):
         """Format the entire chart with proper alignment"""
-        # First, detect time signature from content
-        self.detect_time_signature(content)
-        
         lines = content.split('\n')
         formatted_lines = []
         
-        # First pass: identify chord lines and measure maximum bar positions
-        chord_lines = []
-        max_bars = 0
-        
-        for i, line in enumerate(lines):
-            if self.is_chord_line(line):
-                bars = line.count('|')
-                max_bars = max(max_bars, bars)
-                chord_lines.append(i)
+        # First pass: classify every line at once
+        line_kinds = self.classifier.classify_lines(lines)
         
         # Second pass: format each line
         for i, line in enumerate(lines):
-            if i in chord_lines:
+            if line_kinds[i] == LINE_CHORD:
                 formatted_line = self.format_chord_line(line)
                 formatted_lines.append(formatted_line)
             else:
@@ -245,62 +345,29 @@ class SmartFormatter:
         return '\n'.join(formatted_lines)
     
     def detect_time_signature(self, content):
-        """Detect time signature from the content"""
+        """Detect time signature from the content; returns (numerator, denominator)"""
         # Look for explicit time signature declaration
-        time_sig_match = re.search(r'Time Signature\s*=\s*(\d+)/(\d+)', content, re.IGNORECASE)
+        time_sig_match = TIME_SIGNATURE_PATTERN.search(content)
         
         if time_sig_match:
-            numerator = int(time_sig_match.group(1))
-            denominator = int(time_sig_match.group(2))
-            self.time_signature = (numerator, denominator)
-        else:
-            # Default to 4/4 if not specified
-            self.time_signature = (4, 4)
+            return int(time_sig_match.group(1)), int(time_sig_match.group(2))
+        # Default to 4/4 if not specified
+        return DEFAULT_TIME_SIGNATURE
     
     def is_chord_line(self, line):
         """Check if a line contains chord progressions"""
-        # A chord line typically has bars and chords
-        has_bars = '|' in line
-        has_chords = bool(re.search(self.chord_pattern, line))
-        
-        # Check if it's not a lyric line (usually chord lines have more symbols)
-        symbol_ratio = sum(1 for c in line if c in '|.-') / max(len(line), 1)
-        
-        return has_bars and has_chords and symbol_ratio > 0.1
+        # A chord line has bars, chords and (unlike lyrics) plenty of bar/beat symbols
+        return self.classifier.is_chord_line(line)
     
     def format_chord_line(self, line):
         """Format a single chord line with proper spacing"""
         if not line.strip():
             return line
         
-        # Split by bars while keeping the bars
-        parts = re.split(r'(\|)', line)
-        
-        # Process each bar section
-        formatted_parts = []
-        current_bar_content = []
-        
-        for part in parts:
-            if part == '|':
-                # Process the accumulated bar content
-                if current_bar_content:
-                    formatted_bar = self.format_bar_content(''.join(current_bar_content))
-                    formatted_parts.append(formatted_bar)
-                    current_bar_content = []
-                formatted_parts.append('|')
-            else:
-                current_bar_content.append(part)
-        
-        # Don't forget the last part if it exists
-        if current_bar_content:
-            formatted_bar = self.format_bar_content(''.join(current_bar_content))
-            formatted_parts.append(formatted_bar)
-        
-        # Join and clean up
-        result = ''.join(formatted_parts)
+        # One scan splits the line into bars of words; each bar's words are joined by single spaces
+        parts = [' '.join(words) for words in split_bars(line)]
         
         # Ensure consistent spacing between bars but not after opening
-        parts = result.split('|')
         cleaned_parts = []
         
         for i, part in enumerate(parts):
@@ -330,148 +397,81 @@ class SmartFormatter:
         if not content:
             return ''  # Return empty string for empty bar
         
-        # Split the content into tokens (chords and dots)
-        tokens = content.split()
-        if not tokens:
-            return content
-        
-        # Process each token
-        formatted_tokens = []
-        for token in tokens:
-            # Keep dots as-is
-            if token == '.':
-                formatted_tokens.append(token)
-            # Check if it's a chord
-            elif re.match(self.chord_pattern + r'$', token):
-                formatted_tokens.append(token)
-            else:
-                # Unknown token, keep as-is
-                formatted_tokens.append(token)
-        
-        # Join tokens with single spaces
-        return ' '.join(formatted_tokens)
+        # Chords, dots and unknown tokens are all kept; join them with single spaces
+        return ' '.join(text for kind, text, _ in scan_line(content) if kind != TOKEN_SPACE)
     
     def align_bars_in_section(self, lines):
         """Align bars across multiple lines in a section"""
         if not lines:
             return lines
         
-        # Process lines for alignment
-        
-        # Parse each line into bars
-        parsed_lines = []
-        for line in lines:
-            # Remove leading/trailing whitespace but keep internal structure
-            line = line.strip()
-            bars = []
-            
-            if line.startswith('|') and line.endswith('|'):
-                # Split by | and filter out empty parts
-                parts = line.split('|')
-                # Skip first empty part and last empty part
-                for i in range(1, len(parts) - 1):
-                    if parts[i] or parts[i] == ' ':  # Keep even single space bars
-                        bars.append(parts[i].strip())
-            else:
-                # Handle malformed lines
-                bars = [line]
-            
-            # Continue to next line
-            parsed_lines.append(bars)
-        
-        # Find the maximum number of bars
-        max_bars = max(len(bars) for bars in parsed_lines) if parsed_lines else 0
-        # Process bar tokens
-        
-        # Parse each bar into tokens for beat alignment
-        parsed_bar_tokens = []
-        for bars in parsed_lines:
-            line_bar_tokens = []
-            for bar in bars:
-                if bar:
-                    tokens = bar.split()
-                    line_bar_tokens.append(tokens)
-                else:
-                    line_bar_tokens.append([])
-            parsed_bar_tokens.append(line_bar_tokens)
-        
-        # For each bar position, find max tokens and token widths
-        bar_token_info = []
-        bar_total_widths = []  # Track total width needed for each bar position
-        
-        for bar_idx in range(max_bars):
-            # Find max number of tokens in this bar position
-            max_tokens = 0
-            for line_tokens in parsed_bar_tokens:
-                if bar_idx < len(line_tokens):
-                    max_tokens = max(max_tokens, len(line_tokens[bar_idx]))
-            
-            # Find max width for each token position in this bar
-            token_widths = []
-            for token_idx in range(max_tokens):
-                max_width = 0
-                for line_tokens in parsed_bar_tokens:
-                    if bar_idx < len(line_tokens) and token_idx < len(line_tokens[bar_idx]):
-                        token = line_tokens[bar_idx][token_idx]
-                        max_width = max(max_width, len(token))
-                token_widths.append(max_width)
-            
-            # Calculate total width needed for this bar (sum of token widths + spaces)
-            total_width = sum(token_widths) + max(0, len(token_widths) - 1)  # tokens + spaces between
-            bar_total_widths.append(total_width)
-            
-            bar_token_info.append((max_tokens, token_widths))
-        
-        # Reconstruct lines with aligned bars and beats
-        aligned_lines = []
-        for line_idx, line_tokens in enumerate(parsed_bar_tokens):
-            line_parts = ['|']  # Start with opening bar
-            
-            # Process all bars up to max_bars to ensure alignment
-            for bar_idx in range(max_bars):
-                if bar_idx < len(line_tokens):
-                    bar_tokens = line_tokens[bar_idx]
-                    
-                    if bar_idx < len(bar_token_info):
-                        max_tokens, token_widths = bar_token_info[bar_idx]
-                        total_width = bar_total_widths[bar_idx]
-                        
-                        # Align tokens within this bar
-                        aligned_tokens = []
-                        for token_idx, token in enumerate(bar_tokens):
-                            if token_idx < len(token_widths):
-                                aligned_tokens.append(token.ljust(token_widths[token_idx]))
-                            else:
-                                aligned_tokens.append(token)
-                        
-                        # Pad with spaces if this bar has fewer tokens
-                        while len(aligned_tokens) < max_tokens:
-                            if len(aligned_tokens) < len(token_widths):
-                                aligned_tokens.append(' ' * token_widths[len(aligned_tokens)])
-                            else:
-                                aligned_tokens.append(' ')
-                        
-                        # Join tokens and pad to total width
-                        bar_content = ' '.join(aligned_tokens)
-                        bar_content = bar_content.ljust(total_width)
-                    else:
-                        # Fallback: just join tokens
-                        bar_content = ' '.join(bar_tokens)
-                else:
-                    # This line has fewer bars - skip this position
-                    break
-                
-                line_parts.append(bar_content + ' |')
-            
-            aligned_line = ''.join(line_parts)
-            aligned_lines.append(aligned_line)
-        
-        # Return aligned lines
+        # Parse each line into bars of tokens and measure all columns in one pass;
+        # a section seen before (a repeated chorus) comes from the memo
+        return list(align_section(tuple(lines)))
+    
+    def align_chart(self, lines, chart_wide=False):
+        """Align every chord-line section of a chart
         
-        return aligned_lines
+        With chart_wide=True all sections share one column grid.
+        """
+        return align_chart_lines(lines, self.is_chord_line, chart_wide=chart_wide)
+    
+    def format_and_align(self, content, chart_wide=False):
+        """Format the chart and align its chord-line sections"""
+        formatted = self.format_chart(content)
+        return '\n'.join(self.align_chart(formatted.split('\n'), chart_wide=chart_wide))
+
+class TextWidgetPatcher:
+    """Updates Tk Text widgets with minimal line-level edits"""
+    
+    @staticmethod
+    def split_lines(text):
+        """Split text into lines that keep their trailing newline"""
+        lines = [line + '\n' for line in text.split('\n')]
+        # The last piece never had a newline after it
+        lines[-1] = lines[-1][:-1]
+        if not lines[-1]:
+            lines.pop()
+        return lines
+    
+    def diff_lines(self, old_lines, new_lines):
+        """Return (old_start, old_end, new_start, new_end) for every changed line range"""
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        return [(i1, i2, j1, j2) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+    
+    def set_text(self, widget, new_text):
+        """Patch the widget so it holds new_text; returns False when nothing changed"""
+        old_text = widget.get('1.0', 'end-1c')
+        if old_text == new_text:
+            return False
+        
+        old_lines = self.split_lines(old_text)
+        new_lines = self.split_lines(new_text)
+        changes = self.diff_lines(old_lines, new_lines)
+        
+        # Group all edits into a single undo step
+        autoseparators = widget.cget('autoseparators')
+        widget.config(autoseparators=False)
+        widget.edit_separator()
+        try:
+            # Apply from the bottom up so earlier line numbers stay valid
+            for old_start, old_end, new_start, new_end in reversed(changes):
+                index = f'{old_start + 1}.0'
+                if old_end > old_start:
+                    widget.delete(index, f'{old_end + 1}.0')
+                if new_end > new_start:
+                    widget.insert(index, ''.join(new_lines[new_start:new_end]))
+        finally:
+            widget.edit_separator()
+            widget.config(autoseparators=autoseparators)
+        return True
 
 class ChordTransposerGUI:
-    def __init__(self, root):
+    # Operations timed as one entry each when profiling
+    PROFILED_OPERATIONS = ('smart_format', 'format_original', 'format_transposed', 'align_all_sections',
+                           'transpose_chart', 'convert_to_numbers', 'convert_from_numbers', 'export_pdf')
+    
+    def __init__(self, root, profile_dir=None):
         self.root = root
         self.root.title("Chord Chart Transposer - Smart Format")
         self.root.geometry("1000x700")
@@ -480,8 +480,20 @@ class ChordTransposerGUI:
         self.transposer = ChordTransposer()
         self.formatter = SmartFormatter()
         self.number_converter = NumberedChordConverter()
+        self.text_patcher = TextWidgetPatcher()
         self.current_key = None
         
+        # Align every section of a chart on one shared column grid
+        self.chart_wide_var = tk.BooleanVar(value=False)
+        
+        # Created and instrumented on the first PDF export
+        self.pdf_exporter = None
+        
+        # Optional profiling (must wrap operations before widgets bind to them)
+        self.profiler = NullProfiler()
+        if profile_dir:
+            self.enable_profiling(profile_dir)
+        
         # Create menu bar
         self.create_menu()
         
@@ -553,7 +565,7 @@ class ChordTransposerGUI:
         original_frame = ttk.LabelFrame(main_frame, text="Original", padding="5")
         original_frame.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
         
-        self.original_text = scrolledtext.ScrolledText(original_frame, width=40, height=25, wrap=tk.NONE, font=('Courier', 10))
+        self.original_text = scrolledtext.ScrolledText(original_frame, width=40, height=25, wrap=tk.NONE, font=('Courier', 10), undo=True)
         self.original_text.pack(fill=tk.BOTH, expand=True)
         
         # Add horizontal scrollbar to original text
@@ -565,7 +577,7 @@ class ChordTransposerGUI:
         transposed_frame = ttk.LabelFrame(main_frame, text="Transposed", padding="5")
         transposed_frame.grid(row=2, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5, pady=5)
         
-        self.transposed_text = scrolledtext.ScrolledText(transposed_frame, width=40, height=25, wrap=tk.NONE, font=('Courier', 10))
+        self.transposed_text = scrolledtext.ScrolledText(transposed_frame, width=40, height=25, wrap=tk.NONE, font=('Courier', 10), undo=True)
         self.transposed_text.pack(fill=tk.BOTH, expand=True)
         
         # Add horizontal scrollbar to transposed text
@@ -622,6 +634,7 @@ class ChordTransposerGUI:
         
         tools_menu.add_command(label="Detect Key", command=self.detect_key)
         tools_menu.add_command(label="Align All Sections", command=self.align_all_sections)
+        tools_menu.add_checkbutton(label="Chart-wide Grid", variable=self.chart_wide_var)
         tools_menu.add_separator()
         
         # Number system submenu
@@ -642,62 +655,41 @@ class ChordTransposerGUI:
         self.root.bind('<Control-s>', lambda e: self.save_file())
         self.root.bind('<Control-f>', lambda e: self.smart_format())
     
+    def enable_profiling(self, profile_dir):
+        """Time engine hot spots and GUI operations for the rest of the session"""
+        self.profiler = PipelineProfiler(profile_dir)
+        for engine in (self.transposer, self.formatter, self.number_converter):
+            self.profiler.instrument(engine)
+        
+        counter = itertools.count(1)
+        for name in self.PROFILED_OPERATIONS:
+            setattr(self, name, self._profiled_operation(getattr(self, name), name, counter))
+        self.profiler.start()
+    
+    def _profiled_operation(self, operation, name, counter):
+        def run(*args, **kwargs):
+            with self.profiler.chart(f"{name} #{next(counter)}"):
+                return operation(*args, **kwargs)
+        return run
+    
+    def write_profile(self):
+        """Write the profiling report, if profiling is on"""
+        if not self.profiler.enabled:
+            return None
+        self.profiler.stop()
+        return self.profiler.write_report()
+    
+    def set_text(self, widget, content):
+        """Replace widget content using minimal line edits (one undo step)"""
+        self.text_patcher.set_text(widget, content)
+    
     def format_and_align_content(self, content):
         """Format and align content - used by smart format button and save dialog"""
         if not content:
             return content
         
-        # Detect time signature
-        self.formatter.detect_time_signature(content)
-        
-        # Format the chart
-        formatted = self.formatter.format_chart(content)
-        lines = formatted.split('\n')
-        
-        print("DEBUG: After format_chart:")
-        for i, line in enumerate(lines):
-            if self.formatter.is_chord_line(line):
-                print(f"  Line {i}: {repr(line)}")
-        
-        # Group consecutive chord lines and align them within sections
-        sections = []
-        current_section = []
-        
-        for line in lines:
-            if self.formatter.is_chord_line(line):
-                current_section.append(line)
-            else:
-                if current_section:
-                    print(f"\nDEBUG: Aligning section with {len(current_section)} lines:")
-                    for l in current_section:
-                        print(f"  Before: {repr(l)}")
-                    
-                    # Align this section
-                    aligned = self.formatter.align_bars_in_section(current_section)
-                    
-                    print("  After alignment:")
-                    for l in aligned:
-                        print(f"  After:  {repr(l)}")
-                    
-                    sections.extend(aligned)
-                    current_section = []
-                sections.append(line)
-        
-        # Don't forget the last section
-        if current_section:
-            print(f"\nDEBUG: Aligning final section with {len(current_section)} lines:")
-            for l in current_section:
-                print(f"  Before: {repr(l)}")
-            
-            aligned = self.formatter.align_bars_in_section(current_section)
-            
-            print("  After alignment:")
-            for l in aligned:
-                print(f"  After:  {repr(l)}")
-            
-            sections.extend(aligned)
-        
-        return '\n'.join(sections)
+        # Format the chart and align chord-line sections (optionally on one chart-wide grid)
+        return self.formatter.format_and_align(content, chart_wide=self.chart_wide_var.get())
         
     def smart_format(self):
         """Apply smart formatting to both text areas - includes alignment"""
@@ -731,22 +723,14 @@ class ChordTransposerGUI:
                 if not response:
                     return
             
-            # Store cursor position
-            cursor_pos = self.original_text.index("insert")
-            self.original_text.delete('1.0', tk.END)
-            self.original_text.insert('1.0', formatted_content)
-            # Try to restore cursor position
-            try:
-                self.original_text.mark_set("insert", cursor_pos)
-            except:
-                pass
+            # Only changed lines are rewritten, so cursor and scroll position survive
+            self.set_text(self.original_text, formatted_content)
         
         # Format and align transposed text if it exists
         transposed_content = self.transposed_text.get('1.0', tk.END).rstrip()
         if transposed_content:
             formatted_content = self.format_and_align_content(transposed_content)
-            self.transposed_text.delete('1.0', tk.END)
-            self.transposed_text.insert('1.0', formatted_content)
+            self.set_text(self.transposed_text, formatted_content)
         
         self.status_var.set("Smart formatting and alignment applied!")
     
@@ -755,8 +739,7 @@ class ChordTransposerGUI:
         content = self.original_text.get('1.0', tk.END).rstrip()
         if content:
             formatted = self.formatter.format_chart(content)
-            self.original_text.delete('1.0', tk.END)
-            self.original_text.insert('1.0', formatted)
+            self.set_text(self.original_text, formatted)
             self.status_var.set("Original text formatted")
     
     def format_transposed(self):
@@ -764,72 +747,33 @@ class ChordTransposerGUI:
         content = self.transposed_text.get('1.0', tk.END).rstrip()
         if content:
             formatted = self.formatter.format_chart(content)
-            self.transposed_text.delete('1.0', tk.END)
-            self.transposed_text.insert('1.0', formatted)
+            self.set_text(self.transposed_text, formatted)
             self.status_var.set("Transposed text formatted")
     
     def align_all_sections(self):
         """Align bars across all sections"""
-        # First detect time signature
+        chart_wide = self.chart_wide_var.get()
+        
         content = self.original_text.get('1.0', tk.END).rstrip()
-        self.formatter.detect_time_signature(content)
         
         # Work on original text
         if content:
-            lines = content.split('\n')
-            
-            # Group consecutive chord lines
-            sections = []
-            current_section = []
-            
-            for line in lines:
-                if self.formatter.is_chord_line(line):
-                    current_section.append(line)
-                else:
-                    if current_section:
-                        # Align this section
-                        aligned = self.formatter.align_bars_in_section(current_section)
-                        sections.extend(aligned)
-                        current_section = []
-                    sections.append(line)
-            
-            # Don't forget the last section
-            if current_section:
-                aligned = self.formatter.align_bars_in_section(current_section)
-                sections.extend(aligned)
+            aligned = self.formatter.align_chart(content.split('\n'), chart_wide=chart_wide)
             
             # Update the text
-            self.original_text.delete('1.0', tk.END)
-            self.original_text.insert('1.0', '\n'.join(sections))
+            self.set_text(self.original_text, '\n'.join(aligned))
         
         # Also align transposed text if it exists
         transposed_content = self.transposed_text.get('1.0', tk.END).rstrip()
         if transposed_content:
-            # Detect time signature from transposed content
-            self.formatter.detect_time_signature(transposed_content)
-            
-            lines = transposed_content.split('\n')
-            sections = []
-            current_section = []
+            aligned = self.formatter.align_chart(transposed_content.split('\n'), chart_wide=chart_wide)
             
-            for line in lines:
-                if self.formatter.is_chord_line(line):
-                    current_section.append(line)
-                else:
-                    if current_section:
-                        aligned = self.formatter.align_bars_in_section(current_section)
-                        sections.extend(aligned)
-                        current_section = []
-                    sections.append(line)
-            
-            if current_section:
-                aligned = self.formatter.align_bars_in_section(current_section)
-                sections.extend(aligned)
-            
-            self.transposed_text.delete('1.0', tk.END)
-            self.transposed_text.insert('1.0', '\n'.join(sections))
+            self.set_text(self.transposed_text, '\n'.join(aligned))
         
-        self.status_var.set("All sections aligned - bars now line up vertically!")
+        if chart_wide:
+            self.status_var.set("All sections aligned on one chart-wide grid!")
+        else:
+            self.status_var.set("All sections aligned - bars now line up vertically!")
     
     def open_file(self):
         """Open a chord chart file"""
@@ -843,8 +787,7 @@ class ChordTransposerGUI:
                 with open(filename, 'r', encoding='utf-8') as f:
                     content = f.read()
                 
-                self.original_text.delete('1.0', tk.END)
-                self.original_text.insert('1.0', content)
+                self.set_text(self.original_text, content)
                 
                 self.filename_label.config(text=os.path.basename(filename))
                 self.detect_key()
@@ -949,8 +892,9 @@ class ChordTransposerGUI:
                 if apply_formatting:
                     content = self.format_and_align_content(content)
                 
-                pdf_exporter = PDFExporter()
-                pdf_exporter.export_to_pdf(content, filename, landscape_mode=landscape)
+                if self.pdf_exporter is None:
+                    self.pdf_exporter = self.profiler.instrument(PDFExporter())
+                self.pdf_exporter.export_to_pdf(content, filename, landscape_mode=landscape)
                 
                 self.status_var.set(f"Exported PDF: {os.path.basename(filename)}")
                 format_msg = "with smart formatting" if apply_formatting else "without formatting"
@@ -991,8 +935,7 @@ class ChordTransposerGUI:
             content = self.original_text.get('1.0', tk.END).rstrip()
             transposed = self.transposer.transpose_chart(content, self.current_key, target_key)
             
-            self.transposed_text.delete('1.0', tk.END)
-            self.transposed_text.insert('1.0', transposed)
+            self.set_text(self.transposed_text, transposed)
             
             self.status_var.set(f"Transposed from {self.current_key} to {target_key}")
             
@@ -1116,8 +1059,7 @@ Replace bracketed items with actual values.
 Each bar is separated by | symbols.
 Use dots (.) to represent beats."""
         
-        self.original_text.delete('1.0', tk.END)
-        self.original_text.insert('1.0', template)
+        self.set_text(self.original_text, template)
         self.status_var.set("Template loaded")
     
     def load_template_3_4(self):
@@ -1144,8 +1086,7 @@ Chorus :
 3 beats per measure: | C . . |
 Example: | G . . | D . . | Em . . | C . . |"""
         
-        self.original_text.delete('1.0', tk.END)
-        self.original_text.insert('1.0', template)
+        self.set_text(self.original_text, template)
         self.status_var.set("3/4 Time Template loaded")
     
     def load_template_4_4(self):
@@ -1172,8 +1113,7 @@ Chorus :
 4 beats per measure: | C . . . |
 Example: | G . . . | D . . . | Em . . . | C . . . |"""
         
-        self.original_text.delete('1.0', tk.END)
-        self.original_text.insert('1.0', template)
+        self.set_text(self.original_text, template)
         self.status_var.set("4/4 Time Template loaded")
     
     def on_text_change(self, event=None):
@@ -1231,6 +1171,7 @@ Features:
 • **Format Original**: Formats only the original text
 • **Format Transposed**: Formats only the transposed text
 • **Align All Sections**: Aligns bars across multiple lines
+• **Chart-wide Grid**: Uses one column grid for every section
 
 Tips:
 • Use Ctrl+F for quick smart formatting
@@ -1266,8 +1207,7 @@ The formatter recognizes chord lines by:
             converted = self.number_converter.convert_chart_to_numbers(content, use_roman)
             
             # Display in transposed text area
-            self.transposed_text.delete('1.0', tk.END)
-            self.transposed_text.insert('1.0', converted)
+            self.set_text(self.transposed_text, converted)
             
             style_name = "Roman numerals" if use_roman else "Arabic numbers"
             self.status_var.set(f"Converted to {style_name}")
@@ -1277,7 +1217,27 @@ The formatter recognizes chord lines by:
     
     def convert_from_numbers(self):
         """Convert numbered notation back to chord symbols"""
-        messagebox.showinfo("Info", "Converting from numbers back to chords requires knowing the original key.\nPlease use the transpose function with the desired target key.")
+        content = self.transposed_text.get('1.0', tk.END).rstrip()
+        if not content:
+            messagebox.showwarning("Warning", "No numbered content to convert")
+            return
+        
+        # Render in the selected target key, falling back to the chart's own key
+        key = self.target_key_var.get() or self.current_key
+        if not key:
+            self.detect_key()
+            key = self.current_key
+            if not key:
+                messagebox.showwarning("Warning", "No key detected. Please select a target key or ensure your chart has 'Do = X'")
+                return
+        
+        try:
+            converted = self.number_converter.convert_chart_from_numbers(content, key)
+            self.set_text(self.transposed_text, converted)
+            self.status_var.set(f"Converted numbers to chords in {key}")
+            
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not convert from numbers: {str(e)}")
     
     def convert_to_numbers_style(self, style):
         """Convert to numbers with specific style from menu"""
@@ -1318,9 +1278,18 @@ Number System:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Chord Chart Transposer GUI")
+    parser.add_argument('--profile', metavar='DIR',
+                        help="profile the session and write a report and a .pstats file into DIR on exit")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = ChordTransposerGUI(root)
+    app = ChordTransposerGUI(root, profile_dir=args.profile)
     root.mainloop()
+    
+    paths = app.write_profile()
+    if paths:
+        print(f"Profile written to {paths[0]} ({paths[1]})")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Chord transposition lookup table
+Process-wide, lazily filled and bounded memo of transposed chord symbols
+"""
+
+import os
+import re
+import sys
+import threading
+
+try:
+    from chord_transpose import ChordTransposer
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_transpose import ChordTransposer
+
+from chord_metrics import REGISTRY
+
+# Full chord token grammar (same as CHORD_TOKEN_STRICT in lib/chords.ts)
+CHORD_TOKEN_PATTERN = re.compile(
+    r'([A-G][#b]?)((?:maj|dim|aug|sus|add|o|\+|[mM]|[#b]?[0-9]+)*)(?:/([A-G][#b]?))?(\([^)]+\))?$'
+)
+
+
+class TranspositionTable:
+    """Maps (chord_symbol, semitones, prefer_flats) to the transposed symbol
+
+    Charts use a tiny chord vocabulary, so after warm-up transposing a token
+    is a single dict lookup. Tokens that are not chords ('.', '%', ...) are
+    cached as themselves. When the table is full the oldest entry is evicted.
+    Hit/miss counters are best-effort under concurrent use.
+    """
+
+    def __init__(self, transposer=None, max_entries=65536):
+        self.transposer = transposer or ChordTransposer()
+        self.max_entries = max_entries
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def transpose(self, symbol, semitones, prefer_flats):
+        """Transpose one chord symbol by a number of semitones"""
+        key = (symbol, semitones % 12, prefer_flats)
+        result = self.entries.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        result = self._transpose_symbol(symbol, semitones % 12, prefer_flats)
+        with self._lock:
+            if len(self.entries) >= self.max_entries:
+                # Dicts keep insertion order, so the first key is the oldest
+                del self.entries[next(iter(self.entries))]
+                self.evictions += 1
+            self.entries[key] = result
+            self.misses += 1
+        return result
+
+    def transpose_between(self, symbol, from_key, to_key):
+        """Transpose one chord symbol from one key to another"""
+        semitones, prefer_flats = self.interval(from_key, to_key)
+        return self.transpose(symbol, semitones, prefer_flats)
+
+    def interval(self, from_key, to_key):
+        """Return (semitones, prefer_flats) for a key change"""
+        semitones = (self.transposer.get_note_index(to_key) - self.transposer.get_note_index(from_key)) % 12
+        return semitones, self.transposer.should_use_flats(to_key)
+
+    def _transpose_symbol(self, symbol, semitones, prefer_flats):
+        match = CHORD_TOKEN_PATTERN.match(symbol)
+        if not match:
+            return symbol
+
+        root, quality, bass, annotation = match.groups()
+        notes = self.transposer.NOTES_FLAT if prefer_flats else self.transposer.NOTES_SHARP
+
+        result = notes[(self.transposer.get_note_index(root) + semitones) % 12] + quality
+        if bass:
+            result += '/' + notes[(self.transposer.get_note_index(bass) + semitones) % 12]
+        return result + (annotation or '')
+
+    def stats(self):
+        """Current size and hit-rate statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Drop all entries and reset the statistics"""
+        with self._lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+_shared_table = None
+_shared_table_lock = threading.Lock()
+
+
+def get_shared_table():
+    """Return the process-wide transposition table, creating it on first use"""
+    global _shared_table
+    if _shared_table is None:
+        with _shared_table_lock:
+            if _shared_table is None:
+                _shared_table = TranspositionTable()
+    return _shared_table
+
+
+def _shared_table_stats():
+    table = _shared_table
+    return (table.hits, table.misses) if table else (0, 0)
+
+
+REGISTRY.register_cache('transposition', _shared_table_stats)
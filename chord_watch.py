@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Watch mode for chord chart folders
+Rebuilds transposed/formatted text and PDF outputs only for charts that changed
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+try:
+    from chord_cli import ChartProcessor
+except ImportError:
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from chord_cli import ChartProcessor
+
+from chord_metrics import REGISTRY
+from chord_setlist import load_setlist
+
+MANIFEST_NAME = '.chord_watch_manifest.json'
+
+
+class ChartWatcher:
+    """Polls a charts directory and incrementally rebuilds outputs
+
+    A manifest in the output directory records, per chart, a hash of its
+    content plus build options (target key, PDF settings) and the files it
+    produced, so restarts only rebuild what actually changed.
+    """
+
+    def __init__(self, charts_dir, output_dir, setlist_path=None, pdf=False, landscape=False,
+                 chart_wide=False, debounce=0.3, interval=0.2, processor=None, log=print, metrics_file=None):
+        self.charts_dir = os.path.abspath(charts_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.setlist_path = os.path.abspath(setlist_path) if setlist_path else None
+        self.pdf = pdf
+        self.landscape = landscape
+        self.chart_wide = chart_wide
+        self.debounce = debounce
+        self.interval = interval
+        self.processor = processor or ChartProcessor()
+        self.log = log
+        self.metrics_file = os.path.abspath(metrics_file) if metrics_file else None
+
+        self.manifest_path = os.path.join(self.output_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+        self.stats = {}      # path -> (mtime_ns, size) at the last scan
+        self.pending = {}    # path -> time of the last observed change
+        self.target_keys = {}
+        self.setlist_stat = None
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def list_charts(self):
+        """All .txt charts under the charts directory (outputs excluded)"""
+        charts = []
+        for directory, subdirs, files in os.walk(self.charts_dir):
+            subdirs[:] = [d for d in subdirs if os.path.join(directory, d) != self.output_dir]
+            for name in files:
+                path = os.path.join(directory, name)
+                if name.endswith('.txt') and path != self.setlist_path:
+                    charts.append(path)
+        return charts
+
+    def _reload_setlist(self, now):
+        """Re-read the set list when it changes; charts whose key changed become pending"""
+        if not self.setlist_path:
+            return
+        try:
+            stat = os.stat(self.setlist_path)
+        except OSError:
+            stat = None
+        signature = (stat.st_mtime_ns, stat.st_size) if stat else None
+        if signature == self.setlist_stat:
+            return
+        self.setlist_stat = signature
+
+        try:
+            entries = load_setlist(self.setlist_path) if stat else []
+        except (OSError, ValueError) as e:
+            self.log(f"Set list not reloaded: {e}")
+            return
+
+        target_keys = {}
+        for entry in entries:
+            if not self._in_charts_dir(entry.path):
+                self.log(f"Warning: set list entry {entry.path} is outside {self.charts_dir}; skipped")
+                continue
+            target_keys[entry.path] = entry.key
+        for path in set(target_keys) | set(self.target_keys):
+            if target_keys.get(path) != self.target_keys.get(path):
+                self.pending[path] = now
+        self.target_keys = target_keys
+
+    def _in_charts_dir(self, path):
+        try:
+            return os.path.commonpath([self.charts_dir, os.path.abspath(path)]) == self.charts_dir
+        except ValueError:
+            return False
+
+    def scan(self, now=None):
+        """Record changed and deleted charts as pending"""
+        now = now if now is not None else time.monotonic()
+        self._reload_setlist(now)
+
+        seen = set()
+        for path in self.list_charts():
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if self.stats.get(path) != signature:
+                self.stats[path] = signature
+                self.pending[path] = now
+
+        for path in list(self.stats):
+            if path not in seen:
+                del self.stats[path]
+                self.pending[path] = now
+
+    def build_hash(self, content, target_key):
+        """Hash of everything that determines a chart's outputs"""
+        options = f"{target_key or ''}|{self.pdf}|{self.landscape}|{self.chart_wide}"
+        return hashlib.sha256(content.encode('utf-8') + b'\0' + options.encode('utf-8')).hexdigest()
+
+    def flush(self, now=None):
+        """Rebuild pending charts that have been quiet for the debounce period"""
+        now = now if now is not None else time.monotonic()
+        ready = [path for path, changed in self.pending.items() if now - changed >= self.debounce]
+        if not ready:
+            return 0
+
+        rebuilt = 0
+        for path in sorted(ready):
+            del self.pending[path]
+            if self.rebuild(path):
+                rebuilt += 1
+        self._save_manifest()
+        if self.metrics_file:
+            REGISTRY.write_textfile(self.metrics_file)
+        return rebuilt
+
+    def rebuild(self, path):
+        """Rebuild one chart if its content or target key changed; returns True if outputs were written"""
+        relative = os.path.relpath(path, self.charts_dir)
+        entry = self.manifest.get(relative)
+
+        if not os.path.exists(path):
+            if entry:
+                self._remove_outputs(entry)
+                del self.manifest[relative]
+                self.log(f"Removed outputs for {relative}")
+            return False
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read().rstrip()
+        except (OSError, UnicodeDecodeError) as e:
+            self.log(f"Error: {relative}: {e}")
+            return False
+
+        target_key = self.target_keys.get(path)
+        digest = self.build_hash(content, target_key)
+        if entry and entry['hash'] == digest and all(os.path.exists(p) for p in entry['outputs']):
+            return False
+
+        start = time.perf_counter()
+        try:
+            result = self.processor.process(content, target_key=target_key, chart_wide=self.chart_wide)
+            outputs = self._write_outputs(relative, result, target_key)
+        except Exception as e:
+            self.log(f"Error: {relative}: {e}")
+            return False
+
+        if entry:
+            self._remove_outputs(entry, keep=outputs)
+        self.manifest[relative] = {'hash': digest, 'key': target_key, 'outputs': outputs}
+        self.log(f"Rebuilt {relative}{' in ' + target_key if target_key else ''} "
+                 f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+        return True
+
+    def _write_outputs(self, relative, result, target_key):
+        stem = os.path.splitext(relative)[0] + (f'.{target_key}' if target_key else '.formatted')
+        base = os.path.join(self.output_dir, stem)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+
+        text_path = base + '.txt'
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(result + '\n')
+        outputs = [text_path]
+
+        if self.pdf:
+            pdf_path = base + '.pdf'
+            self.processor.export_pdf(result, pdf_path, landscape=self.landscape)
+            outputs.append(pdf_path)
+        return outputs
+
+    @staticmethod
+    def _remove_outputs(entry, keep=()):
+        for output in entry['outputs']:
+            if output not in keep and os.path.exists(output):
+                os.remove(output)
+
+    def run_once(self):
+        """Scan and rebuild everything that is out of date, ignoring the debounce"""
+        self.scan()
+        return self.flush(now=float('inf'))
+
+    def run(self):
+        """Watch until interrupted"""
+        self.log(f"Watching {self.charts_dir} -> {self.output_dir}")
+        self.run_once()
+        while True:
+            time.sleep(self.interval)
+            self.scan()
+            self.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild chord chart outputs whenever charts change")
+    parser.add_argument('charts_dir', help="directory of chart .txt files")
+    parser.add_argument('-o', '--output-dir', required=True, help="directory for generated files")
+    parser.add_argument('--setlist', help="set-list file with per-song target keys ('song.txt = G')")
+    parser.add_argument('--pdf', action='store_true', help="also export a PDF per chart")
+    parser.add_argument('--landscape', action='store_true', help="landscape PDF (2 columns)")
+    parser.add_argument('--chart-wide', action='store_true', help="align all sections on one grid")
+    parser.add_argument('--debounce', type=float, default=0.3, help="seconds a file must be quiet before rebuilding")
+    parser.add_argument('--interval', type=float, default=0.2, help="polling interval in seconds")
+    parser.add_argument('--once', action='store_true', help="rebuild what is out of date and exit")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="rewrite Prometheus metrics to PATH after every rebuild (textfile collector)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    args = parser.parse_args(argv)
+
+    if args.metrics_port is not None:
+        REGISTRY.serve(args.metrics_port)
+    watcher = ChartWatcher(args.charts_dir, args.output_dir, setlist_path=args.setlist, pdf=args.pdf,
+                           landscape=args.landscape, chart_wide=args.chart_wide,
+                           debounce=args.debounce, interval=args.interval, metrics_file=args.metrics_file)
+    if args.once:
+        watcher.run_once()
+        return 0
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())